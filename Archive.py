@@ -0,0 +1,358 @@
+"""
+SQLite archive of all the passages, frames and TLEs received by the data warehouse
+
+Answering a question about the old data used to mean loading every passage file, here everything is indexed:
+    passages -> one row per passage (aos and los as epoch, the rest of the header as json), identified by the
+                satellite and the aos, the passages of two satellites can start at the same time
+    frames   -> one row per frame, indexed by timestamp, passage_number, tnc_client and elevation
+    tles     -> every TLE that was used
+
+The database is in WAL mode, the readers are never blocked by the writes of the data warehouse.
+The frames are inserted in batches (insertFrames), DataWarehouse groups them and writes them together
+with the group commit of the passage logs
+
+The passages on disk (PassageLog folders) are still the primary copy, the archive can always be rebuilt
+from them with utils/migrate_archive.py
+"""
+
+from datetime import datetime, timezone
+import collections
+import json
+import os
+import sqlite3
+import threading
+
+from kiss import frame_to_bytes
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS passages (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    passage_number  INTEGER,
+    satcat_id       INTEGER NOT NULL DEFAULT 0,
+    aos             REAL,
+    los             REAL,
+    max_elevation   REAL,
+    start_azimuth   REAL,
+    end_azimuth     REAL,
+    tle_line1       TEXT,
+    tle_line2       TEXT,
+    frame_count     INTEGER DEFAULT 0,
+    status          TEXT,
+    header          TEXT,
+    UNIQUE(satcat_id, aos)
+);
+
+CREATE TABLE IF NOT EXISTS frames (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    passage_id      INTEGER REFERENCES passages(id),
+    passage_number  INTEGER,
+    timestamp       REAL NOT NULL,
+    elevation       REAL,
+    azimuth         REAL,
+    distance        REAL,
+    tnc_host        TEXT,
+    tnc_port        INTEGER,
+    kiss            BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tles (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp       REAL,
+    line1           TEXT,
+    line2           TEXT,
+    UNIQUE(line1, line2)
+);
+
+CREATE INDEX IF NOT EXISTS frames_timestamp ON frames(timestamp);
+CREATE INDEX IF NOT EXISTS frames_passage ON frames(passage_number);
+CREATE INDEX IF NOT EXISTS frames_passage_id ON frames(passage_id);
+CREATE INDEX IF NOT EXISTS frames_tnc_client ON frames(tnc_host, tnc_port, timestamp);
+CREATE INDEX IF NOT EXISTS frames_elevation ON frames(elevation);
+CREATE INDEX IF NOT EXISTS passages_number ON passages(passage_number);
+"""
+
+# columns of the passages table, everything else of the header goes to the json column
+PASSAGE_COLUMNS = ["passage_number", "satcat_id", "aos", "los", "max_elevation", "start_azimuth", "end_azimuth",
+                   "tle_line1", "tle_line2", "frame_count", "status"]
+FRAME_COLUMNS = ["passage_id", "passage_number", "timestamp", "elevation", "azimuth", "distance", "tnc_host", "tnc_port", "kiss"]
+
+
+def parseUtc(value):
+    """
+    Epoch of the times saved by the data warehouse, they can be floats or utcString ("2024-01-01_12:00:00")
+    The frames of the old archives only have the minutes ("2024-01-01_12:00")
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    for time_format in ("%Y-%m-%d_%H:%M:%S", "%Y-%m-%d_%H:%M"):
+        try:
+            return datetime.strptime(value, time_format).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown time format: {value}")
+
+
+class Archive:
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        # a single connection for the writes shared by the threads of the rpc server, the lock serializes them
+        # each thread that reads has its own connection, with WAL they dont wait for the writes
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.migrate()
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.readers = threading.local()
+
+    def migrate(self):
+        """
+        The archives made before the satellite was a column have aos UNIQUE, sqlite can not drop that constraint
+        so the table is made again (the ids stay the same, the frames still point to their passage)
+        The satellite of the old rows comes from their header, 0 if it is not there
+        """
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(passages)")]
+        if not columns or "satcat_id" in columns:
+            return
+        old_columns = [column for column in ["id"] + PASSAGE_COLUMNS + ["header"] if column != "satcat_id"]
+        with self.connection:
+            self.connection.execute("DROP TABLE IF EXISTS passages_migration")
+            self.connection.execute(SCHEMA.split(";")[0].replace("passages (", "passages_migration (", 1))
+            self.connection.execute(
+                f"INSERT INTO passages_migration ({', '.join(old_columns)}, satcat_id) "
+                f"SELECT {', '.join(old_columns)}, COALESCE(json_extract(header, '$.satcat_id'), 0) FROM passages")
+            self.connection.execute("DROP TABLE passages")
+            self.connection.execute("ALTER TABLE passages_migration RENAME TO passages")
+
+    def readConnection(self):
+        connection = getattr(self.readers, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            self.readers.connection = connection
+        return connection
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    ######################################################################################
+    #
+    # Writing
+    #
+    ######################################################################################
+
+    def insertPassage(self, header):
+        """
+        Inserts (or updates, they are identified by satcat_id and aos) a passage, returns its id
+        header is the passage dictionary of the data warehouse without the frame_list
+        """
+        row = {column: header.get(column) for column in PASSAGE_COLUMNS}
+        row["aos"] = parseUtc(row["aos"])
+        row["los"] = parseUtc(row["los"])
+        row["satcat_id"] = row["satcat_id"] or 0
+        extra = {key: value for key, value in header.items() if key not in PASSAGE_COLUMNS and key not in ("frame_list", "fused_frames")}
+        row["header"] = json.dumps(extra)
+
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{column}" for column in row)
+        updates = ", ".join(f"{column}=excluded.{column}" for column in row if column not in ("satcat_id", "aos"))
+        with self.lock, self.connection:
+            self.connection.execute(
+                f"INSERT INTO passages ({columns}) VALUES ({placeholders}) ON CONFLICT(satcat_id, aos) DO UPDATE SET {updates}", row)
+            return self.connection.execute("SELECT id FROM passages WHERE satcat_id = ? AND aos = ?",
+                                           (row["satcat_id"], row["aos"])).fetchone()[0]
+
+    def updatePassage(self, passage_id, **values):
+        """
+        Updates some columns of a passage (frame_count, status, ...)
+        """
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self.lock, self.connection:
+            self.connection.execute(f"UPDATE passages SET {assignments} WHERE id = ?", (*values.values(), passage_id))
+
+    def insertFrames(self, rows):
+        """
+        Inserts many frames in a single transaction
+        rows -> list of tuples in the order of FRAME_COLUMNS, use frameRow to build them
+        """
+        if not rows:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT INTO frames ({', '.join(FRAME_COLUMNS)}) VALUES ({', '.join('?' * len(FRAME_COLUMNS))})", rows)
+
+    def replaceFrames(self, passage_id, rows):
+        """
+        Replaces all the frames of a passage, used when the frames are loaded again from the passage on disk
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM frames WHERE passage_id = ?", (passage_id,))
+            self.connection.executemany(
+                f"INSERT INTO frames ({', '.join(FRAME_COLUMNS)}) VALUES ({', '.join('?' * len(FRAME_COLUMNS))})", rows)
+
+    def insertMissingFrames(self, passage_id, rows):
+        """
+        Inserts the frames of a passage that are not in the archive yet, returns how many were inserted
+        The frames that are already there keep their row (and their id, ParquetExport continues from the last id)
+        A frame is the same if it has the same timestamp, station and kiss, repeated copies are counted
+        """
+        with self.lock, self.connection:
+            existing = collections.Counter(self.connection.execute(
+                "SELECT timestamp, tnc_host, tnc_port, kiss FROM frames WHERE passage_id = ?", (passage_id,)))
+            missing = []
+            for row in rows:
+                key = (row[2], row[6], row[7], row[8])
+                if existing[key] > 0:
+                    existing[key] -= 1
+                else:
+                    missing.append(row)
+            self.connection.executemany(
+                f"INSERT INTO frames ({', '.join(FRAME_COLUMNS)}) VALUES ({', '.join('?' * len(FRAME_COLUMNS))})", missing)
+        return len(missing)
+
+    @staticmethod
+    def frameRow(passage_id, frame):
+        """
+        Row for insertFrames from a Records.Frame or a frame dictionary of the data warehouse
+        The timestamp is the epoch (or the timestamp string of the old archives), kiss in any format of frame_to_bytes
+        """
+        if not isinstance(frame, dict):
+            return (passage_id, frame.passage_number, frame.timestamp, frame.elevation, frame.azimuth, frame.distance,
+                    frame.tnc_host, frame.tnc_port, frame.kiss)
+        tnc_client = frame.get("tnc_client") or (None, None)
+        return (
+            passage_id,
+            frame.get("passage_number"),
+            frame["epoch"] if "epoch" in frame else parseUtc(frame["timestamp"]),
+            frame.get("elevation"),
+            frame.get("azimuth"),
+            frame.get("distance"),
+            tnc_client[0],
+            tnc_client[1],
+            frame_to_bytes(frame["kiss"]),
+        )
+
+    def insertTle(self, line1, line2, timestamp):
+        """
+        Saves a TLE, the same TLE is only saved once
+        """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO tles (timestamp, line1, line2) VALUES (?, ?, ?)", (timestamp, line1, line2))
+
+    ######################################################################################
+    #
+    # Reading
+    #
+    ######################################################################################
+
+    def queryFrames(self, start=None, end=None, min_elevation=None, max_elevation=None, tnc_client=None,
+                    passage_number=None, limit=None, after=None):
+        """
+        Returns the frames that match all the given filters as dictionaries (with their id), ordered by timestamp
+        tnc_client -> [host, port] or only host
+        after -> (timestamp, id) of the last frame of the previous page, only the frames after it are returned
+        """
+        conditions = []
+        parameters = []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            parameters.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            parameters.append(end)
+        if min_elevation is not None:
+            conditions.append("elevation >= ?")
+            parameters.append(min_elevation)
+        if max_elevation is not None:
+            conditions.append("elevation <= ?")
+            parameters.append(max_elevation)
+        if tnc_client is not None:
+            if isinstance(tnc_client, str):
+                tnc_client = [tnc_client]
+            conditions.append("tnc_host = ?")
+            parameters.append(tnc_client[0])
+            if len(tnc_client) > 1:
+                conditions.append("tnc_port = ?")
+                parameters.append(tnc_client[1])
+        if passage_number is not None:
+            conditions.append("passage_number = ?")
+            parameters.append(passage_number)
+        if after is not None:
+            # keyset pagination, every page is an index range instead of skipping the previous pages with OFFSET
+            conditions.append("(timestamp, id) > (?, ?)")
+            parameters.extend(after)
+
+        query = f"SELECT id, {', '.join(FRAME_COLUMNS)} FROM frames"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # with a filter on the elevation the index of the timestamp is only used if it also filters (not just to sort),
+        # +timestamp hides it from the planner. Without it the pages follow the index and nothing is sorted
+        if min_elevation is not None or max_elevation is not None:
+            query += " ORDER BY +timestamp, id"
+        else:
+            query += " ORDER BY timestamp, id"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        rows = self.readConnection().execute(query, parameters).fetchall()
+        return [dict(zip(["id"] + FRAME_COLUMNS, row)) for row in rows]
+
+    def queryPassages(self, start=None, end=None, min_elevation=None, passage_number=None, status=None,
+                      tnc_client=None, limit=None, after=None):
+        """
+        Returns the passages (AOS between start and end) that match all the given filters, ordered by AOS
+        Each passage is a dictionary with the columns and the rest of its header
+        min_elevation -> minimum max_elevation of the passage
+        tnc_client -> only the passages with frames from that station, [host, port] or only host
+        after -> (aos, id) of the last passage of the previous page
+        """
+        conditions = []
+        parameters = []
+        if start is not None:
+            conditions.append("aos >= ?")
+            parameters.append(start)
+        if end is not None:
+            conditions.append("aos < ?")
+            parameters.append(end)
+        if min_elevation is not None:
+            conditions.append("max_elevation >= ?")
+            parameters.append(min_elevation)
+        if passage_number is not None:
+            conditions.append("passage_number = ?")
+            parameters.append(passage_number)
+        if status is not None:
+            conditions.append("status = ?")
+            parameters.append(status)
+        if tnc_client is not None:
+            if isinstance(tnc_client, str):
+                tnc_client = [tnc_client]
+            station = "tnc_host = ?" + (" AND tnc_port = ?" if len(tnc_client) > 1 else "")
+            conditions.append(f"id IN (SELECT DISTINCT passage_id FROM frames WHERE {station})")
+            parameters.extend(tnc_client[:2])
+        if after is not None:
+            conditions.append("(aos, id) > (?, ?)")
+            parameters.extend(after)
+
+        query = f"SELECT id, {', '.join(PASSAGE_COLUMNS)}, header FROM passages"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY aos, id"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        passages = []
+        for row in self.readConnection().execute(query, parameters).fetchall():
+            passage = json.loads(row[-1]) if row[-1] else {}
+            passage.update(zip(["id"] + PASSAGE_COLUMNS, row[:-1]))
+            passages.append(passage)
+        return passages
+
+    def countFrames(self):
+        return self.readConnection().execute("SELECT COUNT(*) FROM frames").fetchone()[0]
@@ -1,5 +1,42 @@
+"""
+Configuration of all the modules (config.ini)
+
+Every module asks for the same configuration with getConfig, the file is parsed once per process and the values
+are kept with their types (see parseValue). Each config_reload_interval seconds the mtime of the file is checked,
+when it changes the file is parsed again and the callbacks registered with onChange are called with the keys that
+changed, so endpoints, batch sizes, ... can be changed without restarting the services
+The host and port of the rpc servers and the folders are only read when the modules start, they still need a restart
+"""
+
 import logging
 import os
+import threading
+import time
+
+import LogSetup
+from LogSetup import createLogger, parseLevel
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def getConfig(config_file_path="config.ini"):
+    """
+    Returns the configuration of the process for the file, it is loaded the first time and then watched for changes
+    """
+    path = os.path.abspath(config_file_path)
+    with _shared_lock:
+        config = _shared.get(path)
+        if config is None:
+            config = ConfigParser(config_file_path)
+            config.loadConfig()
+            # the level of every logger follows log_level
+            config.onChange(lambda changed: LogSetup.setLevel(changed["log_level"][1]), keys=["log_level"])
+            config.watch(config.get("config_reload_interval"))
+            _shared[path] = config
+    return config
+
 
 class ConfigParser:
     def __init__(self, config_file_path="config.ini"):
@@ -8,26 +45,17 @@ class ConfigParser:
         default path is a file called config.ini in the current dir
         """
 
-        # set up logger
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(logging.DEBUG)
-
-        # Create file handler
-        file_path = os.path.join("logs", f"{self.__class__.__name__}.log")
-        file_handler = logging.FileHandler(file_path)
-        file_handler.setLevel(logging.DEBUG)
-
-        # Define a common formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-        # Attach the formatter to handlers
-        file_handler.setFormatter(formatter)
-
-        # Add handlers to the logger
-        self.logger.addHandler(file_handler)
+        # set up logger, only to the file, the level is updated to log_level once the config is loaded
+        self.logger = createLogger(self.__class__.__name__, "logs", "INFO", console=False)
 
         self.config_file_path = config_file_path
         self.config_dict = {}
+        
+        # hot reload, see reloadIfChanged
+        self.mtime = None
+        self.callbacks = []       # [(callback, keys or None), ...]
+        self.reload_lock = threading.Lock()
+        self.watcher = None
 
     def set_logging_level(self, level):
         """
@@ -42,6 +70,12 @@ class ConfigParser:
         
     
     def loadDefaultValues(self):
+        """
+        Loads the default values to the dict (loadConfig already does it)
+        """
+        self.config_dict.update(self.defaultValues())
+    
+    def defaultValues(self):
         """
         Hardcoded default values that will be used in case a certain key is not found in the configuration file.
         just add a variable with a certain value and it will automatically add that variable to the dictionary
@@ -61,16 +95,60 @@ class ConfigParser:
         
         modules = ["gqrx_control", "rotctl_control", "manager", "new_ui"]
         
+        rpc_server_model = "pool"       # single or pool, see RpcServer
+        rpc_server_workers = 8
+        rpc_keepalive_timeout = 15.0    # seconds an idle connection is kept open by the pool server
+        
+        rpc_client_pool_size = 4        # connections to each endpoint, see RpcClient
+        rpc_client_timeout = 30.0
+        rpc_client_retries = 2
+        
+        ephemeris_step = 1.0            # seconds between samples of the passage ephemeris
+        ephemeris_max_error = 0.01      # degrees, above this the ephemeris is discarded and SGP4 is used
+        pass_min_elevation = 10.0       # degrees, passages with a lower peak are not scheduled
+        satellites = ["60238"]          # [norad or norad:CALLSIGN, ...] tracked by SatellitePredictor, the first ones have priority
+        observer_latitude = 38.7314     # degrees, site of the predictions and of the stations that are not in ground_stations
+        observer_longitude = -9.3024
+        observer_elevation = 0.0        # meters
+        ground_stations = []            # [host:port latitude longitude elevation, ...] site of each tnc_client, see GroundStations
+        tle_request_timeout = 30.0      # seconds to wait for CelesTrak or SatNOGS when the TLEs are updated
+        
+        tnc_recv_buffer_size = 65536    # bytes read from the TNC socket at once
+        tnc_clients = []                # [host:port, ...] TNCs handled by TncService
+        tnc_reconnect_min = 1.0         # seconds, doubles after each failed connection
+        tnc_reconnect_max = 60.0
+        tnc_stats_interval = 60.0       # seconds between the stats logs of TncService, 0 disables them
+        tnc_batch_size = 64             # frames sent to the master in a single call
+        tnc_batch_delay = 0.005         # seconds a frame can wait for its batch to fill
+        
+        data_folder = "data"            # passages saved by the data warehouse, see PassageLog
+        passage_commit_interval = 1.0   # seconds between fsyncs of the frames of the open passage
+        archive_enabled = True          # indexed copy of the passages, frames and TLEs in sqlite, see Archive
+        archive_path = "data/archive.sqlite"
+        query_page_size = 1000          # maximum frames or passages returned by a single remoteQuery* call
+        query_max_concurrency = 4       # remoteQuery* calls served at the same time, the rest of the workers are kept for the frames
+        parquet_export_enabled = False  # export of the archived frames to parquet after every passage, see ParquetExport
+        parquet_folder = "data/parquet"
+        parquet_compact_files = 16      # files in a partition before they are joined into one
+        
+        spool_folder = "spool"          # frames waiting to be delivered to the master, see Spool
+        spool_segment_size = 16777216   # bytes of each segment file
+        spool_fsync_interval = 0.05     # seconds between fsyncs, the frames of that interval share the fsync
+        
+        log_level = "INFO"              # DEBUG, INFO, WARNING or ERROR, DEBUG logs every frame, see LogSetup
+        config_reload_interval = 5.0    # seconds between the checks for changes of config.ini, 0 disables the hot reload
+        
     
-        # load all the variables defined in this functions to the dict
-        variable_dict = locals()
+        # all the variables defined in this functions
+        variable_dict = dict(locals())
+        default_dict = {}
         for variable in variable_dict:
             
             if variable.startswith("__") or variable == "self":
                 continue
 
-            self.config_dict[variable] = variable_dict[variable]
-            self.logger.debug(f"Loaded default key: {variable}, value: {variable_dict[variable]}")
+            default_dict[variable] = variable_dict[variable]
+        return default_dict
 
     def parseValue(self, value):
         """
@@ -79,13 +157,11 @@ class ConfigParser:
         
         # check if it is a boolean
         if value.lower() == "true" or value.lower() == "false":
-            self.logger.debug(f"   Value is a boolean: {value}")
             return value.lower() == "true"
 
         # check if it is a number
         try:
             value = int(value)
-            self.logger.debug(f"   Value is a number: {value}")
             return value
         except ValueError:
             pass
@@ -93,7 +169,6 @@ class ConfigParser:
         # check if it is a float
         try:
             value = float(value)
-            self.logger.debug(f"   Value is a float: {value}")
             return value
         except ValueError:
             pass
@@ -109,33 +184,30 @@ class ConfigParser:
                     value[i] = value[i].strip()
                     
                 
-                self.logger.debug(f"   Value is a list: {value}")
-                self.logger.debug(f"     result: {value}")
                 return value
         except Exception as e:
             self.logger.error(f"Error parsing value: {e}")
               
         # if it is none of the above, return the string
-        self.logger.debug(f"   Value is a string: {value}")
         return value
       
 
     def loadConfig(self):
         """
         Opens and parses the configuration file.
+        The new values replace the dict at once, the other threads never see a config that is half loaded
         """
-        # load the default value for the variables
-        self.loadDefaultValues()
+        # start from the default value for the variables
+        config_dict = self.defaultValues()
         
         try:
+            self.mtime = self.fileVersion()
             with open(self.config_file_path, 'r') as file:
-                self.logger.info(f"Opening configuration file: {self.config_file_path}")
+                self.logger.debug(f"Opening configuration file: {self.config_file_path}")
                 
                 for line_number, line in enumerate(file, start=1):
-                    self.logger.debug("Reading line: " + line.strip())
                     # Ignore comments and empty lines
                     if line.startswith("#") or line.strip() == "":
-                        self.logger.debug(f"  Ignoring line {line_number}")
                         continue
                     
                     # Splitting the line into key-value pairs
@@ -151,21 +223,92 @@ class ConfigParser:
                     key = key.strip()
                     value = self.parseValue(value.strip())  # try to check the value type
                                         
-                    self.config_dict[key] = value
-                    self.logger.info(f"Loaded key: {key}, value: {value}")
+                    config_dict[key] = value
                     
         except FileNotFoundError:
             self.logger.error(f"Configuration file '{self.config_file_path}' not found.")
         except Exception as e:
             self.logger.exception(f"An error occurred while loading the configuration file: {e}")
+        
+        # only what changed, the file is loaded again on every change (see reloadIfChanged)
+        self.logger.setLevel(parseLevel(config_dict.get("log_level")))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for key in sorted(config_dict):
+                if key not in self.config_dict or self.config_dict[key] != config_dict[key]:
+                    self.logger.debug("Loaded key: %s, value: %s", key, config_dict[key])
+        self.config_dict = config_dict
+    
+    def fileVersion(self):
+        """
+        (mtime, size) of the file, None if it does not exist
+        """
+        try:
+            stat = os.stat(self.config_file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def onChange(self, callback, keys=None):
+        """
+        callback(changed) is called after a reload that changed any of the keys (all of them if keys is None)
+        changed -> {key: (old value, new value)} only with those keys
+        """
+        self.callbacks.append((callback, None if keys is None else frozenset(keys)))
+    
+    def reloadIfChanged(self):
+        """
+        Parses the file again if it was modified since the last load and calls the callbacks
+        Returns {key: (old value, new value)} with every key that changed
+        """
+        with self.reload_lock:
+            version = self.fileVersion()
+            # a file that was removed (or is being replaced) keeps the current values
+            if version is None or version == self.mtime:
+                return {}
+            
+            old_dict = self.config_dict
+            self.loadConfig()
+            new_dict = self.config_dict
+            changed = {key: (old_dict.get(key), new_dict.get(key))
+                       for key in old_dict.keys() | new_dict.keys() if old_dict.get(key) != new_dict.get(key)}
+            if not changed:
+                return changed
+            self.logger.debug("Configuration changed: %s", sorted(changed))
+            
+            for callback, keys in self.callbacks:
+                selected = changed if keys is None else {key: changed[key] for key in keys if key in changed}
+                if not selected:
+                    continue
+                try:
+                    callback(selected)
+                except Exception as e:
+                    self.logger.exception(f"Error in the callback of the configuration change: {e}")
+            return changed
+    
+    def watch(self, interval):
+        """
+        Checks the file for changes every interval seconds in a thread of its own, does nothing if interval is 0
+        """
+        if not interval or self.watcher is not None:
+            return
+        
+        def watchLoop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reloadIfChanged()
+                except Exception as e:
+                    self.logger.exception(f"Error while reloading the configuration file: {e}")
+        
+        self.watcher = threading.Thread(target=watchLoop, name="ConfigWatcher", daemon=True)
+        self.watcher.start()
     
     def get(self, parameter):
         """
         Returns the value of the key if it exists, otherwise returns None
         """
-        self.logger.debug(f"Getting parameter: {parameter}")
         value = self.config_dict.get(parameter)
-        self.logger.debug("  Value: " + str(value))
+        self.logger.debug("Getting parameter: %s, value: %s", parameter, value)
         
         if value is None:
             self.logger.warning(f"Parameter '{parameter}' not found in configuration file.")
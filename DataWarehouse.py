@@ -7,6 +7,7 @@ all the other modules refer to time as float values. but here we will receive th
 
 Passage Dictionary:
     int:                     Reference to the passage  (potentially could be a hash, or just a number)
+    int                      NORAD id of the satellite
     list[[float,float]]      List of azimuth and elevation values for the passage
     str                      TLE_line1
     str                      TLE_line2
@@ -18,25 +19,45 @@ Passage Dictionary:
     float                    end azimuth (degrees) for the passage
     float                    max elevation (degrees) for the passage
     dict                     Dictionary of frames received in this passage
+    int                      Number of duplicated frames that were ignored (same frame from the same tnc_client)
+    dict                     Site of the ground stations {"host:port": [latitude, longitude, elevation], "default": [...]}
+                             the position of each frame is seen from the station that received it (see GroundStations)
 
 
 Frame Dictionary:
     float                    Timestamp of the frame (clarify exactly what this time refers to)
-    float                    Elevation of the satellite when the frame was received
+    float                    Elevation of the satellite when the frame was received (from the site of the GS that decoded it)
     float                    Azimuth of the satellite when the frame was received
     float                    Distance of the satellite when the frame was received
     list(str, port)          GS that decoded the message
     int                      Passage number  ([check] - not sure if it makes sense to have this here )
-    str                      KISS frame
+    str                      KISS frame (received as bytes, saved as a compact hex string "86a286a2...")
+    float                    Epoch of the frame (timestamp is converted to a string, this keeps the original float)
+    int                      Group of the frame, the copies of the same transmission from other stations have the same group (PassageIndex)
+
+Each passage is stored in its own folder (see PassageLog), the frames are appended to it as they arrive
+and only the header of the passage stays in memory. At LOS the header is finalized, then the copies of the same frame
+received by different ground stations are merged (FrameFusion) in the background and stored as the fused_frames
 """
 
 
-from xmlrpc.server import SimpleXMLRPCServer
+from RpcServer import createRpcServer
 import xmlrpc.client
-from ConfigParser import ConfigParser
+from ConfigParser import getConfig
+from LogSetup import createLogger
+from FrameFusion import fuse_frames, fused_to_dict
+from Archive import Archive, parseUtc
+import ParquetExport
+from PassageIndex import PassageIndex
+from Records import Frame, FrameColumns
+from Schema import FRAME, PASSAGE
+from PassageLog import PassageLog, loadPassageFolder, iterJsonLines, readJsonLines, writeFused, HEADER_FILE, FRAMES_FILE
+from kiss import frame_to_bytes
 import logging
 import json
 import os
+import threading
+import time
 
 from datetime import datetime, timezone
 
@@ -48,33 +69,11 @@ class DataWarehouse:
     
     
     def __init__(self):
-        self.Config = ConfigParser()
-        self.Config.loadDefaultValues()
-        self.Config.loadConfig()
+        # loaded once per process and reloaded when config.ini changes (see ConfigParser.getConfig)
+        self.Config = getConfig()
     
-        # set up logger
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(logging.DEBUG)
-
-        # Create console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG)
-
-        # Create file handler
-        log_path = os.path.join(self.Config.get("log_folder"), f"{self.__class__.__name__}.log")
-        file_handler = logging.FileHandler(log_path)
-        file_handler.setLevel(logging.DEBUG)
-
-        # Define a common formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-        # Attach the formatter to handlers
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
-
-        # Add handlers to the logger
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        # set up logger, the level comes from log_level in the config (see LogSetup)
+        self.logger = createLogger(self.__class__.__name__, self.Config.get("log_folder"), self.Config.get("log_level"))
     
         
         
@@ -82,7 +81,7 @@ class DataWarehouse:
         self.server_host = self.Config.get("data_warehouse_rpc_host")
         self.server_port = self.Config.get("data_warehouse_rpc_port")
         self.logger.debug(f"Datawarehouse server endpoint: {self.server_host}:{self.server_port}")
-        self.server = SimpleXMLRPCServer((self.server_host, self.server_port))
+        self.server = createRpcServer(self.Config, self.server_host, self.server_port)
         self.registerFunctoins()
         
         
@@ -90,23 +89,72 @@ class DataWarehouse:
         # self.passageDict = {          # this has been removed, it does not really make sense to save the trash
         #     -1: {'frame_list': []}   # add initial slot for messages out of aos
         # }
+        # only the header of each passage is kept here, the frames go to its PassageLog
         self.passageDict = {}
-        
-        self.EX_FRAME_KEYS = ["timestamp", "elevation", "azimuth", "distance", "tnc_client", "passage_number", "kiss"]
-        self.EX_FRAME_TYPES = [float, float, float, float, list, int, str]
-        
-        self.EX_PASSAGE_KEYS = ["passage_number", "azimuth_elevation", "tle_line1", "tle_line2", "gs_clients", "frame_count", 
-                                "aos", "los", "start_azimuth", "end_azimuth", "max_elevation", "time_interval", "frame_list"]
-        self.EX_PASSAGE_TYPES = [int, list, str, str, list, int, float, float, float, float, float, list, list]
+        self.passageLogs = {}
+        # duplicates and copies from the different stations of the frames of the open passages
+        self.passageIndexes = {}
+        # the server can handle many requests at the same time, every change to passageDict is done with this lock
+        self.passage_lock = threading.Lock()
+        
+        self.data_folder = self.Config.get("data_folder")
+        self.commit_interval = self.Config.get("passage_commit_interval")
+        
+        # indexed copy of everything in sqlite, the frames wait in archive_rows and are inserted with the group commit
+        self.archive = Archive(self.Config.get("archive_path")) if self.Config.get("archive_enabled") else None
+        self.archiveIds = {}     # passage_number -> id of the passage in the archive
+        self.archive_rows = []
+        
+        # columnar copy of the archive for the analysis, updated after every passage (needs pyarrow)
+        self.parquet_folder = self.Config.get("parquet_folder")
+        self.parquet_export = self.Config.get("parquet_export_enabled") and self.archive is not None
+        if self.parquet_export and ParquetExport.pa is None:
+            self.logger.error("parquet_export_enabled is set but pyarrow is not installed, the parquet export is disabled")
+            self.parquet_export = False
+        self.parquet_lock = threading.Lock()
+        threading.Thread(target=self.commitLoop, name="passage-commit", daemon=True).start()
+        
+        # passages that were left open by a crash, listed now before the server answers any remoteCreatePassage
+        # (the recovery itself can take a while, it runs in the background)
+        names = sorted(os.listdir(self.data_folder)) if os.path.isdir(self.data_folder) else []
+        threading.Thread(target=self.recoverPassages, args=(names,), name="passage-recover", daemon=True).start()
+        
+        # expected keys and types of the frames and passages that master sends (see Schema)
+        self.EX_FRAME = FRAME
+        self.EX_PASSAGE = PASSAGE
+        
+        # query_page_size is read on every query, the rest is updated here when config.ini changes
+        self.Config.onChange(self.configChanged, keys=["passage_commit_interval", "parquet_export_enabled", "parquet_folder"])
+    
+    def configChanged(self, changed):
+        """
+        Called by the config when the commit interval or the parquet export change
+        The archive and the data folder are only opened at the start, they need a restart
+        """
+        self.commit_interval = self.Config.get("passage_commit_interval")
+        
+        parquet_export = self.Config.get("parquet_export_enabled") and self.archive is not None
+        if parquet_export and ParquetExport.pa is None:
+            self.logger.error("parquet_export_enabled is set but pyarrow is not installed, the parquet export is disabled")
+            parquet_export = False
+        # the folder is not changed while an export is running
+        with self.parquet_lock:
+            self.parquet_folder = self.Config.get("parquet_folder")
+            self.parquet_export = parquet_export
+        self.logger.info(f"Configuration updated: {sorted(changed)}")
     
     def registerFunctoins(self):
         """
         Will register the functions that will be available to the cliets
         """
         self.server.register_function(self.remoteUpdateTle)
+        self.server.register_function(self.remoteSaveTle)
         self.server.register_function(self.remoteSaveKiss)
+        self.server.register_function(self.remoteSaveKissBatch)
         self.server.register_function(self.remoteCreatePassage)
-        self.server.register_function(self.remoteSavePassage)
+        self.server.register_function(self.remoteSavePassage, max_concurrency=1)
+        self.server.register_function(self.remoteQueryFrames, max_concurrency=self.Config.get("query_max_concurrency"))
+        self.server.register_function(self.remoteQueryPassages, max_concurrency=self.Config.get("query_max_concurrency"))
         
     
     ######################################################################################
@@ -116,72 +164,165 @@ class DataWarehouse:
     #
     ######################################################################################
     
-    def typeChecking(self, data_dict, expected_keys, expected_types):
+    def typeChecking(self, data_dict, schema):
         """
-        Receives a dictionary and checks if the keys are the same as the expected keys
+        Receives a dictionary and checks if it has the keys and types of the schema
+        tnc_client is converted to [host, port]
         """
-        
-        # check the inputs
-        if not isinstance(data_dict, dict):
-            self.logger.error("Data is not a dictionary")
-            return False
-        
-        if not type(expected_keys) == list:
-            self.logger.error("Expected keys is not a list")
-            return False
-        
-        if not type(expected_types) == list:
-            self.logger.error("Expected types is not a list")
-            return False
-        
-        if len(expected_keys) != len(expected_types):
-            self.logger.error("Expected keys and types have different lengths")
-            return False
-        
-        # check if the keys are the same
-        if set(data_dict.keys()) != set(expected_keys):
-            self.logger.error("Keys are different")
+        error = schema.validate(data_dict)
+        if error is not None:
+            self.logger.error(error)
             return False
-        
-        # check if the types are the same
-        for key, value in data_dict.items():
-            if not isinstance(value, expected_types[expected_keys.index(key)]):
-                self.logger.error(f"Key {key} has the wrong type")
-                return False
-        
         return True
     
-    def savePreviousPassage(self):
+    def savePreviousPassage(self, passage_number=None):
         """
         When creating a new passage, this will be called
         We will get the data for the old passage and save it
 
         i will only have at max two passages loaded in memory at any single time
         one is the next passage that is about to start and the other is to capture passages out of aos
+        
+        the frames are already on disk, here only the header of the passage is finalized and the folder renamed
+        (it does not depend on the number of frames). The fusion of the frames runs in the background
+        
+        with passage_number only that passage is saved, the passages of other satellites can still be open
         """
         
-        if len(self.passageDict) < 1:
+        with self.passage_lock:
+            if passage_number is not None:
+                passage_dict, passage_logs, archive_ids = {}, {}, {}
+                if passage_number in self.passageDict:
+                    passage_dict[passage_number] = self.passageDict.pop(passage_number)
+                    passage_logs[passage_number] = self.passageLogs.pop(passage_number)
+                    self.passageIndexes.pop(passage_number, None)
+                    if passage_number in self.archiveIds:
+                        archive_ids[passage_number] = self.archiveIds.pop(passage_number)
+            else:
+                passage_dict = self.passageDict
+                passage_logs = self.passageLogs
+                archive_ids = self.archiveIds
+                self.archiveIds = {}
+                # reset the passageDict
+                # self.passageDict = { -1: {'frame_list': []}}    # this has been removed, it does not make sense to save all the trash
+                self.passageDict = {}
+                self.passageLogs = {}
+                self.passageIndexes = {}
+        
+        if len(passage_dict) < 1:
             self.logger.debug("No previous passage to save")
             return False
         
         self.logger.debug("Saving previous passage")
+        self.flushArchive()
         
-        # get the passage number
-        passage_number = list(self.passageDict.keys())[0]
-        
+        for passage_number, passage in passage_dict.items():
+            # folder will contain the time of the aos_satellite_maxElevation_frameCount
+            name = self.passageFolderName(passage)
+            self.logger.debug(f"  Folder: {name}")
+            
+            folder = passage_logs[passage_number].close(name)
+            if passage_number in archive_ids:
+                self.archive.updatePassage(archive_ids[passage_number], frame_count=passage["frame_count"], status="closed")
+            threading.Thread(target=self.fusePassage, args=(folder,), name=f"fusion:{passage_number}", daemon=True).start()
         
-        # filename will contain the time of the aos_maxElevation_frameCount
-        filename = f"{self.passageDict[passage_number]['aos']}_{int(self.passageDict[passage_number]['max_elevation'])}_{self.passageDict[passage_number]['frame_count']}.json"
+        if self.parquet_export:
+            threading.Thread(target=self.exportParquet, name="parquet-export", daemon=True).start()
         
-        self.logger.debug(f"  Filename: {filename}")
-        
-        self.dumpData(filename)
-        
-        # reset the passageDict
-        # self.passageDict = { -1: {'frame_list': []}}    # this has been removed, it does not make sense to save all the trash
-        self.passageDict = {}
-        
-        return True    
+        return True
+    
+    def fusePassage(self, folder):
+        """
+        Merges the copies of the frames received by the different ground stations and saves them with the passage
+        """
+        try:
+            # read one line at a time into columns, the frames of the passage are never all dictionaries at once
+            frame_list = FrameColumns.fromRecords(iterJsonLines(os.path.join(folder, FRAMES_FILE)))
+            fused_list = fuse_frames(frame_list)
+            writeFused(folder, [fused_to_dict(fused) for fused in fused_list])
+            self.logger.debug(f"  Fused {len(frame_list)} frames into {len(fused_list)} ({folder})")
+        except Exception as e:
+            self.logger.error(f"Error while fusing the frames of {folder}: {e}")
+    
+    def exportParquet(self):
+        """
+        Appends the new frames of the archive to the parquet files and compacts the partitions with too many files
+        """
+        # a single export at a time, the next one continues where the previous one stopped
+        with self.parquet_lock:
+            try:
+                start = time.time()
+                exported = ParquetExport.exportFrames(self.archive, self.parquet_folder)
+                compacted = ParquetExport.compact(self.parquet_folder, self.Config.get("parquet_compact_files"))
+                self.logger.debug(f"  Exported {exported} frames to parquet, compacted {compacted} partitions in {time.time() - start:.2f} seconds")
+            except Exception as e:
+                self.logger.error(f"Error while exporting the frames to parquet: {e}")
+    
+    def commitLoop(self):
+        """
+        Group commit, all the frames that arrived during the interval are written to disk together
+        """
+        while True:
+            time.sleep(self.commit_interval)
+            with self.passage_lock:
+                passage_logs = list(self.passageLogs.values())
+            for passage_log in passage_logs:
+                try:
+                    passage_log.commit()
+                except Exception as e:
+                    self.logger.error(f"Error while committing the frames of {passage_log.folder}: {e}")
+            self.flushArchive()
+    
+    def flushArchive(self):
+        """
+        Inserts the frames that are waiting for the archive in a single transaction
+        """
+        if self.archive is None:
+            return
+        with self.passage_lock:
+            rows = self.archive_rows
+            self.archive_rows = []
+        try:
+            self.archive.insertFrames(rows)
+        except Exception as e:
+            self.logger.error(f"Error while inserting {len(rows)} frames in the archive: {e}")
+    
+    def recoverPassages(self, names):
+        """
+        Passages that are still open on disk (but not in memory) were interrupted by a crash
+        They are closed with the frames that made it to the disk
+        names -> the folders that were in data_folder before the server started, the passages created by this
+                 process are never in the list (they are open on disk too)
+        """
+        for name in names:
+            folder = os.path.join(self.data_folder, name)
+            try:
+                with open(os.path.join(folder, HEADER_FILE), "r") as f:
+                    header = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if header.get("status") != "open":
+                continue
+            
+            frame_list = readJsonLines(os.path.join(folder, FRAMES_FILE))
+            header["frame_count"] = len(frame_list)
+            self.logger.warning(f"Recovering interrupted passage {name} with {header['frame_count']} frames")
+            passage_log = PassageLog.reopen(folder, header)
+            folder = passage_log.close(self.passageFolderName(header), status="interrupted")
+            
+            # the frames that were waiting for the archive were lost, they are inserted from the log
+            # the ones that were already archived keep their ids, otherwise the parquet export would have them twice
+            if self.archive is not None:
+                passage_id = self.archive.insertPassage({**passage_log.header, "status": "interrupted"})
+                self.archive.insertMissingFrames(passage_id, [Archive.frameRow(passage_id, frame) for frame in frame_list])
+            self.fusePassage(folder)
+    
+    @staticmethod
+    def passageFolderName(header):
+        """
+        Name of the folder of a closed passage, the satellite is in it because two of them can have the same aos
+        """
+        return f"{header['aos']}_{header.get('satcat_id', 0)}_{int(header['max_elevation'])}_{header['frame_count']}"
     
     def utcString(self, timestamp: float | None) -> str:
         if not timestamp:
@@ -190,9 +331,10 @@ class DataWarehouse:
             time = datetime.fromtimestamp(timestamp, timezone.utc)
         return time.strftime('%Y-%m-%d_%H:%M:%S')
 
-    def dumpData(self, filename = None, folder="data"):
+    def dumpData(self, filename = None, folder="data", data=None):
         """
         Will dump all of the data to a json file
+        data is what gets dumped, by default the passageDict
         """
         
         self.logger.debug("Dumping data to json file")
@@ -207,11 +349,32 @@ class DataWarehouse:
         
         # dump the data
         with open(os.path.join(folder, filename), "w") as f:
-            json.dump(self.passageDict, f, indent=4)
+            json.dump(self.passageDict if data is None else data, f, indent=4)
         
         return True
     
 
+    @staticmethod
+    def loadPassage(path):
+        """
+        Loads a saved passage, it returns {passage_number: passage} with the frames as bytes
+        path can be the folder of a passage (PassageLog) or an old json file saved by dumpData
+        Works with the old archives where the frames were saved as "0x86 0xa2 0x86 ..."
+        """
+        if os.path.isdir(path):
+            passage = loadPassageFolder(path)
+            data = {str(passage["passage_number"]): passage}
+        else:
+            with open(path, "r") as f:
+                data = json.load(f)
+        
+        for passage in data.values():
+            for frame in passage.get("frame_list", []) + passage.get("fused_frames", []):
+                frame["kiss"] = frame_to_bytes(frame["kiss"])
+        
+        return data
+    
+
     ######################################################################################
     #
     # Remote functions that will be called by the different modules
@@ -223,8 +386,22 @@ class DataWarehouse:
         """
         Will update the TLE values
         """
+        return self.remoteSaveTle(tle, None)
+    
+    def remoteSaveTle(self, tle, timestamp):
+        """
+        Called by master when sat predictor has a new TLE, tle is "line1\nline2", timestamp is when it was obtained
+        It is saved in the archive
+        """
         self.logger.debug(f"Received TLE update: {tle}")
-        self.logger.warning("[TODO] - Please implement the logic to store new TLE VALUES")
+        if self.archive is None:
+            return True
+        
+        lines = tle.strip().split("\n")
+        if len(lines) < 2:
+            self.logger.error(f"Invalid TLE: {tle}")
+            return False
+        self.archive.insertTle(lines[-2].strip(), lines[-1].strip(), timestamp if timestamp is not None else time.time())
         return True
     
     def remoteCreatePassage(self, data_dict):
@@ -233,77 +410,200 @@ class DataWarehouse:
         It will send the necessary values to create that passage in the data warehouse
         """
         
-        self.logger.debug(f"Creating new passage:")
-        for key in data_dict:
-            self.logger.debug(f"  {key}: {data_dict[key]}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Creating new passage:")
+            for key in data_dict:
+                self.logger.debug("  %s: %s", key, data_dict[key])
         
         # type checking
-        if self.typeChecking(data_dict, self.EX_PASSAGE_KEYS, self.EX_PASSAGE_TYPES) == False:
+        if self.typeChecking(data_dict, self.EX_PASSAGE) == False:
             self.logger.error("CreatePassage: Data is not in the correct format")
             return False
         self.logger.debug("Data is in the correct format")
         
-        # check if passage already exists
-        if data_dict["passage_number"] in self.passageDict:
-            self.logger.error(f"Passage {data_dict['passage_number']} already exists")
-            return False
-        self.logger.debug("Passage does not exist")
-
         # the data already comes in the format that I am expecting, just need to convert the timestamp to human readable
         data_dict["aos"] = self.utcString(data_dict["aos"])
         data_dict["los"] = self.utcString(data_dict["los"])
         
-        # add the passage to the dictionary
-        self.passageDict[data_dict["passage_number"]] = data_dict
+        # the frames go to the log of the passage
+        data_dict.pop("frame_list")
+        
+        with self.passage_lock:
+            # check if passage already exists
+            if data_dict["passage_number"] in self.passageDict:
+                self.logger.error(f"Passage {data_dict['passage_number']} already exists")
+                return False
+            self.logger.debug("Passage does not exist")
+            
+            # add the passage to the dictionary and start its log
+            folder = os.path.join(self.data_folder, f"{data_dict['aos']}_{data_dict.get('satcat_id', 0)}_{data_dict['passage_number']}")
+            data_dict["duplicate_count"] = 0
+            self.passageLogs[data_dict["passage_number"]] = PassageLog(folder, data_dict)
+            self.passageIndexes[data_dict["passage_number"]] = PassageIndex()
+            self.passageDict[data_dict["passage_number"]] = data_dict
+            if self.archive is not None:
+                self.archiveIds[data_dict["passage_number"]] = self.archive.insertPassage({**data_dict, "status": "open"})
+                self.archive.insertTle(data_dict["tle_line1"], data_dict["tle_line2"], time.time())
         
         self.logger.debug(f"  Passage has been created")
 
         return True
     
-    def remoteSaveKiss(self, data_dict):
+    def prepareFrame(self, data_dict):
         """
-        Receives the data in the format of a dictionary from the master
-        Part of the data comes from the kiss client another part comes from sat predict
+        Checks the frame that came from master and converts it to a Frame
+        Returns None if the frame is not valid
         """
         
-        self.logger.debug(f"Received KISS frame:")
-        for key in data_dict:
-            self.logger.debug(f"  {key}: {data_dict[key]}")
-
         # type checking
-        if self.typeChecking(data_dict, self.EX_FRAME_KEYS, self.EX_FRAME_TYPES) == False:
+        if self.typeChecking(data_dict, self.EX_FRAME) == False:
             self.logger.error("ReceiveKiss: Data is not in the correct format")
-            return False
-        
-        # the data already comes in the format that i am expecting, just need to convert the timestamp to human readable
-        data_dict["timestamp"] = self.utcString(data_dict["timestamp"])[:-3]
-        self.logger.debug(f"  Timestamp: {data_dict['timestamp']}")
+            return None
         
+        # the data already comes in the format that i am expecting
+        # the timestamp is converted to human readable when the frame is saved (Frame.toRecord), the float is kept as epoch,
+        # it is needed to match the copies of the frame from the different ground stations
+        return Frame.fromWire(data_dict)
+    
+    def addFrame(self, frame):
+        """
+        Adds the prepared frame to its passage, must be called with passage_lock
+        """
         # check if the passage is already in the dictionary
-        if data_dict["passage_number"] not in self.passageDict:
-            self.logger.error(f"Passage {data_dict['passage_number']} not found")
+        if frame.passage_number not in self.passageDict:
+            self.logger.error(f"Passage {frame.passage_number} not found")
             # cant proceed to accept frame if passage does not exits
             return False
 
-
-        # add the data to the passage
-        self.passageDict[data_dict["passage_number"]]["frame_list"].append(data_dict)
+        # a frame that was already received from the same tnc_client is not saved again
+        # the others get the group of their copies from the other stations (used by the fusion)
+        frame.group = self.passageIndexes[frame.passage_number].add(frame.kiss, (frame.tnc_host, frame.tnc_port), frame.timestamp)
+        if frame.group is None:
+            self.passageDict[frame.passage_number]["duplicate_count"] += 1
+            self.logger.debug("  Duplicated frame from %s:%s in passage %s, ignored", frame.tnc_host, frame.tnc_port, frame.passage_number)
+            return True
+        
+        # add the data to the log of the passage
+        self.passageLogs[frame.passage_number].append(frame.toRecord())
+        if self.archive is not None:
+            self.archive_rows.append(Archive.frameRow(self.archiveIds[frame.passage_number], frame))
         
         # increment the frame_count
-        self.passageDict[data_dict["passage_number"]]["frame_count"] += 1
+        self.passageDict[frame.passage_number]["frame_count"] += 1
         
-        self.logger.debug(f"  Data added to passage {data_dict['passage_number']}")
-
+        self.logger.debug("  Data added to passage %s", frame.passage_number)
         return True
+    
+    def remoteSaveKiss(self, data_dict):
+        """
+        Receives the data in the format of a dictionary from the master
+        Part of the data comes from the kiss client another part comes from sat predict
+        """
+        
+        # the keys are only logged one by one at DEBUG, at INFO this is a single check per frame
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Received KISS frame:")
+            for key in data_dict:
+                self.logger.debug("  %s: %s", key, data_dict[key])
+
+        frame = self.prepareFrame(data_dict)
+        if frame is None:
+            return False
+        
+        with self.passage_lock:
+            return self.addFrame(frame)
+    
+    def remoteSaveKissBatch(self, frame_list):
+        """
+        Same as remoteSaveKiss for a list of frames, the lock is only taken once for the whole batch
+        Returns a list of bools, one for each frame
+        """
+        
+        self.logger.debug("Received batch of %d KISS frames", len(frame_list))
+        
+        prepared = [self.prepareFrame(data_dict) for data_dict in frame_list]
+        
+        with self.passage_lock:
+            return [frame is not None and self.addFrame(frame) for frame in prepared]
 
-    def remoteSavePassage(self):
+    def remoteSavePassage(self, passage_number=None):
         """
         The aim of this function is to provide the user with an endpoint that it will allow to 
         to trigger DataWarehouse to save the current data in memory to storage
         this will be triggered when LOS is reached after a passage
+        passage_number -> only that passage is saved (the others may still be receiving frames), all if not given
+        """
+        self.logger.debug("Received request to save passage %s", passage_number)
+        response = self.savePreviousPassage(passage_number)
+        return response
+    
+    def queryPage(self, query, filter_keys):
+        """
+        Common part of the remote queries, the archive filters from the query dictionary, the limit and the cursor
+        """
+        if self.archive is None:
+            raise RuntimeError("The archive is disabled (archive_enabled), there is nothing to query")
+        
+        unknown = set(query) - set(filter_keys) - {"limit", "cursor"}
+        if unknown:
+            raise ValueError(f"Unknown query keys: {sorted(unknown)}")
+        
+        filters = {key: value for key, value in query.items() if key not in ("limit", "cursor")}
+        for key in ("start", "end"):
+            if key in filters:
+                filters[key] = parseUtc(filters[key])
+        
+        page_size = self.Config.get("query_page_size")
+        limit = min(query.get("limit", page_size), page_size)
+        after = tuple(query["cursor"]) if query.get("cursor") else None
+        return filters, limit, after
+    
+    def remoteQueryFrames(self, query):
         """
-        self.logger.debug("Received request to save passage")
-        response = self.savePreviousPassage()
+        Returns the frames of the archive that match the filters, a page at a time, ordered by timestamp
+        The frames are only in the archive after the next group commit (passage_commit_interval)
+        
+        query -> dictionary, every key is optional
+            start, end         epoch or "2024-01-01_12:00:00"
+            tnc_client         [host, port] or host
+            min_elevation, max_elevation, passage_number
+            limit              frames of the page (at most query_page_size)
+            cursor             the cursor of the previous page
+        Returns {"frames": [...], "cursor": [timestamp, id]}, cursor is only there when there are more frames
+        The frames have the same keys that remoteSaveKiss receives plus the id and passage_id of the archive
+        """
+        filters, limit, after = self.queryPage(query, ["start", "end", "tnc_client", "min_elevation", "max_elevation", "passage_number"])
+        rows = self.archive.queryFrames(**filters, limit=limit + 1, after=after)
+        
+        frames = []
+        for row in rows[:limit]:
+            frame = {key: value for key, value in row.items() if value is not None and key not in ("tnc_host", "tnc_port")}
+            frame["tnc_client"] = [row["tnc_host"], row["tnc_port"]]
+            frames.append(frame)
+        
+        response = {"frames": frames}
+        if len(rows) > limit:
+            response["cursor"] = [rows[limit - 1]["timestamp"], rows[limit - 1]["id"]]
+        return response
+    
+    def remoteQueryPassages(self, query):
+        """
+        Returns the passages of the archive that match the filters, a page at a time, ordered by AOS
+        
+        query -> dictionary, every key is optional
+            start, end         AOS, epoch or "2024-01-01_12:00:00"
+            min_elevation      minimum max_elevation of the passage
+            tnc_client         only the passages received by that station, [host, port] or host
+            passage_number, status ("open", "closed", "interrupted", ...)
+            limit, cursor      same as remoteQueryFrames
+        Returns {"passages": [...], "cursor": [aos, id]}, the passages have the header without the frames
+        """
+        filters, limit, after = self.queryPage(query, ["start", "end", "min_elevation", "tnc_client", "passage_number", "status"])
+        rows = self.archive.queryPassages(**filters, limit=limit + 1, after=after)
+        
+        response = {"passages": [{key: value for key, value in row.items() if value is not None} for row in rows[:limit]]}
+        if len(rows) > limit:
+            response["cursor"] = [rows[limit - 1]["aos"], rows[limit - 1]["id"]]
         return response
     
 if __name__ == "__main__":
@@ -0,0 +1,202 @@
+"""
+Merges the copies of the same transmission that were received by the different ground stations
+
+The idea is that every ground station sees a different noise, so the bit errors will not be in the same place.
+If we line up all the copies of a frame and do a majority vote bit by bit we should get something
+closer to what the satellite actually sent. The agreement between the stations on each bit is also
+kept as a confidence mask, so later we can see which bits are still doubtful
+
+How the copies are matched:
+    - frames are only compared with frames that have the same length
+    - copies must have arrived close to each other (time_window seconds between consecutive copies)
+    - each tnc_client can only contribute one copy to a group, if the same station shows up again
+      it means that it is already a new transmission
+
+Everything is done with numpy over a (frames x bits) matrix, there are no python loops over the bytes
+"""
+
+import numpy as np
+
+from Records import FrameColumns
+from kiss import frame_to_bytes
+
+
+DEFAULT_TIME_WINDOW = 0.5   # seconds between consecutive copies of the same frame
+
+
+def group_frames(timestamps, lengths, stations, time_window=DEFAULT_TIME_WINDOW):
+    """
+    Assigns a group id to every frame
+    timestamps -> array of floats with the time each frame was received
+    lengths -> array of ints with the length of each frame
+    stations -> list with an hashable identifier of the station that received the frame
+
+    Returns an array with the group id of each frame (same order as the input)
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    group_ids = np.empty(len(timestamps), dtype=np.int64)
+    if len(timestamps) == 0:
+        return group_ids
+
+    # sort by length and then by time, this way all the candidates are next to each other
+    order = np.lexsort((timestamps, lengths))
+    sorted_times = timestamps[order]
+    sorted_lengths = lengths[order]
+
+    # a new group starts when the length changes or when there is a gap bigger than the window
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (np.diff(sorted_lengths) != 0) | (np.diff(sorted_times) > time_window)
+
+    # the only thing left is to split the groups where the same station appears twice
+    current_group = -1
+    seen_stations = set()
+    for position, frame_index in enumerate(order):
+        station = stations[frame_index]
+        if new_group[position] or station in seen_stations:
+            current_group += 1
+            seen_stations = set()
+        seen_stations.add(station)
+        group_ids[frame_index] = current_group
+
+    return group_ids
+
+
+def majority_vote(frame_matrix, group_starts):
+    """
+    Bitwise majority vote over the copies of the frames
+    frame_matrix -> uint8 matrix (frames x bytes), rows of the same group must be contiguous
+    group_starts -> index of the first row of each group
+
+    Returns:
+        fused -> uint8 matrix (groups x bytes) with the corrected frames
+        confidence -> float32 matrix (groups x bits) with the fraction of copies that agree with the fused bit
+    """
+    group_starts = np.asarray(group_starts, dtype=np.intp)
+    bits = np.unpackbits(frame_matrix, axis=1)
+
+    # uint16 so that we dont overflow with more than 255 stations
+    votes = np.add.reduceat(bits, group_starts, axis=0, dtype=np.uint16)
+    copies = np.diff(np.append(group_starts, len(frame_matrix))).astype(np.uint16)[:, None]
+
+    fused_bits = (2 * votes > copies).astype(np.uint8)
+
+    # on a tie we dont have a better guess, keep the bit from the first copy
+    ties = 2 * votes == copies
+    fused_bits[ties] = bits[group_starts][ties]
+
+    confidence = np.maximum(votes, copies - votes) / copies
+    return np.packbits(fused_bits, axis=1), confidence.astype(np.float32)
+
+
+def fuse_frames(frame_list, time_window=DEFAULT_TIME_WINDOW, time_key="epoch", group_key="group"):
+    """
+    Takes the frame_list of a passage and returns a list with one fused frame per transmission
+    frame_list can also be a Records.FrameColumns, the arrays are used directly
+    If every frame already has its group (group_key, set by the data warehouse with PassageIndex) those are used
+
+    Each fused frame is a dictionary:
+        float                    Timestamp of the first copy
+        list[list(str, port)]    tnc_clients that received a copy
+        int                      Number of copies used in the vote
+        bytes                    Fused frame
+        np.ndarray               Confidence of each bit (fraction of the copies that agree with the fused bit)
+    """
+    if len(frame_list) == 0:
+        return []
+
+    if isinstance(frame_list, FrameColumns):
+        offsets = np.frombuffer(frame_list.offsets, dtype=np.uint64).astype(np.int64)
+        payloads = [bytes(frame_list.payload[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+        timestamps = np.frombuffer(frame_list.timestamp, dtype=np.float64)
+        lengths = np.diff(offsets)
+        stations = [frame_list.stations[index] for index in frame_list.station]
+        given_groups = np.frombuffer(frame_list.group, dtype=np.int64) if frame_list.hasGroups() else None
+    else:
+        payloads = [frame_to_bytes(frame["kiss"]) for frame in frame_list]
+        timestamps = np.fromiter((frame[time_key] for frame in frame_list), dtype=np.float64, count=len(frame_list))
+        lengths = np.fromiter((len(payload) for payload in payloads), dtype=np.int64, count=len(payloads))
+        stations = [tuple(frame["tnc_client"]) for frame in frame_list]
+        given_groups = None
+        if all(group_key in frame for frame in frame_list):
+            given_groups = np.fromiter((frame[group_key] for frame in frame_list), dtype=np.int64, count=len(frame_list))
+
+    if given_groups is not None:
+        group_ids = given_groups
+    else:
+        group_ids = group_frames(timestamps, lengths, stations, time_window)
+
+    fused_list = []
+    for length in np.unique(lengths):
+        if length == 0:
+            continue
+
+        # rows for this length, ordered so that each group is contiguous
+        rows = np.flatnonzero(lengths == length)
+        rows = rows[np.argsort(group_ids[rows], kind="stable")]
+        row_groups = group_ids[rows]
+        group_starts = np.flatnonzero(np.r_[True, row_groups[1:] != row_groups[:-1]])
+
+        frame_matrix = np.frombuffer(b"".join(payloads[row] for row in rows), dtype=np.uint8).reshape(len(rows), length)
+        fused, confidence = majority_vote(frame_matrix, group_starts)
+
+        group_ends = np.append(group_starts[1:], len(rows))
+        for index, (start, end) in enumerate(zip(group_starts, group_ends)):
+            members = rows[start:end]
+            fused_list.append({
+                "timestamp": float(timestamps[members].min()),
+                "tnc_clients": [list(stations[member]) for member in members],
+                "copies": int(end - start),
+                "kiss": fused[index].tobytes(),
+                "confidence": confidence[index],
+            })
+
+    fused_list.sort(key=lambda fused_frame: fused_frame["timestamp"])
+    return fused_list
+
+
+def fused_to_dict(fused_frame):
+    """
+    Converts a fused frame into something that can be dumped to json
+    Instead of the full confidence mask only the bits where the stations did not fully agree are kept
+    """
+    confidence = fused_frame["confidence"]
+    uncertain_bits = np.flatnonzero(confidence < 1.0)
+    return {
+        "timestamp": fused_frame["timestamp"],
+        "tnc_clients": fused_frame["tnc_clients"],
+        "copies": fused_frame["copies"],
+        "kiss": fused_frame["kiss"].hex(),
+        "min_confidence": float(confidence.min()),
+        "uncertain_bits": uncertain_bits.tolist(),
+        "uncertain_confidence": confidence[uncertain_bits].round(3).tolist(),
+    }
+
+
+if __name__ == "__main__":
+    # quick check with a synthetic passage, 30 stations receiving 100 frames each with random bit errors
+    import time
+
+    rng = np.random.default_rng(0)
+    number_of_stations = 30
+    number_of_frames = 100
+    frame_length = 100
+
+    original = rng.integers(0, 256, size=(number_of_frames, frame_length), dtype=np.uint8)
+    frame_list = []
+    for frame_index in range(number_of_frames):
+        for station in range(number_of_stations):
+            errors = np.packbits(rng.random(frame_length * 8) < 0.05)
+            frame_list.append({
+                "epoch": 1000.0 + frame_index * 2 + rng.random() * 0.2,
+                "tnc_client": ["localhost", 8000 + station],
+                "kiss": (original[frame_index] ^ errors).tobytes(),
+            })
+
+    start = time.perf_counter()
+    fused_list = fuse_frames(frame_list)
+    elapsed = time.perf_counter() - start
+
+    recovered = sum(fused["kiss"] == original[index].tobytes() for index, fused in enumerate(fused_list))
+    print(f"Fused {len(frame_list)} frames into {len(fused_list)} in {elapsed * 1000:.2f} ms")
+    print(f"  Recovered {recovered}/{number_of_frames} frames without errors")
@@ -0,0 +1,133 @@
+"""
+Sites of the ground stations, so the position of the satellite is the one seen from the station that received the frame
+
+The stations are in ground_stations of the config, one per tnc_client: "host:port latitude longitude [elevation]"
+(degrees and meters). The ones that are not in the list are at the reference site (observer_latitude,
+observer_longitude, observer_elevation), that is also where SatellitePredictor computes the passages and ephemerides
+
+Changing the site is a translation and a rotation of the satellite position (ITRF, km):
+    fromReference -> elevation/azimuth/distance seen from the reference (the ephemeris) to the same from each station,
+                     numpy only, Master does it for a whole batch of frames without asking SatellitePredictor
+    topocentric   -> ITRF positions to elevation/azimuth/distance, one station per timestamp (SatelliteSet)
+The cost depends on the number of frames, not on the number of stations
+"""
+
+import numpy as np
+
+
+WGS84_RADIUS = 6378.137              # km
+WGS84_FLATTENING = 1 / 298.257223563
+
+
+def parseStationList(station_list):
+    """
+    ["host:port latitude longitude [elevation]", ...] -> {(host, port): (latitude, longitude, elevation)}
+    """
+    stations = {}
+    for entry in station_list:
+        fields = str(entry).split()
+        if not fields:
+            continue
+        if len(fields) not in (3, 4):
+            raise ValueError(f"Invalid ground station {entry!r}, expected host:port latitude longitude [elevation]")
+        host, port = fields[0].rsplit(":", 1)
+        stations[(host.strip(), int(port))] = tuple(float(value) for value in fields[1:]) + ((0.0,) if len(fields) == 3 else ())
+    return stations
+
+
+def observerFrame(latitude, longitude, elevation=0.0):
+    """
+    Position (ITRF, km) of a site on the WGS84 ellipsoid and its rotation to east, north and up (rows of the matrix)
+    latitude, longitude in degrees, elevation in meters
+    """
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    e2 = WGS84_FLATTENING * (2 - WGS84_FLATTENING)
+    radius = WGS84_RADIUS / np.sqrt(1 - e2 * np.sin(latitude) ** 2)
+    height = elevation / 1000.0
+    position = np.array([
+        (radius + height) * np.cos(latitude) * np.cos(longitude),
+        (radius + height) * np.cos(latitude) * np.sin(longitude),
+        (radius * (1 - e2) + height) * np.sin(latitude),
+    ])
+    enu = np.array([
+        [-np.sin(longitude), np.cos(longitude), 0.0],
+        [-np.sin(latitude) * np.cos(longitude), -np.sin(latitude) * np.sin(longitude), np.cos(latitude)],
+        [np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude), np.sin(latitude)],
+    ])
+    return position, enu
+
+
+class GroundStations:
+
+    def __init__(self, reference, stations=None):
+        """
+        reference -> (latitude, longitude, elevation) of the site of the predictions, row 0
+        stations -> {(host, port): (latitude, longitude, elevation)}, a row each in that order
+        """
+        self.reference = tuple(reference)
+        self.stations = dict(stations or {})
+        self.index = {key: row for row, key in enumerate(self.stations, start=1)}
+
+        frames = [observerFrame(*self.reference)] + [observerFrame(*site) for site in self.stations.values()]
+        self.positions = np.array([position for position, _ in frames])     # (sites, 3)
+        self.enus = np.array([enu for _, enu in frames])                    # (sites, 3, 3)
+
+    def __len__(self):
+        return len(self.stations)
+
+    def row(self, tnc_client):
+        """
+        Row of the site of the tnc_client ((host, port), [host, port] or "host:port"), 0 (reference) if it is not known
+        """
+        if tnc_client is None or not self.stations:
+            return 0
+        if isinstance(tnc_client, str):
+            tnc_client = tnc_client.rsplit(":", 1)
+        return self.index.get((tnc_client[0], int(tnc_client[1])), 0)
+
+    def rows(self, tnc_clients):
+        return np.array([self.row(tnc_client) for tnc_client in tnc_clients], dtype=np.intp)
+
+    def toDict(self):
+        """
+        {"host:port": [latitude, longitude, elevation], ..., "default": reference} saved with the passages
+        """
+        sites = {f"{host}:{port}": list(site) for (host, port), site in self.stations.items()}
+        sites["default"] = list(self.reference)
+        return sites
+
+    def topocentric(self, itrf, rows):
+        """
+        itrf -> positions of the satellites (..., timestamps, 3) in km
+        rows -> site of each timestamp (timestamps,)
+        Returns elevations (degrees), azimuths (degrees) and distances (km) with the shape of itrf without the last axis
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        local = np.einsum("...tj,tij->...ti", itrf - self.positions[rows], self.enus[rows])
+        east, north, up = np.moveaxis(local, -1, 0)
+        distances = np.sqrt(east * east + north * north + up * up)
+        elevations = np.degrees(np.arcsin(up / distances))
+        azimuths = np.degrees(np.arctan2(east, north)) % 360.0
+        return elevations, azimuths, distances
+
+    def fromReference(self, elevations, azimuths, distances, rows):
+        """
+        Positions seen from the reference (arrays, one per frame) to the same positions seen from the site of each row
+        The rows 0 are returned as they are
+        """
+        elevations = np.array(elevations, dtype=np.float64)
+        azimuths = np.array(azimuths, dtype=np.float64)
+        distances = np.array(distances, dtype=np.float64)
+        rows = np.asarray(rows, dtype=np.intp)
+        moved = np.flatnonzero(rows)
+        if len(moved) == 0:
+            return elevations, azimuths, distances
+
+        elevation, azimuth = np.radians(elevations[moved]), np.radians(azimuths[moved])
+        local = distances[moved, None] * np.column_stack((np.cos(elevation) * np.sin(azimuth),
+                                                          np.cos(elevation) * np.cos(azimuth),
+                                                          np.sin(elevation)))
+        # the rotation is orthogonal, local @ enu goes back to ITRF
+        itrf = self.positions[0] + local @ self.enus[0]
+        elevations[moved], azimuths[moved], distances[moved] = self.topocentric(itrf, rows[moved])
+        return elevations, azimuths, distances
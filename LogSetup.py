@@ -0,0 +1,106 @@
+"""
+Common set up of the loggers of all the modules
+
+Every logger writes to the console and to its own file in log_folder, like before, but the handlers run in a
+thread of their own (QueueHandler + QueueListener). The thread that logs (an rpc request, the asyncio loop of
+TncService, ...) only puts the record in a queue, the formatting and the writes to the console and the file happen
+in the background, a slow disk or console does not block the rpc calls
+
+Configuration (config.ini):
+    log_level   -> DEBUG, INFO, WARNING or ERROR. At DEBUG every frame is logged, only for debugging
+
+Calling createLogger again for the same name does not add more handlers, the level is updated
+The hot paths check logger.isEnabledFor(logging.DEBUG) before building the messages of each frame
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listeners = {}
+_lock = threading.Lock()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    The records stay in the same process, they are put in the queue as they are and the message is formatted by
+    the listener (the default QueueHandler formats it here, in the thread that logs, so that it can be pickled)
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def parseLevel(level):
+    """
+    "DEBUG", "info", 20, ... -> logging level, INFO if it is not valid
+    """
+    if isinstance(level, int):
+        return level
+    level = logging.getLevelName(str(level).strip().upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def createLogger(name, log_folder, level="INFO", file_name=None, console=True, stream=None):
+    """
+    Returns the logger name with its console and file (log_folder/<file_name or name>.log) handlers behind a queue
+    stream -> where the console handler writes (sys.stderr by default)
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(parseLevel(level))
+
+    with _lock:
+        if name in _listeners:
+            return logger
+
+        formatter = logging.Formatter(FORMAT)
+        handlers = []
+        if console:
+            handlers.append(logging.StreamHandler(stream))
+        if log_folder:
+            os.makedirs(log_folder, exist_ok=True)
+            handlers.append(logging.FileHandler(os.path.join(log_folder, f"{file_name or name}.log")))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *handlers)
+        listener.start()
+
+        logger.addHandler(_QueueHandler(log_queue))
+        # the records of this logger are only handled here, not again by the root logger
+        logger.propagate = False
+        _listeners[name] = listener
+
+    return logger
+
+
+def setLevel(level):
+    """
+    Changes the level of all the loggers created with createLogger (log_level changed in the config)
+    """
+    level = parseLevel(level)
+    with _lock:
+        names = list(_listeners)
+    for name in names:
+        logging.getLogger(name).setLevel(level)
+
+
+def stopLogging():
+    """
+    Writes everything that is still in the queues, called at exit
+    """
+    with _lock:
+        listeners = list(_listeners.values())
+        _listeners.clear()
+    for listener in listeners:
+        listener.stop()
+
+
+atexit.register(stopLogging)
@@ -3,57 +3,46 @@ This is the master that will be responbile for the interactions between the diff
 """
 
 
-from xmlrpc.server import SimpleXMLRPCServer
-import xmlrpc.client
-from ConfigParser import ConfigParser
+from RpcServer import createRpcServer
+from RpcClient import createRpcProxy
+from ConfigParser import getConfig
+from LogSetup import createLogger
+from PassEphemeris import PassEphemeris
+from PassTimeline import PassTimeline
+from GroundStations import GroundStations, parseStationList
+from kiss import frame_to_bytes, ReadableFrame, ax25_source
+from Records import Frame, Passage
 import logging
+import json
+import contextlib
 import os
 import datetime
+import threading
 
 
+PASS_STATE_KEEP = 86400.0   # seconds a prepared passage is kept after its los, the spools can deliver frames late
+
 
 class Master:
     
     def __init__(self):
-        self.Config = ConfigParser()
-        self.Config.loadDefaultValues()
-        self.Config.loadConfig()
+        # loaded once per process and reloaded when config.ini changes (see ConfigParser.getConfig)
+        self.Config = getConfig()
         
-                # set up logger
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(logging.DEBUG)
-
-        # Create console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG)
-
-        # Create file handler
-        log_path = os.path.join(self.Config.get("log_folder"), f"{self.__class__.__name__}.log")
-        file_handler = logging.FileHandler(log_path)
-        file_handler.setLevel(logging.DEBUG)
-
-        # Define a common formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-        # Attach the formatter to handlers
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
-
-        # Add handlers to the logger
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        # set up logger, the level comes from log_level in the config (see LogSetup)
+        self.logger = createLogger(self.__class__.__name__, self.Config.get("log_folder"), self.Config.get("log_level"))
     
         
         # get the endpoints of the different modules
         self.data_warehouse_host = self.Config.get("data_warehouse_rpc_host")
         self.data_warehouse_port = self.Config.get("data_warehouse_rpc_port")
-        self.data_warehouse_proxy = xmlrpc.client.ServerProxy(f"http://{self.data_warehouse_host}:{self.data_warehouse_port}")
+        self.data_warehouse_proxy = createRpcProxy(self.Config, self.data_warehouse_host, self.data_warehouse_port)
         self.logger.debug(f"Data warehouse endpoint: {self.data_warehouse_host}:{self.data_warehouse_port}")
         
         # endpooints for the sat predictor
         self.sat_predict_host = self.Config.get("sat_predictor_rpc_host")
         self.sat_predict_port = self.Config.get("sat_predictor_rpc_port")
-        self.sat_predict_proxy = xmlrpc.client.ServerProxy(f"http://{self.sat_predict_host}:{self.sat_predict_port}")
+        self.sat_predict_proxy = createRpcProxy(self.Config, self.sat_predict_host, self.sat_predict_port)
         self.logger.debug(f"SatPredictor endpoint: {self.sat_predict_host}:{self.sat_predict_port}")
         
         
@@ -61,7 +50,7 @@ class Master:
         self.server_host = self.Config.get("master_rpc_host")
         self.server_port = self.Config.get("master_rpc_port")
         self.logger.debug(f"Master server endpoint: {self.server_host}:{self.server_port}")
-        self.server = SimpleXMLRPCServer((self.server_host, self.server_port))
+        self.server = createRpcServer(self.Config, self.server_host, self.server_port)
         self.registerFunctoins()
         
         # init TLE values to avoid problems
@@ -70,6 +59,67 @@ class Master:
         
         self.passage_number = -1  # number that will keep track of the orbits. used to help index them
         # maybe in  the future i could change this to somehting more cleaver
+        # it is shared by all the satellites, each passage gets its own number
+        
+        # local copy of the prepared passages, it is what allows to tag the frames without asking sat predictor
+        # passage_number -> {"passage_number": int, "satcat_id": int, "callsign": str, "aos": float, "los": float,
+        #                    "ephemeris": PassEphemeris | None}
+        self.pass_states = {}
+        # the same passages by time, the ones that cover the timestamp of a frame are found with a binary search
+        self.pass_timeline = PassTimeline()
+        # satcat_id -> passage_number of its last prepared passage and callsign (AX.25 source of its frames)
+        self.latest_passages = {}
+        self.callsigns = {}
+        
+        # the server can handle many requests at the same time, this protects the passage number and the pass states
+        self.passage_lock = threading.Lock()
+        
+        # site of each tnc_client, the ephemerides are from the observer and the frames get the position seen from their station
+        self.stations = GroundStations((self.Config.get("observer_latitude"), self.Config.get("observer_longitude"),
+                                        self.Config.get("observer_elevation")), parseStationList(self.Config.get("ground_stations")))
+        self.logger.debug(f"Ground stations: {self.stations.toDict()}")
+        
+        # last record id received from each spool of the tnc clients, used to ignore the frames that are sent again
+        os.makedirs(self.Config.get("spool_folder"), exist_ok=True)
+        self.spool_marks_path = os.path.join(self.Config.get("spool_folder"), "master_marks.json")
+        self.spool_marks = self.loadSpoolMarks()
+        self.spool_lock = threading.Lock()
+        # spool id -> lock held while a batch of that spool is checked and saved (see remoteReceiveKissBatch)
+        self.spool_locks = {}
+        
+        # the proxies are made again if the endpoints change in config.ini
+        self.Config.onChange(self.configChanged, keys=["data_warehouse_rpc_host", "data_warehouse_rpc_port",
+                                                       "sat_predictor_rpc_host", "sat_predictor_rpc_port",
+                                                       "rpc_client_pool_size", "rpc_client_timeout", "rpc_client_retries"])
+        self.Config.onChange(self.stationsChanged, keys=["ground_stations"])
+    
+    def stationsChanged(self, changed):
+        """
+        Called by the config when ground_stations changes, the next frames already use the new sites
+        The observer is the site of the ephemerides of sat predictor, it only changes with a restart of both
+        """
+        try:
+            self.stations = GroundStations(self.stations.reference, parseStationList(self.Config.get("ground_stations")))
+        except ValueError as e:
+            self.logger.error(f"Invalid ground_stations, keeping the previous ones: {e}")
+            return
+        self.logger.info(f"Ground stations updated: {self.stations.toDict()}")
+    
+    def configChanged(self, changed):
+        """
+        Called by the config when the endpoints or the settings of the rpc clients change
+        The calls already running finish with the old proxies
+        """
+        self.data_warehouse_host = self.Config.get("data_warehouse_rpc_host")
+        self.data_warehouse_port = self.Config.get("data_warehouse_rpc_port")
+        self.data_warehouse_proxy = createRpcProxy(self.Config, self.data_warehouse_host, self.data_warehouse_port)
+        
+        self.sat_predict_host = self.Config.get("sat_predictor_rpc_host")
+        self.sat_predict_port = self.Config.get("sat_predictor_rpc_port")
+        self.sat_predict_proxy = createRpcProxy(self.Config, self.sat_predict_host, self.sat_predict_port)
+        
+        self.logger.info(f"Endpoints updated, data warehouse: {self.data_warehouse_host}:{self.data_warehouse_port}, "
+                         f"SatPredictor: {self.sat_predict_host}:{self.sat_predict_port}")
     
     def registerFunctoins(self):
         """
@@ -78,8 +128,10 @@ class Master:
 
         self.server.register_function(self.remoteUpdateTle)
         self.server.register_function(self.remoteReceiveKiss)
-        self.server.register_function(self.remotePreparePass)
-        self.server.register_function(self.remoteEndPass)
+        self.server.register_function(self.remoteReceiveKissBatch)
+        self.server.register_function(self.remoteGetSpoolMark)
+        self.server.register_function(self.remotePreparePass, max_concurrency=1)
+        self.server.register_function(self.remoteEndPass, max_concurrency=1)
         
         
     ######################################################################################
@@ -89,32 +141,144 @@ class Master:
     #
     ######################################################################################
     
-    def getCurrentPassageNumber(self):
+    def getCurrentPassageNumber(self, elevation=None, satcat_id=None):
         """
         Gets the current passage number
         
         -1 means that there are satellites in line of sight
         here I will implement the logic that will see if the satellite is in line of sight or not
         if its not, it will return -1
+        
+        if the elevation is already known it is used, otherwise sat predictor is asked for it
+        the number is the one of the last passage prepared for the satellite (the main one if satcat_id is None)
         """
         
-        try:
-            elevation, azimuth, distance = self.sat_predict_proxy.remoteGetSatellitePosition()
-        except Exception as e:
-            self.logger.error(f"Error while trying to get satellite position in getCurrentPassage: {e}")
-            return -1
+        if elevation is None:
+            try:
+                elevation, azimuth, distance = self.sat_predict_proxy.remoteGetSatellitePosition()
+            except Exception as e:
+                self.logger.error(f"Error while trying to get satellite position in getCurrentPassage: {e}")
+                return -1
         
         return_number = -1
         
         if elevation >= 0:
-            return_number = self.passage_number
+            if satcat_id is None:
+                return_number = self.passage_number
+            else:
+                return_number = self.latest_passages.get(satcat_id, -1)
         
-        self.logger.debug(f"Getting the current passage number: {return_number}")
+        self.logger.debug("Getting the current passage number: %s", return_number)
                     
         return return_number
     
+    def matchesCallsign(self, source, satcat_id):
+        """
+        True if the AX.25 source of the frame is the callsign of the satellite (with or without the SSID)
+        """
+        callsign = self.callsigns.get(satcat_id)
+        return bool(callsign) and source is not None and (source == callsign or source.split("-")[0] == callsign)
+    
+    def choosePassState(self, timestamp, source=None):
+        """
+        Of the prepared passages that cover the timestamp, the one of the satellite whose callsign is the AX.25 source
+        of the frame, otherwise the one where the satellite is highest
+        Returns (pass_state, position) or None if no passage with an ephemeris covers the timestamp
+        """
+        
+        candidates = []
+        for pass_state in self.pass_timeline.at(timestamp):
+            ephemeris = pass_state["ephemeris"]
+            if ephemeris is not None and ephemeris.contains(timestamp):
+                candidates.append((pass_state, ephemeris.position(timestamp)))
+        if not candidates:
+            return None
+        
+        for pass_state, position in candidates:
+            if self.matchesCallsign(source, pass_state["satcat_id"]):
+                return pass_state, position
+        return max(candidates, key=lambda candidate: candidate[1][0])
+    
+    def chooseVisible(self, visible, source=None):
+        """
+        Same as choosePassState with the answer of remoteGetVisibleSatellites for one timestamp
+        Returns the state (passage_number, elevation, azimuth, distance)
+        """
+        
+        if not visible:
+            return (-1, float("nan"), float("nan"), float("nan"))
+        
+        # they come sorted by elevation, the first one is the highest
+        chosen = visible[0]
+        for satellite in visible:
+            if self.matchesCallsign(source, satellite[0]):
+                chosen = satellite
+                break
+        satcat_id, elevation, azimuth, distance = chosen
+        return self.getCurrentPassageNumber(elevation, satcat_id), elevation, azimuth, distance
+    
+    def getSatelliteState(self, timestamp: float, kiss: bytes = None, tnc_client=None):
+        """
+        Returns the passage number and the position of the satellite (elevation, azimuth, distance) at the timestamp
+        seen from the site of the tnc_client that received the frame (ground_stations, the observer if it is not there)
+        
+        With many satellites the frame goes to the one that sent it (AX.25 source equal to its callsign),
+        or to the highest one when it can not be told
+        If the timestamp is inside a prepared passage everything is answered locally from its ephemeris
+        otherwise sat predictor is asked (a single call) for the satellites above the horizon
+        Raises the exception of the rpc call if sat predictor can not be reached
+        """
         
+        kisses = [kiss] if kiss is not None else None
+        tnc_clients = [tnc_client] if tnc_client is not None else None
+        return self.getSatelliteStates([timestamp], kisses, tnc_clients)[0]
+    
+    def getSatelliteStates(self, timestamps, kisses=None, tnc_clients=None):
+        """
+        Same as getSatelliteState for a list of timestamps (and the frames, to use the AX.25 source, and the
+        tnc_clients (host, port) that received them)
+        The ones that are not covered by the ephemerides are asked to sat predictor in a single call
+        The ephemerides are from the observer, the frames of the other stations are moved to their site together
+        (GroundStations.fromReference, numpy only)
+        """
         
+        sources = [ax25_source(kiss) for kiss in kisses] if kisses is not None else [None] * len(timestamps)
+        stations = self.stations
+        rows = stations.rows(tnc_clients) if tnc_clients is not None else [0] * len(timestamps)
+        states = [None] * len(timestamps)
+        local = []
+        missing = []
+        
+        for index, (timestamp, source) in enumerate(zip(timestamps, sources)):
+            chosen = self.choosePassState(timestamp, source)
+            if chosen is not None:
+                pass_state, position = chosen
+                states[index] = (pass_state["passage_number"], *position)
+                if rows[index]:
+                    local.append(index)
+            else:
+                missing.append(index)
+        
+        if local:
+            elevations, azimuths, distances = stations.fromReference([states[index][1] for index in local],
+                                                                     [states[index][2] for index in local],
+                                                                     [states[index][3] for index in local],
+                                                                     [rows[index] for index in local])
+            for index, elevation, azimuth, distance in zip(local, elevations.tolist(), azimuths.tolist(), distances.tolist()):
+                states[index] = (states[index][0], elevation, azimuth, distance)
+        
+        if missing:
+            # sat predictor has the same ground_stations, the positions already come from the site of each frame
+            clients = [list(tnc_clients[index]) for index in missing] if tnc_clients is not None else None
+            if clients is None:
+                visible = self.sat_predict_proxy.remoteGetVisibleSatellites([timestamps[index] for index in missing])
+            else:
+                visible = self.sat_predict_proxy.remoteGetVisibleSatellites([timestamps[index] for index in missing], 0.0, clients)
+            for index, satellites in zip(missing, visible):
+                states[index] = self.chooseVisible(satellites, sources[index])
+        
+        return states
+    
     ######################################################################################
     #
     # Remote functions that will be called by the different modules
@@ -130,45 +294,85 @@ class Master:
         
         in a way this is just a function that will increment the local passage number
             but it will also trigger master to acquire information about the next passage to store in on the database
+        
+        The passages of different satellites can overlap, each one is kept until PASS_STATE_KEEP after its los
+        Returns the passage number, -1 if the passage could not be created in the data warehouse
         """
         
-        self.passage_number += 1
-        self.logger.debug(f"New passage number: {self.passage_number}")
+        with self.passage_lock:
+            self.passage_number += 1
+            passage_number = self.passage_number
+        self.logger.debug(f"New passage number: {passage_number} (satellite {data_dict['satcat_id']})")
         
-        # add the passage number to the data_dict
-        data_dict["passage_number"] = self.passage_number
-        # add the frame list
-        data_dict["frame_list"] = []
-        data_dict["frame_count"] = 0
-        # add gs clients
-        data_dict["gs_clients"] = []
+        # the passage number, frame list, frame count and gs clients are added to the prediction
+        passage = Passage.fromPrediction(data_dict, passage_number)
+        # the sites of the stations, the positions of the frames of this passage are seen from them
+        passage.observers = self.stations.toDict()
         self.logger.warning("[TODO] - Implement logic to get the active ground stations")
         
+        # the ephemeris stays here, it is only needed to tag the frames
+        ephemeris = data_dict.pop("ephemeris", {})
+        try:
+            ephemeris = PassEphemeris.fromDict(ephemeris) if ephemeris else None
+        except Exception as e:
+            self.logger.error(f"Error while loading the ephemeris of the passage, falling back to sat predictor: {e}")
+            ephemeris = None
+        
+        pass_state = {
+            "passage_number": passage_number,
+            "satcat_id": data_dict["satcat_id"],
+            "callsign": data_dict["callsign"],
+            "aos": data_dict["aos"],
+            "los": data_dict["los"],
+            "ephemeris": ephemeris,
+        }
         
-        for key in data_dict:
-            self.logger.debug(f"  {key}: {type(data_dict[key])}")
+        self.logger.debug(f"  {passage}")
         
         # forward the data to the data warehouse
         try:
-            self.data_warehouse_proxy.remoteCreatePassage(data_dict)
+            created = self.data_warehouse_proxy.remoteCreatePassage(passage.toWire())
         except Exception as e:
             self.logger.error(f"Error while forwarding passage to the data warehouse: {e}")
-            return False
+            return -1
+        if not created:
+            # wrong format or the number is already open there (master was restarted), its frames would go to another passage
+            self.logger.error(f"The data warehouse refused passage {passage_number}")
+            return -1
         
-        return True
+        # only a passage that the data warehouse has is used to tag the frames
+        with self.passage_lock:
+            now = datetime.datetime.now().timestamp()
+            pass_states = {number: state for number, state in self.pass_states.items() if state["los"] + PASS_STATE_KEEP >= now}
+            pass_states[passage_number] = pass_state
+            
+            # replaced as a whole, remoteReceiveKiss never sees half of the new passage
+            self.pass_states = pass_states
+            self.pass_timeline = PassTimeline((state["aos"], state["los"], state) for state in pass_states.values())
+            self.latest_passages[pass_state["satcat_id"]] = passage_number
+            if pass_state["callsign"]:
+                self.callsigns[pass_state["satcat_id"]] = pass_state["callsign"].upper()
+        
+        return passage_number
     
-    def remoteEndPass(self):
+    def remoteEndPass(self, passage_number=-1):
         """
         Function that is triggered when current pass reaches LOS
         it will tirgger the datawarehoues to save the passage
         it will also trigger satellite predictor to update the tle
+        
+        passage_number -> the passage that ended (the return of remotePreparePass), -1 saves all of them
+        the passages of the other satellites that are still open are not touched
         """
         
-        self.logger.debug(f"Ending passage number: {self.passage_number}")
+        self.logger.debug(f"Ending passage number: {passage_number}")
         
         # forward the data to the data warehouse
         try:
-            self.data_warehouse_proxy.remoteSavePassage()
+            if passage_number == -1:
+                self.data_warehouse_proxy.remoteSavePassage()
+            else:
+                self.data_warehouse_proxy.remoteSavePassage(passage_number)
         except Exception as e:
             self.logger.error(f"Error while ending passage to the data warehouse: {e}")
             return False
@@ -183,53 +387,51 @@ class Master:
         
         return True
         
-    def remoteReceiveKiss(self, kiss: str, tnc_client_ip: str, tnc_client_port: int, timestamp: float):
+    def remoteReceiveKiss(self, kiss: bytes, tnc_client_ip: str, tnc_client_port: int, timestamp: float):
         """
         Called by kiss client when it receives a new kiss packet
-        kiss -> the frame represented in a string "0x86 0xa2 0x86 0xa2 0x86 0xa2 ..."
-            [check] - maybe it would be better to send the bytes directly
+        kiss -> the frame as raw bytes (xmlrpc base64)
+            the old string representation "0x86 0xa2 0x86 0xa2 0x86 0xa2 ..." is still accepted
         host -> the host that sent the packet
         port -> the port that sent the packet
         timestamp -> the time the packet was received
             represented as a float
             
         Recevies the frame
-        Gets the current information about the satellite position
-        Gets the passage number
+        Gets the information about the satellite position at the time the frame was received
+        Gets the passage number (both come from the prepared passages when possible, see getSatelliteState)
         Packages the data on a dictionary
         Sends to the datawarehouse
 
         It will aquire some infromation about the satellite position and send it all to the data warehouse            
         """
         
-        self.logger.info(f"Received new KISS data: {kiss}")
-        self.logger.info(f"  Host: {tnc_client_ip}, Port: {tnc_client_port}, Timestamp: {timestamp}")
-        human_readable_time = datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            kiss = frame_to_bytes(kiss)
+        except Exception as e:
+            self.logger.error(f"Invalid KISS data received: {e}")
+            return False
+        
+        # every frame is only logged at DEBUG, ReadableFrame is formatted by the logger only if the record is emitted
+        self.logger.debug("Received new KISS data: %s", ReadableFrame(kiss))
+        self.logger.debug("  Host: %s, Port: %s, Timestamp: %s", tnc_client_ip, tnc_client_port, timestamp)
         
-        # get the information about the satellite location
+        # get the information about the satellite location and the passage number
         try:
-            elevation, azimuth, distance = self.sat_predict_proxy.remoteGetSatellitePosition()
+            state = self.getSatelliteState(timestamp, kiss, (tnc_client_ip, tnc_client_port))
         except Exception as e:
             self.logger.error(f"Error while trying to get satellite position: {e}")
             return False
         
-        self.logger.debug(f"  Satellite position: Elevation: {elevation:.2f}°, Azimuth: {azimuth:.2f}°")
-        
-        passage_number = self.getCurrentPassageNumber()
+        passage_number, elevation, azimuth, distance = state
+        self.logger.debug("  Satellite position: Elevation: %.2f°, Azimuth: %.2f°", elevation, azimuth)
         
         if passage_number == -1:
-            self.logger.debug(f"  Satellite not in line of sight, not saving data")
+            self.logger.debug("  Satellite not in line of sight, not saving data")
             return False
         
-        output_dict = {
-            "timestamp": timestamp,                          # float timestamp when the frame was received
-            "elevation": elevation,                          # float elevation of the satellite
-            "azimuth": azimuth,                              # float azimuth of the satellite
-            "distance": distance,                            # float distance of the satellite
-            "tnc_client": (tnc_client_ip, tnc_client_port),    # [str,int] tnc_client that decoded the message
-            "passage_number": passage_number,                # int passage number
-            "kiss": kiss,                                    # str representaiton of the frame (0x86 0xa2 0x86 0xa2 0x86 0xa2 ...)
-        }
+        frame = Frame(kiss, tnc_client_ip, tnc_client_port, timestamp)
+        frame.setState(state)
         
         # who is going to group the frames into passges? the frame should be inserted in a dictionary of passages
         # when it is out of a passage, should be in a key of its own
@@ -237,8 +439,8 @@ class Master:
         
         # forward the data to the data warehouse
         try:
-            self.data_warehouse_proxy.remoteSaveKiss(output_dict)
-            self.logger.debug(f"Data forwarded to the data warehouse")  
+            self.data_warehouse_proxy.remoteSaveKiss(frame.toWire())
+            self.logger.debug("Data forwarded to the data warehouse")
         except Exception as e:
             self.logger.error(f"Error while forwarding KISS to the data warehouse: {e}")
             return False
@@ -246,6 +448,138 @@ class Master:
         return True
     
     
+    def remoteReceiveKissBatch(self, frames: list):
+        """
+        Same as remoteReceiveKiss for many frames in a single call
+        frames -> list of [kiss, tnc_client_ip, tnc_client_port, timestamp] or [kiss, tnc_client_ip, tnc_client_port, timestamp, key]
+            each frame keeps its own timestamp
+            key -> "<spool id>:<record id>" of the frames that come from a spool (see Spool), frames with a key
+                   that was already received are ignored, so a batch that is sent again is only saved once
+        
+        The positions are obtained together (getSatelliteStates) and all the frames are sent to the
+        data warehouse in a single remoteSaveKissBatch
+        Returns a list of bools, one for each frame, same meaning as the return of remoteReceiveKiss
+        (duplicated frames are True)
+        Raises if sat predictor or the data warehouse can not be reached, so the sender knows it has to try again
+        
+        The check of the keys, the save and the new mark are done holding the lock of each spool of the batch,
+        a batch sent again while the first one is still running waits for it and then is seen as repeated.
+        The record ids of a spool must go up inside the batch, otherwise the whole batch is refused (ValueError)
+        """
+        
+        results = [False] * len(frames)
+        parsed = []
+        keys = {}
+        for index, frame in enumerate(frames):
+            try:
+                record = Frame.fromTnc(frame)
+                key = None
+                if len(frame) > 4:
+                    spool_id, record_id = frame[4].rsplit(":", 1)
+                    key = (spool_id, int(record_id))
+                    keys.setdefault(spool_id, []).append(key[1])
+                parsed.append((index, record, key))
+            except Exception as e:
+                self.logger.error(f"Invalid KISS data received: {e}")
+        
+        for spool_id, record_ids in keys.items():
+            if any(previous >= record_id for previous, record_id in zip(record_ids, record_ids[1:])):
+                raise ValueError(f"Record ids of spool {spool_id} are not in order in the batch, refused")
+        
+        with contextlib.ExitStack() as stack:
+            for spool_id in sorted(keys):
+                stack.enter_context(self.spoolLock(spool_id))
+            
+            with self.spool_lock:
+                marks = {spool_id: self.spool_marks.get(spool_id, 0) for spool_id in keys}
+            valid = []
+            for index, record, key in parsed:
+                # the ids go up, the repeated ones of a spool can only be at the start of its frames
+                if key is not None and key[1] <= marks[key[0]]:
+                    results[index] = True
+                    continue
+                valid.append((index, record, key))
+            
+            self.logger.info("Received batch of %d KISS frames (%d invalid or repeated)", len(frames), len(frames) - len(valid))
+            
+            if valid:
+                self.saveFrames(valid, results)
+            
+            # only now the frames are safe in the data warehouse
+            received_marks = {key[0]: key[1] for _, _, key in valid if key is not None}
+            if received_marks:
+                self.updateSpoolMarks(received_marks)
+        
+        return results
+    
+    def saveFrames(self, valid, results):
+        """
+        Positions of the frames of remoteReceiveKissBatch and a single remoteSaveKissBatch to the data warehouse
+        valid -> list of (index, Frame, key), the result of each one is written in results[index]
+        """
+        
+        states = self.getSatelliteStates([record.timestamp for _, record, _ in valid], [record.kiss for _, record, _ in valid],
+                                         [(record.tnc_host, record.tnc_port) for _, record, _ in valid])
+        
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        indexes = []
+        output_list = []
+        for (index, record, _), state in zip(valid, states):
+            if debug:
+                self.logger.debug("  %s:%s %s %s", record.tnc_host, record.tnc_port, record.timestamp, ReadableFrame(record.kiss))
+            if state[0] == -1:
+                if debug:
+                    self.logger.debug("  Satellite not in line of sight, not saving frame")
+                continue
+            record.setState(state)
+            indexes.append(index)
+            output_list.append(record.toWire())
+        
+        # forward all the frames to the data warehouse at once
+        if output_list:
+            saved = self.data_warehouse_proxy.remoteSaveKissBatch(output_list)
+            self.logger.debug("%d/%d frames saved by the data warehouse", sum(saved), len(output_list))
+            for index, result in zip(indexes, saved):
+                results[index] = result
+    
+    def spoolLock(self, spool_id):
+        """
+        Lock of a spool, held from the check of the keys of a batch until its mark is updated
+        """
+        with self.spool_lock:
+            if spool_id not in self.spool_locks:
+                self.spool_locks[spool_id] = threading.Lock()
+            return self.spool_locks[spool_id]
+    
+    def remoteGetSpoolMark(self, spool_id: str):
+        """
+        Last record id of the spool that was saved, 0 if nothing was received from it
+        Asked by SpoolDrainer before its first batch, if the spool gives ids that are not after this one
+        its frames would be ignored as repeated, so the spool takes a new id
+        """
+        with self.spool_lock:
+            return self.spool_marks.get(spool_id, 0)
+    
+    def loadSpoolMarks(self):
+        """
+        Last record id received from each spool, it is saved so that it survives a restart of master
+        """
+        try:
+            with open(self.spool_marks_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+    
+    def updateSpoolMarks(self, received_marks):
+        with self.spool_lock:
+            for spool_id, record_id in received_marks.items():
+                self.spool_marks[spool_id] = max(record_id, self.spool_marks.get(spool_id, 0))
+            
+            with open(self.spool_marks_path + ".tmp", "w") as file:
+                json.dump(self.spool_marks, file)
+            os.replace(self.spool_marks_path + ".tmp", self.spool_marks_path)
+    
+    
     def remoteUpdateTle(self, new_tle: str, timestamp: float):
         """
         Called by sat predict when it updates a new TLE
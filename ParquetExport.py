@@ -0,0 +1,226 @@
+"""
+Export of the frames of the archive (Archive) to parquet files, to load many passages in pandas/pyarrow for the analysis
+
+The files are partitioned by month and by station (hive style, parquet_folder/month=2024-05/station=10.0.0.3_8000/...)
+so a query for a station or a period only opens the files of that partition, and inside the files the filters on
+the other columns are pushed down to the row groups (readFrames)
+
+Columns:
+    timestamp       timestamp[us, UTC]
+    elevation       float64
+    azimuth         float64
+    distance        float64
+    passage_number  int32
+    tnc_host        string
+    tnc_port        int32
+    kiss            binary (the frame as bytes, no hex strings)
+    month, station  partition columns
+
+The export is incremental, each run only takes the frames of the archive that were not exported yet (the last id
+exported is saved in parquet_folder/_export_state.json) and writes new files next to the old ones. The files of a
+batch are named after its first id (part-<first id>-<n>.parquet), if a run stops after writing a batch but before
+saving the state the next run writes the same batch again and first removes what was left of it, so no frame is
+exported twice
+compact() joins the small files of each partition into a single file
+
+pyarrow is optional, it is only needed to use this module:
+    pip install pyarrow
+
+Run from the root of the repo:
+    python ParquetExport.py [--compact]
+"""
+
+from datetime import datetime, timezone
+import argparse
+import glob
+import json
+import os
+import time
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from Archive import FRAME_COLUMNS
+
+
+STATE_FILE = "_export_state.json"
+EXPORT_BATCH = 100000     # frames read from the archive at a time
+
+
+def requirePyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is needed for the parquet export: pip install pyarrow")
+
+
+def frameSchema():
+    requirePyarrow()
+    return pa.schema([
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("elevation", pa.float64()),
+        ("azimuth", pa.float64()),
+        ("distance", pa.float64()),
+        ("passage_number", pa.int32()),
+        ("tnc_host", pa.string()),
+        ("tnc_port", pa.int32()),
+        ("kiss", pa.binary()),
+        ("month", pa.string()),
+        ("station", pa.string()),
+    ])
+
+
+def partitioning():
+    requirePyarrow()
+    return ds.partitioning(pa.schema([("month", pa.string()), ("station", pa.string())]), flavor="hive")
+
+
+def loadState(folder):
+    try:
+        with open(os.path.join(folder, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"last_id": 0}
+
+
+def saveState(folder, state):
+    path = os.path.join(folder, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def rowsToTable(rows):
+    """
+    rows -> tuples (id, *FRAME_COLUMNS) from the archive
+    """
+    columns = list(zip(*rows)) if rows else [[] for _ in range(len(FRAME_COLUMNS) + 1)]
+    values = dict(zip(["id"] + FRAME_COLUMNS, columns))
+
+    times = [datetime.fromtimestamp(timestamp, timezone.utc) for timestamp in values["timestamp"]]
+    return pa.table({
+        "timestamp": pa.array(times, pa.timestamp("us", tz="UTC")),
+        "elevation": pa.array(values["elevation"], pa.float64()),
+        "azimuth": pa.array(values["azimuth"], pa.float64()),
+        "distance": pa.array(values["distance"], pa.float64()),
+        "passage_number": pa.array(values["passage_number"], pa.int32()),
+        "tnc_host": pa.array(values["tnc_host"], pa.string()),
+        "tnc_port": pa.array(values["tnc_port"], pa.int32()),
+        "kiss": pa.array(values["kiss"], pa.binary()),
+        "month": pa.array([moment.strftime("%Y-%m") for moment in times], pa.string()),
+        "station": pa.array([f"{host}_{port}" for host, port in zip(values["tnc_host"], values["tnc_port"])], pa.string()),
+    }, schema=frameSchema())
+
+
+def exportFrames(archive, folder):
+    """
+    Writes the frames of the archive that were not exported yet, returns how many were written
+    """
+    requirePyarrow()
+    os.makedirs(folder, exist_ok=True)
+    state = loadState(folder)
+
+    exported = 0
+    connection = archive.readConnection()
+    while True:
+        rows = connection.execute(
+            f"SELECT id, {', '.join(FRAME_COLUMNS)} FROM frames WHERE id > ? ORDER BY id LIMIT ?",
+            (state["last_id"], EXPORT_BATCH)).fetchall()
+        if not rows:
+            break
+
+        # files of this batch left by a run that stopped before saving the state, the batch replaces them
+        first_id = rows[0][0]
+        for leftover in glob.glob(os.path.join(folder, "month=*", "station=*", f"part-{first_id}-*.parquet")):
+            os.remove(leftover)
+
+        ds.write_dataset(rowsToTable(rows), folder, format="parquet", partitioning=partitioning(),
+                         basename_template=f"part-{first_id}-{{i}}.parquet",
+                         existing_data_behavior="overwrite_or_ignore")
+        exported += len(rows)
+        state["last_id"] = rows[-1][0]
+        # saved after each batch, if the export stops in the middle it continues from here
+        saveState(folder, state)
+
+    return exported
+
+
+def compact(folder, min_files=2):
+    """
+    Joins all the files of each partition into a single file, returns the number of partitions that were compacted
+    Only the partitions with at least min_files files are rewritten
+    """
+    requirePyarrow()
+    compacted = 0
+    for month in sorted(os.listdir(folder)):
+        if not month.startswith("month="):
+            continue
+        for station in sorted(os.listdir(os.path.join(folder, month))):
+            partition = os.path.join(folder, month, station)
+            files = sorted(name for name in os.listdir(partition) if name.endswith(".parquet"))
+            if len(files) < max(min_files, 2):
+                continue
+
+            table = pa.concat_tables([pq.read_table(os.path.join(partition, name)) for name in files])
+            table = table.sort_by("timestamp")
+            # the new file is complete before the old ones are removed
+            name = f"compact-{uuid.uuid4().hex[:12]}.parquet"
+            pq.write_table(table, os.path.join(partition, name + ".tmp"))
+            os.replace(os.path.join(partition, name + ".tmp"), os.path.join(partition, name))
+            for old in files:
+                os.remove(os.path.join(partition, old))
+            compacted += 1
+    return compacted
+
+
+def readFrames(folder, start=None, end=None, min_elevation=None, stations=None, columns=None):
+    """
+    Reads the exported frames as a pyarrow table (table.to_pandas() for pandas)
+    The filters on month and station only open the files of those partitions, the rest are pushed to the row groups
+    start, end -> epoch
+    stations -> list of "host_port"
+    """
+    requirePyarrow()
+    dataset = ds.dataset(folder, format="parquet", partitioning=partitioning(), exclude_invalid_files=True)
+
+    conditions = []
+    if start is not None:
+        start = datetime.fromtimestamp(start, timezone.utc)
+        conditions.append(ds.field("timestamp") >= pa.scalar(start, pa.timestamp("us", tz="UTC")))
+        conditions.append(ds.field("month") >= start.strftime("%Y-%m"))
+    if end is not None:
+        end = datetime.fromtimestamp(end, timezone.utc)
+        conditions.append(ds.field("timestamp") < pa.scalar(end, pa.timestamp("us", tz="UTC")))
+        conditions.append(ds.field("month") <= end.strftime("%Y-%m"))
+    if min_elevation is not None:
+        conditions.append(ds.field("elevation") >= min_elevation)
+    if stations is not None:
+        conditions.append(pc.is_in(ds.field("station"), pa.array(stations, pa.string())))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+if __name__ == "__main__":
+    from Archive import Archive
+    from ConfigParser import getConfig
+
+    parser = argparse.ArgumentParser(description="Exports the new frames of the archive to parquet")
+    parser.add_argument("--compact", action="store_true", help="join the files of each partition after the export")
+    args = parser.parse_args()
+
+    config = getConfig()
+    archive = Archive(config.get("archive_path"))
+    folder = config.get("parquet_folder")
+
+    start = time.perf_counter()
+    print(f"Exported {exportFrames(archive, folder)} frames to {folder} in {time.perf_counter() - start:.2f} s")
+    if args.compact:
+        print(f"Compacted {compact(folder)} partitions")
+    archive.close()
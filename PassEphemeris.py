@@ -0,0 +1,91 @@
+"""
+Interpolated ephemeris of a single passage
+
+SatellitePredictor samples the elevation, azimuth and distance of the satellite over the whole passage
+(AOS to LOS, evenly spaced) and fits a cubic spline to it. After that the position at any time inside
+the passage is just the evaluation of a polynomial, no need to run SGP4 again.
+
+The samples are evenly spaced so finding the right piece of the spline is a division, the lookup is O(1)
+"""
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+
+class PassEphemeris:
+
+    def __init__(self, timestamps, elevations, azimuths, distances):
+        """
+        timestamps -> evenly spaced float epochs covering the passage
+        elevations, azimuths, distances -> position of the satellite at each timestamp (degrees, degrees, km)
+        """
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(self.timestamps) < 2:
+            raise ValueError("At least two samples are needed to build an ephemeris")
+
+        self.start = float(self.timestamps[0])
+        self.end = float(self.timestamps[-1])
+        self.step = float(self.timestamps[1] - self.timestamps[0])
+
+        self.elevations = np.asarray(elevations, dtype=np.float64)
+        self.distances = np.asarray(distances, dtype=np.float64)
+        # azimuth jumps from 360 to 0 when passing north, unwrap it so that the spline stays smooth
+        self.azimuths = np.unwrap(np.asarray(azimuths, dtype=np.float64), period=360.0)
+
+        values = np.column_stack((self.elevations, self.azimuths, self.distances))
+        self.spline = CubicSpline(self.timestamps, values)
+
+        # coefficients per interval as python floats, evaluating a single time with numpy is slower than plain python
+        # coefficients[i] -> [[c3, c2, c1, c0] for elevation, azimuth, distance]
+        self.coefficients = self.spline.c.transpose(1, 2, 0).tolist()
+        self.breakpoints = self.timestamps.tolist()
+
+        self.max_error = None   # [elevation, azimuth, distance], filled by whoever validates the ephemeris
+
+    def contains(self, timestamp):
+        """
+        True if the timestamp is inside the passage covered by this ephemeris
+        """
+        return self.start <= timestamp <= self.end
+
+    def position(self, timestamp):
+        """
+        Returns the elevation (degrees), azimuth (degrees) and distance (km) at the given timestamp
+        The timestamp must be inside the ephemeris (check with contains)
+        """
+        index = int((timestamp - self.start) / self.step)
+        if index >= len(self.coefficients):
+            index = len(self.coefficients) - 1
+        dx = timestamp - self.breakpoints[index]
+
+        elevation, azimuth, distance = [((c3 * dx + c2) * dx + c1) * dx + c0 for c3, c2, c1, c0 in self.coefficients[index]]
+        return elevation, azimuth % 360.0, distance
+
+    def positions(self, timestamps):
+        """
+        Same as position but for an array of timestamps
+        Returns three numpy arrays: elevations, azimuths and distances
+        """
+        values = self.spline(np.asarray(timestamps, dtype=np.float64))
+        return values[:, 0], values[:, 1] % 360.0, values[:, 2]
+
+    def toDict(self):
+        """
+        Converts the ephemeris to a dictionary that can be sent over xmlrpc or saved to json
+        """
+        return {
+            "start": self.start,
+            "step": self.step,
+            "elevation": self.elevations.tolist(),
+            "azimuth": (self.azimuths % 360.0).tolist(),
+            "distance": self.distances.tolist(),
+        }
+
+    @classmethod
+    def fromDict(cls, data_dict):
+        """
+        Builds the ephemeris back from the output of toDict
+        """
+        count = len(data_dict["elevation"])
+        timestamps = data_dict["start"] + np.arange(count) * data_dict["step"]
+        return cls(timestamps, data_dict["elevation"], data_dict["azimuth"], data_dict["distance"])
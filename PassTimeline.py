@@ -0,0 +1,72 @@
+"""
+Passages of all the tracked satellites in a single timeline
+
+resolveConflicts (SatellitePredictor) -> the antennas can only follow one satellite at a time, when passages overlap
+    the one of the satellite with more priority (first in the satellites of the config) is tracked, on a tie the
+    highest one. The others are kept, frames can still arrive from them, but with tracked False
+
+PassTimeline (Master) -> finds the passages that cover a timestamp with a binary search, the time to tag a frame
+    does not grow with the number of satellites or passages
+"""
+
+from bisect import bisect_right
+
+
+def resolveConflicts(passes, priority):
+    """
+    passes -> predicted passages (dictionaries with satcat_id, aos, los and max_elevation), sorted by aos
+    priority -> {satcat_id: rank}, lower is more important
+    Returns new dictionaries with "tracked" (bool) and "conflicts" (satcat_id of the passages that overlap it)
+    """
+    result = [dict(sat_pass, tracked=False, conflicts=[]) for sat_pass in passes]
+
+    # overlaps, the passages are sorted by aos so the scan stops at the first one that starts after the los
+    overlaps = [[] for _ in result]
+    for index, sat_pass in enumerate(result):
+        for other in range(index + 1, len(result)):
+            if result[other]["aos"] >= sat_pass["los"]:
+                break
+            overlaps[index].append(other)
+            overlaps[other].append(index)
+            sat_pass["conflicts"].append(result[other]["satcat_id"])
+            result[other]["conflicts"].append(sat_pass["satcat_id"])
+
+    # greedy by importance, a passage is tracked if none of the ones it overlaps was already chosen
+    order = sorted(range(len(result)), key=lambda index: (priority.get(result[index]["satcat_id"], len(priority)),
+                                                          -result[index]["max_elevation"]))
+    for index in order:
+        if not any(result[other]["tracked"] for other in overlaps[index]):
+            result[index]["tracked"] = True
+    return result
+
+
+class PassTimeline:
+    """
+    Intervals [aos, los) with an item each (the state of a prepared passage in Master)
+    The time is split at every aos and los, each segment has the tuple of the items that cover it
+    Built once when the passages change, O(passages^2) but there are only a few hundred of them
+    """
+
+    def __init__(self, intervals=()):
+        """
+        intervals -> [(aos, los, item), ...]
+        """
+        intervals = list(intervals)
+        points = sorted({point for aos, los, _ in intervals for point in (aos, los)})
+
+        self.breakpoints = points
+        # segment i goes from points[i] to points[i + 1], after the last point there is nothing
+        self.segments = [tuple(item for aos, los, item in intervals if aos <= start < los) for start in points]
+        self.items = [item for _, _, item in intervals]
+
+    def __len__(self):
+        return len(self.items)
+
+    def at(self, timestamp):
+        """
+        Items whose interval contains the timestamp (aos <= timestamp < los), an empty tuple if there are none
+        """
+        index = bisect_right(self.breakpoints, timestamp) - 1
+        if index < 0:
+            return ()
+        return self.segments[index]
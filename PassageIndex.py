@@ -0,0 +1,98 @@
+"""
+In memory index of the frames of an open passage, used by the data warehouse when each frame arrives
+
+    - duplicates: the same frame from the same tnc_client twice (a retry of master, a frame sent again after a crash)
+      is found with a dictionary of the digests of the payloads, without going through the frames of the passage
+    - groups: the copies of the same transmission from the different tnc_clients get the same group number as soon
+      as they arrive. The exact copies are found by digest, the ones with bit errors by length and time bucket
+
+The groups follow the same rules as FrameFusion.group_frames (same length, time_window seconds between the copies
+and a single copy of each tnc_client), so the fusion at LOS can use them directly instead of searching them again
+
+Only the open passages have an index, it is dropped at LOS
+"""
+
+import hashlib
+
+from FrameFusion import DEFAULT_TIME_WINDOW
+
+
+class PassageIndex:
+
+    def __init__(self, time_window=DEFAULT_TIME_WINDOW):
+        self.time_window = time_window
+        self.digests = {}       # digest -> list of (epoch, station, group)
+        self.buckets = {}       # (length, time bucket) -> list of groups that have a copy in that bucket
+        self.groups = []        # group -> [{station: frame number}, first epoch, last epoch]
+        self.frames = 0
+        self.duplicates = 0
+
+    def add(self, kiss, station, epoch):
+        """
+        Indexes a frame of the passage
+        kiss -> payload (bytes or the hex string that is saved), station -> hashable tnc_client
+        Returns the group of the frame, or None if it is a duplicate (the frame is not indexed)
+        """
+        if isinstance(kiss, str):
+            length = len(kiss) // 2
+            kiss = kiss.encode()
+        else:
+            length = len(kiss)
+        digest = hashlib.blake2b(kiss, digest_size=16).digest()
+
+        group = None
+        copies = self.digests.get(digest)
+        if copies is not None:
+            for copy_epoch, copy_station, copy_group in copies:
+                if copy_station == station and abs(epoch - copy_epoch) <= self.time_window:
+                    self.duplicates += 1
+                    return None
+            # an exact copy from another station
+            for copy_epoch, copy_station, copy_group in reversed(copies):
+                if abs(epoch - copy_epoch) <= self.time_window and station not in self.groups[copy_group][0]:
+                    group = copy_group
+                    break
+        else:
+            copies = self.digests[digest] = []
+
+        bucket = int(epoch // self.time_window)
+        if group is None:
+            group = self.findGroup(length, bucket, station, epoch)
+
+        if group is None:
+            group = len(self.groups)
+            self.groups.append([{}, epoch, epoch])
+        members, first, last = self.groups[group]
+        members[station] = self.frames
+        self.groups[group][1] = min(first, epoch)
+        self.groups[group][2] = max(last, epoch)
+
+        groups = self.buckets.setdefault((length, bucket), [])
+        if group not in groups:
+            groups.append(group)
+        copies.append((epoch, station, group))
+        self.frames += 1
+        return group
+
+    def findGroup(self, length, bucket, station, epoch):
+        """
+        The group closest in time with a copy of the same length and no copy from this station
+        The frames of the different stations do not arrive in order, the buckets next to this one are also checked
+        """
+        best = None
+        best_distance = None
+        for neighbour in (bucket - 1, bucket, bucket + 1):
+            for group in self.buckets.get((length, neighbour), ()):
+                members, first, last = self.groups[group]
+                if station in members or epoch < first - self.time_window or epoch > last + self.time_window:
+                    continue
+                distance = max(first - epoch, epoch - last, 0)
+                if best is None or distance < best_distance:
+                    best, best_distance = group, distance
+        return best
+
+    def siblings(self, group):
+        """
+        {station: frame number in the passage} of the copies of a group
+        """
+        return dict(self.groups[group][0])
@@ -0,0 +1,148 @@
+"""
+Storage of a single passage on disk, the frames are written as they arrive instead of all at once at LOS
+
+Folder of the passage (inside data_folder):
+    <aos>_<satcat_id>_<passage_number>/                  while the passage is open
+    <aos>_<satcat_id>_<max elevation>_<frame count>/     after LOS (the old json files do not have the satellite)
+
+    header.json   -> the passage dictionary without the frames, "status" is open, closed or interrupted
+    frames.jsonl  -> one frame per line, appended as they arrive
+    fused.jsonl   -> the fused frames (FrameFusion), written after LOS in the background
+
+The writes to frames.jsonl are buffered, commit() does the flush + fsync of everything written since the last one
+(group commit, DataWarehouse calls it every passage_commit_interval seconds). After a crash at most that interval is lost,
+a line that was only partially written is skipped when reading
+"""
+
+import json
+import os
+import threading
+
+
+HEADER_FILE = "header.json"
+FRAMES_FILE = "frames.jsonl"
+FUSED_FILE = "fused.jsonl"
+
+
+def writeJson(path, data):
+    """
+    Writes the file with a temporary file + rename, it is never left half written
+    """
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def iterJsonLines(path):
+    """
+    Yields the objects in the file one at a time, a broken line (crash in the middle of a write) is ignored
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def readJsonLines(path):
+    """
+    Returns the list of objects in the file
+    """
+    return list(iterJsonLines(path))
+
+
+class PassageLog:
+
+    def __init__(self, folder, header):
+        """
+        Creates the folder of the passage and writes the header, header must not have the frame_list
+        """
+        self.folder = folder
+        self.header = header
+        self.lock = threading.Lock()
+        self.dirty = False
+
+        os.makedirs(folder, exist_ok=True)
+        writeJson(os.path.join(folder, HEADER_FILE), {**header, "status": "open"})
+        self.file = open(os.path.join(folder, FRAMES_FILE), "a")
+
+    @classmethod
+    def reopen(cls, folder, header):
+        """
+        Opens the log of a passage that already exists (used to close the passages interrupted by a crash)
+        """
+        passage_log = cls.__new__(cls)
+        passage_log.folder = folder
+        passage_log.header = {key: value for key, value in header.items() if key != "status"}
+        passage_log.lock = threading.Lock()
+        passage_log.dirty = False
+        passage_log.file = open(os.path.join(folder, FRAMES_FILE), "a")
+        return passage_log
+
+    def append(self, frame):
+        """
+        Adds a frame, it is only buffered until the next commit
+        """
+        line = json.dumps(frame, separators=(",", ":")) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.dirty = True
+
+    def commit(self):
+        """
+        Flush + fsync of the frames that were appended since the last commit
+        """
+        with self.lock:
+            if not self.dirty or self.file.closed:
+                return
+            self.file.flush()
+            self.dirty = False
+            descriptor = os.dup(self.file.fileno())
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def close(self, name=None, status="closed"):
+        """
+        Commits the frames, writes the final header and (optionally) renames the folder
+        Only the header is written, it does not depend on the number of frames
+        """
+        self.commit()
+        with self.lock:
+            self.file.close()
+
+        writeJson(os.path.join(self.folder, HEADER_FILE), {**self.header, "status": status})
+        if name is not None:
+            new_folder = os.path.join(os.path.dirname(self.folder), name)
+            os.replace(self.folder, new_folder)
+            self.folder = new_folder
+        return self.folder
+
+
+def loadPassageFolder(folder):
+    """
+    Returns the passage dictionary of the folder with the frame_list and fused_frames (if they were already made)
+    """
+    with open(os.path.join(folder, HEADER_FILE), "r") as f:
+        passage = json.load(f)
+    passage["frame_list"] = readJsonLines(os.path.join(folder, FRAMES_FILE))
+    if os.path.exists(os.path.join(folder, FUSED_FILE)):
+        passage["fused_frames"] = readJsonLines(os.path.join(folder, FUSED_FILE))
+    return passage
+
+
+def writeFused(folder, fused_list):
+    """
+    Writes the fused frames (already converted with fused_to_dict)
+    """
+    path = os.path.join(folder, FUSED_FILE)
+    with open(path + ".tmp", "w") as f:
+        for fused in fused_list:
+            f.write(json.dumps(fused, separators=(",", ":")) + "\n")
+    os.replace(path + ".tmp", path)
@@ -7,10 +7,15 @@ every hour need to get the information about the passages
     if there is then schedule it
     
 Scheduling the passage is equivalent to creating the passage in the master
+
+With many satellites every passage of the next PREPARE_WINDOW seconds is prepared (they can overlap), each one
+gets its own finishPassage at its los
 """
 
-import xmlrpc.client
-from ConfigParser import ConfigParser
+from RpcClient import createRpcProxy
+from ConfigParser import getConfig
+from LogSetup import createLogger
+from Schema import PREDICTED_PASSAGE
 import logging
 import os
 import datetime
@@ -19,80 +24,65 @@ import time
 import traceback
 
 
-class Passage_Scheduler:
-
-    def __init__(self):
-        self.Config = ConfigParser()
-        self.Config.loadDefaultValues()
-        self.Config.loadConfig()
-
-        # Set up logger
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(logging.DEBUG)
-
-        # Create console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG)
+PREPARE_WINDOW = 4200     # seconds, a bit more than the hour between checks so no passage falls between two of them
+CHECK_INTERVAL = 60       # minutes between checks
+PASSES_PER_CHECK = 10     # passages asked to sat predictor, doubled while the last one is still inside the window
 
-        # Create file handler
-        log_path = os.path.join(self.Config.get("log_folder"), f"{self.__class__.__name__}.log")
-        file_handler = logging.FileHandler(log_path)
-        file_handler.setLevel(logging.DEBUG)
 
-        # Define a common formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+class Passage_Scheduler:
 
-        # Attach the formatter to handlers
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
+    def __init__(self):
+        # loaded once per process and reloaded when config.ini changes (see ConfigParser.getConfig)
+        self.Config = getConfig()
 
-        # Add handlers to the logger
-        if not self.logger.handlers:
-            self.logger.addHandler(console_handler)
-            self.logger.addHandler(file_handler)
+        # set up logger, the level comes from log_level in the config (see LogSetup)
+        self.logger = createLogger(self.__class__.__name__, self.Config.get("log_folder"), self.Config.get("log_level"))
 
         # Get the endpoints of the different modules
         self.master_host = self.Config.get("master_rpc_host")
         self.master_port = self.Config.get("master_rpc_port")
-        self.master_proxy = xmlrpc.client.ServerProxy(f"http://{self.master_host}:{self.master_port}")
+        self.master_proxy = createRpcProxy(self.Config, self.master_host, self.master_port)
         self.logger.debug(f"[INIT] Master endpoint: {self.master_host}:{self.master_port}")
 
         self.sat_predictor_host = self.Config.get("sat_predictor_rpc_host")
         self.sat_predictor_port = self.Config.get("sat_predictor_rpc_port")
-        self.sat_predictor_proxy = xmlrpc.client.ServerProxy(f"http://{self.sat_predictor_host}:{self.sat_predictor_port}")
+        self.sat_predictor_proxy = createRpcProxy(self.Config, self.sat_predictor_host, self.sat_predictor_port)
         self.logger.debug(f"[INIT] SatPredictor endpoint: {self.sat_predictor_host}:{self.sat_predictor_port}")
 
-        # Define the expected keys and types for the passage data
-        self.EX_PASSAGE_KEYS = [
-            "azimuth_elevation", "tle_line1", "tle_line2", "time_interval",
-            "aos", "los", "start_azimuth", "end_azimuth", "max_elevation"
-        ]
-        self.EX_PASSAGE_TYPES = [list, str, str, list, float, float, float, float, float]
+        # Expected keys and types for the passage data (see Schema)
+        self.EX_PASSAGE = PREDICTED_PASSAGE
 
-    def typeChecking(self, data_dict, expected_keys, expected_types):
+        # (satcat_id, aos) of the passages already sent to master, a passage is only prepared once
+        self.prepared = set()
+
+        # the proxies are made again if the endpoints change in config.ini
+        self.Config.onChange(self.configChanged, keys=["master_rpc_host", "master_rpc_port",
+                                                       "sat_predictor_rpc_host", "sat_predictor_rpc_port",
+                                                       "rpc_client_pool_size", "rpc_client_timeout", "rpc_client_retries"])
+
+    def configChanged(self, changed):
         """
-        Receives a dictionary and checks if the keys are the same as the expected keys.
+        Called by the config when the endpoints or the settings of the rpc clients change
         """
-        self.logger.debug("[TYPE_CHECK] Validating passage data structure.")
-        if not isinstance(data_dict, dict):
-            self.logger.error("[TYPE_CHECK] Data is not a dictionary.")
-            return False
-
-        if len(expected_keys) != len(expected_types):
-            self.logger.error("[TYPE_CHECK] Keys and types length mismatch.")
-            return False
+        self.master_host = self.Config.get("master_rpc_host")
+        self.master_port = self.Config.get("master_rpc_port")
+        self.master_proxy = createRpcProxy(self.Config, self.master_host, self.master_port)
 
-        if set(data_dict.keys()) != set(expected_keys):
-            self.logger.error(f"[TYPE_CHECK] Keys mismatch: {data_dict.keys()} vs {expected_keys}.")
-            return False
+        self.sat_predictor_host = self.Config.get("sat_predictor_rpc_host")
+        self.sat_predictor_port = self.Config.get("sat_predictor_rpc_port")
+        self.sat_predictor_proxy = createRpcProxy(self.Config, self.sat_predictor_host, self.sat_predictor_port)
 
-        for key, value in data_dict.items():
-            expected_type = expected_types[expected_keys.index(key)]
-            if not isinstance(value, expected_type):
-                self.logger.error(f"[TYPE_CHECK] Key '{key}' has incorrect type. Expected: {expected_type}, Got: {type(value)}.")
-                return False
+        self.logger.info(f"Endpoints updated, master: {self.master_host}:{self.master_port}, "
+                         f"SatPredictor: {self.sat_predictor_host}:{self.sat_predictor_port}")
 
-        self.logger.debug("[TYPE_CHECK] Passage data validated successfully.")
+    def typeChecking(self, data_dict, schema):
+        """
+        Receives a dictionary and checks if it has the keys and types of the schema.
+        """
+        error = schema.validate(data_dict)
+        if error is not None:
+            self.logger.error(f"[TYPE_CHECK] {error}.")
+            return False
         return True
 
     def checkPassages(self):
@@ -105,8 +95,14 @@ class Passage_Scheduler:
         all_jobs = schedule.get_jobs()
         self.logger.debug(f"[CHECK_PASSAGES] Active jobs: {all_jobs}")
 
+        current_time = datetime.datetime.now().timestamp()
         try:
-            next_passages = self.sat_predictor_proxy.remoteGetNextPasses()
+            num_passes = PASSES_PER_CHECK
+            while True:
+                next_passages = self.sat_predictor_proxy.remoteGetNextPasses(num_passes)
+                if len(next_passages) < num_passes or next_passages[-1]["aos"] - current_time >= PREPARE_WINDOW:
+                    break
+                num_passes *= 2
             self.logger.info(f"[CHECK_PASSAGES] Retrieved {len(next_passages)} passages.")
         except Exception as e:
             self.logger.error(f"[CHECK_PASSAGES] Error fetching passages: {e}")
@@ -115,47 +111,49 @@ class Passage_Scheduler:
             return schedule.CancelJob
 
         for passage in next_passages:
-            if not self.typeChecking(passage, self.EX_PASSAGE_KEYS, self.EX_PASSAGE_TYPES):
+            if not self.typeChecking(passage, self.EX_PASSAGE):
                 self.logger.error("[CHECK_PASSAGES] Invalid passage data format detected.")
                 self.logger.debug(f"[CHECK_PASSAGES] Passage data: {passage}")
                 return schedule.CancelJob
                 
 
-        current_time = datetime.datetime.now().timestamp()
-        closest_passage = None
-        closest_passage_time = None
-
-        for passage in next_passages:
-            if closest_passage_time is None or passage["aos"] < closest_passage_time:
-                closest_passage_time = passage["aos"]
-                closest_passage = passage
-
-        if not closest_passage:
+        if not next_passages:
             self.logger.warning("[CHECK_PASSAGES] No valid passages found.")
             return schedule.CancelJob
-            
 
-        seconds_until_next_passage = closest_passage["aos"] - current_time
+        # they come sorted by aos
+        seconds_until_next_passage = next_passages[0]["aos"] - current_time
         self.logger.info(f"[CHECK_PASSAGES] Closest passage in {seconds_until_next_passage / 60:.2f} minutes.")
 
-        if seconds_until_next_passage < 3600:
-            self.logger.info("[CHECK_PASSAGES] Scheduling the next passage.")
+        # the ones that ended were already saved, the set does not grow forever
+        self.prepared = {key for key in self.prepared if key[1] >= current_time - 86400}
+
+        for passage in next_passages:
+            key = (passage["satcat_id"], passage["aos"])
+            if passage["aos"] - current_time >= PREPARE_WINDOW or key in self.prepared:
+                continue
+
+            self.logger.info(f"[CHECK_PASSAGES] Scheduling the passage of {passage['satcat_id']} in "
+                             f"{(passage['aos'] - current_time) / 60:.2f} minutes (tracked: {passage['tracked']}).")
             try:
-                self.master_proxy.remotePreparePass(closest_passage)
+                passage_number = self.master_proxy.remotePreparePass(passage)
                 self.logger.debug("[CHECK_PASSAGES] Passage scheduled successfully.")
             except Exception as e:
                 self.logger.error(f"[CHECK_PASSAGES] Error preparing passage: {e}")
                 self.logger.debug(traceback.format_exc())
-                return schedule.CancelJob
-
+                continue
+            if passage_number == -1:
+                self.logger.error("[CHECK_PASSAGES] Master could not prepare the passage.")
+                continue
+            self.prepared.add(key)
 
-            los_time = closest_passage["los"]
+            los_time = passage["los"]
             scheduled_los_time = datetime.datetime.fromtimestamp(los_time) + datetime.timedelta(minutes=1)
             formatted_los_time = scheduled_los_time.strftime("%H:%M")
-            self.logger.info(f"[SCHEDULE] LOS scheduled for: {formatted_los_time}.")
-            schedule.every().day.at(formatted_los_time).do(self.finishPassage)
+            self.logger.info(f"[SCHEDULE] LOS of passage {passage_number} scheduled for: {formatted_los_time}.")
+            schedule.every().day.at(formatted_los_time).do(self.finishPassage, passage_number)
 
-        next_run_time = max(60, seconds_until_next_passage / 60 + 20) if seconds_until_next_passage < 3600 else 60
+        next_run_time = CHECK_INTERVAL
         self.logger.info(f"[SCHEDULE] Next passage check scheduled in {next_run_time} minutes.")
         
         # logs the list of jobs
@@ -166,13 +164,13 @@ class Passage_Scheduler:
         return schedule.CancelJob
         
 
-    def finishPassage(self):
+    def finishPassage(self, passage_number=-1):
         """
-        Function to end the current pass and notify the master.
+        Function to end the pass and notify the master.
         """
-        self.logger.info("[FINISH_PASSAGE] Ending the current passage.")
+        self.logger.info(f"[FINISH_PASSAGE] Ending the passage {passage_number}.")
         try:
-            self.master_proxy.remoteEndPass()
+            self.master_proxy.remoteEndPass(passage_number)
             self.logger.info("[FINISH_PASSAGE] Passage ended successfully.")
         except Exception as e:
             self.logger.error(f"[FINISH_PASSAGE] Error ending passage: {e}")
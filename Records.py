@@ -0,0 +1,254 @@
+"""
+Frame and passage records shared by the modules, they replace the dictionaries with string keys
+
+A dictionary with the 7 keys of a frame takes ~270 bytes (plus the tuple of tnc_client), a Frame ~100 bytes.
+FrameColumns keeps all the frames of a passage in arrays (one per field and a single buffer for the payloads),
+it is used when a whole passage is loaded in memory (fusion, analysis)
+
+Each record converts itself to the formats that travel between the modules:
+    tnc      -> [kiss, tnc_client_ip, tnc_client_port, timestamp(, key)]   TncClient/TncService -> Master (remoteReceiveKissBatch)
+    wire     -> dictionary of Schema.FRAME / Schema.PASSAGE                Master -> DataWarehouse
+    record   -> dictionary saved in frames.jsonl                           DataWarehouse -> PassageLog
+"""
+
+from array import array
+from datetime import datetime, timezone
+import math
+
+from Archive import parseUtc
+from kiss import frame_to_bytes
+
+
+def utcMinutes(epoch):
+    """
+    Timestamp string of the saved frames "2024-01-01_12:00"
+    """
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d_%H:%M")
+
+
+class Frame:
+
+    __slots__ = ("kiss", "tnc_host", "tnc_port", "timestamp", "elevation", "azimuth", "distance", "passage_number", "group")
+
+    def __init__(self, kiss, tnc_host, tnc_port, timestamp, elevation=None, azimuth=None, distance=None,
+                 passage_number=-1, group=None):
+        self.kiss = kiss                        # bytes
+        self.tnc_host = tnc_host
+        self.tnc_port = tnc_port
+        self.timestamp = timestamp              # epoch when the frame was received
+        self.elevation = elevation
+        self.azimuth = azimuth
+        self.distance = distance
+        self.passage_number = passage_number
+        self.group = group                      # copies of the same transmission (PassageIndex)
+
+    def __repr__(self):
+        return f"Frame({self.tnc_host}:{self.tnc_port} {self.timestamp} passage {self.passage_number} {len(self.kiss)} bytes)"
+
+    def __eq__(self, other):
+        if not isinstance(other, Frame):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    @property
+    def tnc_client(self):
+        return [self.tnc_host, self.tnc_port]
+
+    def setState(self, state):
+        """
+        state -> (passage_number, elevation, azimuth, distance) from Master.getSatelliteState
+        """
+        self.passage_number, self.elevation, self.azimuth, self.distance = state
+
+    @classmethod
+    def fromTnc(cls, entry):
+        """
+        [kiss, tnc_client_ip, tnc_client_port, timestamp] (and optionally the key of the spool, it is ignored here)
+        kiss can be in any of the formats of frame_to_bytes
+        """
+        return cls(frame_to_bytes(entry[0]), entry[1], entry[2], entry[3])
+
+    def toTnc(self, key=None):
+        entry = [self.kiss, self.tnc_host, self.tnc_port, self.timestamp]
+        if key is not None:
+            entry.append(key)
+        return entry
+
+    @classmethod
+    def fromWire(cls, data):
+        """
+        data -> dictionary already validated with Schema.FRAME
+        """
+        tnc_host, tnc_port = data["tnc_client"]
+        return cls(data["kiss"], tnc_host, tnc_port, data["timestamp"], data["elevation"], data["azimuth"],
+                   data["distance"], data["passage_number"])
+
+    def toWire(self):
+        return {
+            "timestamp": self.timestamp,
+            "elevation": self.elevation,
+            "azimuth": self.azimuth,
+            "distance": self.distance,
+            "tnc_client": [self.tnc_host, self.tnc_port],
+            "passage_number": self.passage_number,
+            "kiss": self.kiss,
+        }
+
+    @classmethod
+    def fromRecord(cls, record):
+        """
+        Frame saved by the data warehouse, also the old archives (kiss as "0x86 0xa2 ..." and without epoch)
+        """
+        epoch = record["epoch"] if "epoch" in record else parseUtc(record["timestamp"])
+        tnc_host, tnc_port = record.get("tnc_client") or (None, None)
+        return cls(frame_to_bytes(record["kiss"]), tnc_host, tnc_port, epoch, record.get("elevation"),
+                   record.get("azimuth"), record.get("distance"), record.get("passage_number", -1), record.get("group"))
+
+    def toRecord(self):
+        record = {
+            "timestamp": utcMinutes(self.timestamp),
+            "elevation": self.elevation,
+            "azimuth": self.azimuth,
+            "distance": self.distance,
+            "tnc_client": [self.tnc_host, self.tnc_port],
+            "passage_number": self.passage_number,
+            "kiss": self.kiss.hex(),
+            "epoch": self.timestamp,
+        }
+        if self.group is not None:
+            record["group"] = self.group
+        return record
+
+
+class Passage:
+    """
+    Header of a passage (without the frames)
+    """
+
+    __slots__ = ("passage_number", "satcat_id", "azimuth_elevation", "tle_line1", "tle_line2", "gs_clients", "frame_count",
+                 "aos", "los", "start_azimuth", "end_azimuth", "max_elevation", "time_interval", "observers")
+
+    def __init__(self, passage_number, aos, los, max_elevation, start_azimuth=0.0, end_azimuth=0.0, tle_line1="", tle_line2="",
+                 azimuth_elevation=None, time_interval=None, gs_clients=None, frame_count=0, satcat_id=0, observers=None):
+        self.passage_number = passage_number
+        self.satcat_id = satcat_id
+        self.aos = aos
+        self.los = los
+        self.max_elevation = max_elevation
+        self.start_azimuth = start_azimuth
+        self.end_azimuth = end_azimuth
+        self.tle_line1 = tle_line1
+        self.tle_line2 = tle_line2
+        self.azimuth_elevation = azimuth_elevation if azimuth_elevation is not None else []
+        self.time_interval = time_interval if time_interval is not None else []
+        self.gs_clients = gs_clients if gs_clients is not None else []
+        self.frame_count = frame_count
+        self.observers = observers if observers is not None else {}   # GroundStations.toDict of master
+
+    def __repr__(self):
+        return f"Passage({self.passage_number} satellite {self.satcat_id} aos {self.aos} max elevation {self.max_elevation:.1f} {self.frame_count} frames)"
+
+    @classmethod
+    def fromPrediction(cls, prediction, passage_number):
+        """
+        Passage predicted by the satellite predictor (Schema.PREDICTED_PASSAGE), the ephemeris is not kept
+        """
+        return cls(passage_number, prediction["aos"], prediction["los"], prediction["max_elevation"],
+                   prediction["start_azimuth"], prediction["end_azimuth"], prediction["tle_line1"], prediction["tle_line2"],
+                   prediction["azimuth_elevation"], prediction["time_interval"], satcat_id=prediction["satcat_id"])
+
+    @classmethod
+    def fromWire(cls, data):
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    def toWire(self):
+        """
+        Dictionary of Schema.PASSAGE, the frames are sent later one by one so the frame_list is empty
+        """
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["frame_list"] = []
+        return data
+
+
+class FrameColumns:
+    """
+    All the frames of a passage in arrays, a float per field instead of a dictionary per frame
+    The payloads are in a single buffer, offsets[i]:offsets[i + 1] is the frame i
+    Missing values are nan (floats) or -1 (passage_number, group)
+    """
+
+    def __init__(self):
+        self.timestamp = array("d")
+        self.elevation = array("d")
+        self.azimuth = array("d")
+        self.distance = array("d")
+        self.passage_number = array("i")
+        self.group = array("q")
+        self.station = array("H")     # index in stations
+        self.stations = []            # [(host, port), ...]
+        self.station_index = {}
+        self.payload = bytearray()
+        self.offsets = array("Q", [0])
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def append(self, frame):
+        station = (frame.tnc_host, frame.tnc_port)
+        index = self.station_index.get(station)
+        if index is None:
+            index = self.station_index[station] = len(self.stations)
+            self.stations.append(station)
+
+        self.timestamp.append(frame.timestamp)
+        self.elevation.append(math.nan if frame.elevation is None else frame.elevation)
+        self.azimuth.append(math.nan if frame.azimuth is None else frame.azimuth)
+        self.distance.append(math.nan if frame.distance is None else frame.distance)
+        self.passage_number.append(frame.passage_number)
+        self.group.append(-1 if frame.group is None else frame.group)
+        self.station.append(index)
+        self.payload += frame.kiss
+        self.offsets.append(len(self.payload))
+
+    @classmethod
+    def fromRecords(cls, records):
+        """
+        records -> any iterable of saved frames (PassageLog.iterJsonLines reads them one at a time)
+        """
+        columns = cls()
+        for record in records:
+            columns.append(Frame.fromRecord(record))
+        return columns
+
+    def kiss(self, index):
+        return bytes(self.payload[self.offsets[index]:self.offsets[index + 1]])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        def optional(value):
+            return None if math.isnan(value) else value
+
+        host, port = self.stations[self.station[index]]
+        group = self.group[index]
+        return Frame(self.kiss(index), host, port, self.timestamp[index], optional(self.elevation[index]),
+                     optional(self.azimuth[index]), optional(self.distance[index]), self.passage_number[index],
+                     None if group == -1 else group)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def hasGroups(self):
+        return len(self) > 0 and min(self.group) >= 0
+
+    def nbytes(self):
+        """
+        Memory used by the arrays and the payload buffer
+        """
+        arrays = (self.timestamp, self.elevation, self.azimuth, self.distance, self.passage_number, self.group,
+                  self.station, self.offsets)
+        return sum(column.itemsize * len(column) for column in arrays) + len(self.payload)
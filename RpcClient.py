@@ -0,0 +1,212 @@
+"""
+Common xmlrpc client used by all the modules
+
+xmlrpc.client.ServerProxy opens a new connection for every call and is not safe to share between threads.
+Here every endpoint (host:port) has a pool of persistent HTTP/1.1 connections that is shared by the whole process,
+each call takes a connection from the pool and gives it back when it is done
+
+Configuration (config.ini):
+    rpc_client_pool_size  -> maximum number of connections to each endpoint
+    rpc_client_timeout    -> seconds to wait for an answer
+    rpc_client_retries    -> how many times a call is retried when the connection to the server can not be made
+                             (the request was never sent). A call that fails after the request was sent (timeout,
+                             connection lost while waiting for the answer) is not repeated, the remote function may
+                             have run already and many of them are not idempotent (remoteCreatePassage, ...).
+                             Faults raised by the remote function are never retried
+
+Many calls can also be sent in a single request with multicall(), the servers created by RpcServer support it
+iterPages goes through all the pages of the paginated queries (DataWarehouse.remoteQueryFrames, remoteQueryPassages)
+"""
+
+import http.client
+import queue
+import socket
+import threading
+import time
+import xmlrpc.client
+
+
+class TimeoutTransport(xmlrpc.client.Transport):
+    """
+    Transport with a timeout, it keeps its connection open between calls (HTTP/1.1)
+    """
+
+    def __init__(self, timeout, use_builtin_types=False):
+        super().__init__(use_builtin_types=use_builtin_types)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+    def connect(self, host):
+        """
+        Opens the connection if it is not open yet, an error here means that nothing was sent
+        An open connection that the server closed while it was idle is handled by Transport.request (sent again once,
+        the server never saw that request)
+        """
+        connection = self.make_connection(host)
+        if connection.sock is None:
+            connection.connect()
+
+
+class ConnectionPool:
+    """
+    Pool of transports for a single endpoint
+    """
+
+    def __init__(self, host, port, size, timeout, use_builtin_types=False):
+        self.host = f"{host}:{port}"
+        self.size = size
+        self.timeout = timeout
+        self.use_builtin_types = use_builtin_types
+
+        self.idle = queue.LifoQueue()   # last used first, it is the one that is more likely to still be open
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                return TimeoutTransport(self.timeout, self.use_builtin_types)
+
+        # all the connections are in use, wait for one
+        return self.idle.get()
+
+    def release(self, transport):
+        self.idle.put(transport)
+
+    def discard(self, transport):
+        """
+        The transport had an error, close it and put a fresh one in its place
+        """
+        transport.close()
+        self.idle.put(TimeoutTransport(self.timeout, self.use_builtin_types))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def getConnectionPool(host, port, size, timeout, use_builtin_types=False):
+    """
+    Returns the pool for the endpoint, there is only one per endpoint in the whole process
+    """
+    key = (host, port, use_builtin_types)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(host, port, size, timeout, use_builtin_types)
+        return _pools[key]
+
+
+class _Method:
+    """
+    Same idea as xmlrpc.client._Method, allows proxy.system.multicall(...)
+    """
+
+    def __init__(self, proxy, name):
+        self._proxy = proxy
+        self._name = name
+
+    def __getattr__(self, name):
+        return _Method(self._proxy, f"{self._name}.{name}")
+
+    def __call__(self, *args):
+        return self._proxy._call(self._name, args)
+
+
+class RpcProxy:
+    """
+    Drop in replacement for xmlrpc.client.ServerProxy that uses the pool of the endpoint
+    Can be shared between threads
+    """
+
+    def __init__(self, host, port, pool_size=4, timeout=10.0, retries=2, use_builtin_types=False, allow_none=False):
+        self._pool = getConnectionPool(host, port, pool_size, timeout, use_builtin_types)
+        self._retries = retries
+        self._allow_none = allow_none
+
+    def _call(self, method_name, params):
+        request = xmlrpc.client.dumps(params, method_name, allow_none=self._allow_none).encode("utf-8", "xmlcharrefreplace")
+
+        attempt = 0
+        while True:
+            transport = self._pool.acquire()
+            try:
+                transport.connect(self._pool.host)
+            except OSError:
+                # the server could not be reached, the request was not sent and can be tried again
+                self._pool.discard(transport)
+                attempt += 1
+                if attempt > self._retries:
+                    raise
+                time.sleep(0.05 * attempt)
+                continue
+
+            try:
+                response = transport.request(self._pool.host, "/RPC2", request)
+            except xmlrpc.client.Fault:
+                # the call reached the server, the connection is fine
+                self._pool.release(transport)
+                raise
+            except (ConnectionRefusedError, socket.gaierror):
+                # only when the connection is made again inside request, still nothing was sent
+                self._pool.discard(transport)
+                attempt += 1
+                if attempt > self._retries:
+                    raise
+                time.sleep(0.05 * attempt)
+                continue
+            except (OSError, http.client.HTTPException, xmlrpc.client.ProtocolError):
+                # the request may have reached the server, it is not sent again
+                self._pool.discard(transport)
+                raise
+
+            self._pool.release(transport)
+            return response[0] if len(response) == 1 else response
+
+    def multicall(self):
+        """
+        Returns a xmlrpc.client.MultiCall, all the calls added to it are sent in a single request
+        """
+        return xmlrpc.client.MultiCall(self)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Method(self, name)
+
+
+def createRpcProxy(config, host, port, **kwargs):
+    """
+    Creates a proxy for host:port with the pool size, timeout and retries of the config
+    """
+    return RpcProxy(
+        host,
+        port,
+        pool_size=kwargs.pop("pool_size", config.get("rpc_client_pool_size")),
+        timeout=kwargs.pop("timeout", config.get("rpc_client_timeout")),
+        retries=kwargs.pop("retries", config.get("rpc_client_retries")),
+        **kwargs,
+    )
+
+
+def iterPages(method, query, key):
+    """
+    Yields the pages of a paginated remote query until the last one, for example:
+        for frames in iterPages(proxy.remoteQueryFrames, {"min_elevation": 30}, "frames"):
+    """
+    query = dict(query)
+    while True:
+        page = method(query)
+        yield page[key]
+        if "cursor" not in page:
+            return
+        query["cursor"] = page["cursor"]
@@ -0,0 +1,179 @@
+"""
+Common xmlrpc server used by all the modules
+
+SimpleXMLRPCServer answers one request at a time, so a slow call (like getting the next passages)
+blocks all the frames that arrive behind it. Here the concurrency model can be selected in the config:
+    rpc_server_model: single  -> the old behaviour, one request at a time
+    rpc_server_model: pool    -> requests are handled by a bounded pool of threads (rpc_server_workers)
+
+Each registered function can also have a maximum number of concurrent calls,
+useful to make sure that the expensive calls dont take all the threads of the pool
+
+With more than one thread the modules are responsible for locking their own state
+
+The pool model also keeps the connections open between requests (HTTP/1.1, see RpcClient). A thread of the pool
+only handles one request, then the connection goes back to a selector that waits for the next one, so the idle
+connections of the clients never hold a thread and the requests do not queue behind them. A connection that is
+idle for more than rpc_keepalive_timeout seconds is closed.
+The single model stays on HTTP/1.0, a connection that is kept open there would block every other client
+
+The servers use the builtin types, the frames (xmlrpc base64) arrive to the functions as bytes
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+import functools
+import selectors
+import threading
+import time
+
+
+class LimitedRegisterMixin:
+    """
+    register_function that accepts a limit of concurrent calls for that function
+    """
+
+    def register_function(self, function=None, name=None, max_concurrency=None):
+        if max_concurrency is None:
+            return super().register_function(function, name)
+
+        semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        @functools.wraps(function)
+        def limited(*args, **kwargs):
+            with semaphore:
+                return function(*args, **kwargs)
+
+        return super().register_function(limited, name)
+
+
+class SingleXMLRPCServer(LimitedRegisterMixin, SimpleXMLRPCServer):
+    """
+    One request at a time, same as SimpleXMLRPCServer
+    """
+    pass
+
+
+class KeepAliveRequestHandler(SimpleXMLRPCRequestHandler):
+    """
+    Handles a single request and leaves the connection open (unless the client asked to close it)
+    The server waits for the next request of the connection without a thread (see PoolXMLRPCServer)
+    The clients must wait for each answer before sending the next request (no pipelining, like RpcClient)
+    """
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, without this every answer waits for the delayed ack of the client
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+
+    def log_error(self, format, *args):
+        # a client that stops in the middle of a request is closed, not an error
+        if format.startswith("Request timed out"):
+            return
+        super().log_error(format, *args)
+
+
+class PoolXMLRPCServer(LimitedRegisterMixin, SimpleXMLRPCServer):
+    """
+    Every request is handled by a thread of a bounded pool
+    If all the threads are busy the requests wait in the queue of the pool
+
+    The connections that are waiting for a request are in a selector of their own thread (keepAliveLoop), only
+    when one has data it is given to the pool. New connections start there too
+    """
+
+    def __init__(self, addr, max_workers=8, keepalive_timeout=15.0, **kwargs):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"rpc:{addr[1]}")
+        self.keepalive_timeout = keepalive_timeout
+        handler = type("KeepAliveRequestHandler", (KeepAliveRequestHandler,), {"timeout": keepalive_timeout})
+        super().__init__(addr, requestHandler=handler, **kwargs)
+
+        # epoll/kqueue see the connections registered while they wait, the lock keeps the map of the selector consistent
+        self.selector = selectors.DefaultSelector()
+        self.selector_lock = threading.Lock()
+        self.closing = False
+        self.keepalive_thread = threading.Thread(target=self.keepAliveLoop, name=f"rpc-keepalive:{addr[1]}", daemon=True)
+        self.keepalive_thread.start()
+
+    def process_request(self, request, client_address):
+        self.parkConnection(request, client_address)
+
+    def parkConnection(self, request, client_address):
+        """
+        The connection waits in the selector for its next request
+        """
+        with self.selector_lock:
+            self.selector.register(request, selectors.EVENT_READ, (client_address, time.monotonic()))
+
+    def keepAliveLoop(self):
+        interval = min(0.5, self.keepalive_timeout)
+        last_check = time.monotonic()
+        while not self.closing:
+            ready = self.selector.select(timeout=interval)
+            with self.selector_lock:
+                for key, _ in ready:
+                    # there is a request (or the client closed it), a thread of the pool takes it from here
+                    self.selector.unregister(key.fileobj)
+                    self.executor.submit(self.process_request_thread, key.fileobj, key.data[0])
+
+                now = time.monotonic()
+                if now - last_check < interval:
+                    continue
+                last_check = now
+                # the connections that were idle for too long are closed
+                for key in list(self.selector.get_map().values()):
+                    if now - key.data[1] > self.keepalive_timeout:
+                        self.selector.unregister(key.fileobj)
+                        self.shutdown_request(key.fileobj)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+
+        if handler.close_connection or self.closing:
+            self.shutdown_request(request)
+        else:
+            self.parkConnection(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.closing = True
+        self.keepalive_thread.join()
+        with self.selector_lock:
+            for key in list(self.selector.get_map().values()):
+                self.shutdown_request(key.fileobj)
+            self.selector.close()
+        self.executor.shutdown(wait=False)
+
+
+SERVER_MODELS = {
+    "single": SingleXMLRPCServer,
+    "pool": PoolXMLRPCServer,
+}
+
+
+def createRpcServer(config, host, port, model=None, workers=None):
+    """
+    Creates the server for host:port using the concurrency model of the config (rpc_server_model, rpc_server_workers)
+    model and workers can be given to override the config
+    """
+    model = model if model is not None else config.get("rpc_server_model")
+    if model not in SERVER_MODELS:
+        raise ValueError(f"Unknown rpc server model: {model}, expected one of {list(SERVER_MODELS)}")
+
+    if model == "pool":
+        workers = workers if workers is not None else config.get("rpc_server_workers")
+        server = PoolXMLRPCServer((host, port), max_workers=workers, keepalive_timeout=config.get("rpc_keepalive_timeout"),
+                                  use_builtin_types=True)
+    else:
+        server = SERVER_MODELS[model]((host, port), use_builtin_types=True)
+
+    # system.multicall, lets the clients send many calls in a single request
+    server.register_multicall_functions()
+    return server
@@ -1,13 +1,18 @@
 from datetime import datetime, timedelta
 from skyfield.api import Topos, load, EarthSatellite, utc
-from scipy.interpolate import CubicSpline
 import matplotlib.pyplot as plt
 import numpy as np
 import requests
 import os
-
-from xmlrpc.server import SimpleXMLRPCServer
-from ConfigParser import ConfigParser
+import threading
+
+from RpcServer import createRpcServer
+from ConfigParser import getConfig
+from LogSetup import createLogger
+from PassEphemeris import PassEphemeris
+from PassTimeline import resolveConflicts
+from GroundStations import parseStationList
+from SatelliteSet import SatelliteSet
 import logging
 
 
@@ -43,57 +48,115 @@ def plot_gpredict_like(azimuths, altitudes):
     plt.show()
     
     
-class SatellitePredictor:
-    def __init__(self, observer_latitude=38.7314, observer_longitude=-9.3024, satcat_id=60238):
-        """
-        Initializes the SatellitePredictor object with the observer's latitude and longitude
-        """
-        
-        self.Config = ConfigParser()
-        self.Config.loadDefaultValues()
-        self.Config.loadConfig()
-        
-        # set up logger
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.setLevel(logging.DEBUG)
+PASS_SEARCH_DAYS = 3      # days searched by each find_events of getNextPasses
+PASS_SEARCH_LIMIT = 16    # getNextPasses gives up after this many days
+CELESTRAK_URL = "https://celestrak.org/NORAD/elements/gp.php"
 
-        # Create console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG)
+# used until updateTLE gets a newer one
+DEFAULT_TLES = {
+    60238: ('1 60238U 24128D   25180.89646745  .00004045  00000+0  28654-3 0  9991',
+            '2 60238  61.9914   5.9727 0052120  61.8031 298.8311 15.05478104 53319'),
+}
 
-        # Create file handler
-        log_path = os.path.join(self.Config.get("log_folder"), f"{self.__class__.__name__}.log")
-        file_handler = logging.FileHandler(log_path)
-        file_handler.setLevel(logging.DEBUG)
 
-        # Define a common formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+def parseTleText(text):
+    """
+    TLEs in text (with or without the name line) -> {satcat_id: (tle_line1, tle_line2)}
+    """
+    tles = {}
+    lines = [line.strip() for line in text.splitlines()]
+    for line1, line2 in zip(lines, lines[1:]):
+        if line1.startswith("1 ") and line2.startswith("2 "):
+            try:
+                tles[int(line2[2:7])] = (line1, line2)
+            except ValueError:
+                continue
+    return tles
+
+
+def parseSatelliteList(satellite_list):
+    """
+    ["norad", "norad:CALLSIGN", ...] -> [(norad, callsign or None), ...], the order is kept (it is the priority)
+    """
+    satellites = []
+    for entry in satellite_list:
+        entry = str(entry).strip()
+        if not entry:
+            continue
+        satcat_id, _, callsign = entry.partition(":")
+        satellites.append((int(satcat_id), callsign.strip().upper() or None))
+    return satellites
 
-        # Attach the formatter to handlers
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
 
-        # Add handlers to the logger
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+class SatellitePredictor:
+    def __init__(self, observer_latitude=None, observer_longitude=None, satcat_id=None):
+        """
+        Initializes the SatellitePredictor object with the observer's latitude and longitude (observer_* of the config if None)
+        The satellites come from satellites in the config, satcat_id is the main one (the first of the list if None),
+        the functions that take a satcat_id use it when they do not get one
+        """
+        
+        # loaded once per process and reloaded when config.ini changes (see ConfigParser.getConfig)
+        self.Config = getConfig()
+        
+        # set up logger, the level comes from log_level in the config (see LogSetup)
+        self.logger = createLogger(self.__class__.__name__, self.Config.get("log_folder"), self.Config.get("log_level"))
         
         # Setup the remote funcitons
         self.server_host = self.Config.get("sat_predictor_rpc_host")
         self.server_port = self.Config.get("sat_predictor_rpc_port")
         self.logger.debug(f"SatPredictor server endpoint: {self.server_host}:{self.server_port}")
-        self.server = SimpleXMLRPCServer((self.server_host, self.server_port))
+        self.server = createRpcServer(self.Config, self.server_host, self.server_port)
         self.registerFunctions()
         self.logger.debug("Functions registered")
         
-        self.observer = Topos(latitude_degrees=observer_latitude, longitude_degrees=observer_longitude)
+        observer_latitude = observer_latitude if observer_latitude is not None else self.Config.get("observer_latitude")
+        observer_longitude = observer_longitude if observer_longitude is not None else self.Config.get("observer_longitude")
+        observer_elevation = self.Config.get("observer_elevation")
+        self.observer = Topos(latitude_degrees=observer_latitude, longitude_degrees=observer_longitude, elevation_m=observer_elevation)
+        self.observer_key = (observer_latitude, observer_longitude, observer_elevation)
         self.ts = load.timescale()
-        self.satcat_id = satcat_id
         
-        self.tle_line1 = None
-        self.tle_line2 = None
-        self.satellite = None
+        # site of each tnc_client, remoteGetVisibleSatellites answers from the station that received each frame
+        self.ground_stations = parseStationList(self.Config.get("ground_stations"))
+
+        # the list of satellites is only read at the start, the order is the priority when passages overlap
+        satellites = parseSatelliteList(self.Config.get("satellites"))
+        if satcat_id is not None and satcat_id not in [satellite for satellite, _ in satellites]:
+            satellites.insert(0, (satcat_id, None))
+        if not satellites:
+            raise ValueError("No satellites in the config")
+        self.satcat_ids = [satellite for satellite, _ in satellites]
+        self.satcat_id = self.satcat_ids[0]
+        self.callsigns = dict(satellites)
+        self.priority = {satellite: rank for rank, satellite in enumerate(self.satcat_ids)}
+        self.logger.info(f"Tracking {len(self.satcat_ids)} satellites: {self.satcat_ids}")
+        
+        # satcat_id -> (tle_line1, tle_line2), EarthSatellite and satellite - observer (only changes with the TLE)
+        self.tles = {}
+        self.earth_satellites = {}
+        self.differences = {}
+        # all the satellites in a single sgp4 array, for the positions of every satellite at once
+        self.satellite_set = SatelliteSet(self.ts, *self.observer_key, stations=self.ground_stations)
         
         self.last_tle_update = datetime.now() - timedelta(hours=2)
+        
+        # interpolated ephemeris of the upcoming passages, used to answer getSatellitePosition without running SGP4
+        # key is (satcat_id, aos of the passage)
+        self.ephemerides = {}
+        self.ephemeris_step = self.Config.get("ephemeris_step")
+        self.ephemeris_max_error = self.Config.get("ephemeris_max_error")
+
+        # passages already predicted for each satellite, see getNextPasses
+        # satcat_id -> {"key": (tle_line1, tle_line2, observer, min_elevation), "start": epoch, "resume": epoch,
+        #               "passes": [findPasses tuple, ...], "built": {aos: dict}}
+        self.pass_cache = {}
+        self.pass_lock = threading.Lock()
+        self.min_elevation = self.Config.get("pass_min_elevation")
+
+        # the ephemeris settings are used from the next passage if they change in config.ini
+        self.Config.onChange(self.configChanged, keys=["ephemeris_step", "ephemeris_max_error", "pass_min_elevation",
+                                                       "ground_stations"])
 
         # Update the TLE data
         # self.updateTLE()
@@ -102,15 +165,51 @@ class SatellitePredictor:
         # Create the satellite object
         self.createSatellite()
 
+    @property
+    def satellite(self):
+        return self.earth_satellites.get(self.satcat_id)
+
+    @property
+    def difference(self):
+        return self.differences.get(self.satcat_id)
+
+    @property
+    def tle_line1(self):
+        return self.tles.get(self.satcat_id, (None, None))[0]
+
+    @property
+    def tle_line2(self):
+        return self.tles.get(self.satcat_id, (None, None))[1]
+
+    def configChanged(self, changed):
+        """
+        Called by the config when the ephemeris settings or the elevation mask change, the passages already
+        prepared keep theirs (a new pass_min_elevation is a different key of the pass cache)
+        The ground stations only change the answers of remoteGetVisibleSatellites, the predictions are from the observer
+        """
+        self.ephemeris_step = self.Config.get("ephemeris_step")
+        self.ephemeris_max_error = self.Config.get("ephemeris_max_error")
+        self.min_elevation = self.Config.get("pass_min_elevation")
+        if "ground_stations" in changed:
+            try:
+                self.ground_stations = parseStationList(self.Config.get("ground_stations"))
+                self.satellite_set.setStations(self.ground_stations)
+            except ValueError as e:
+                self.logger.error(f"Invalid ground_stations, keeping the previous ones: {e}")
+        self.logger.info(f"Configuration updated: {sorted(changed)}")
+
     def registerFunctions(self):
         """
         Will register the functions that will be available to the cliets
         """
 
-        self.server.register_function(self.remoteUpdateTle)
+        # the expensive ones only run one at a time, so they never take all the threads of the server
+        self.server.register_function(self.remoteUpdateTle, max_concurrency=1)
         self.server.register_function(self.remoteGetSatellitePosition)
+        self.server.register_function(self.remoteGetSatellitePositions)
+        self.server.register_function(self.remoteGetVisibleSatellites)
         self.server.register_function(self.remoteGetNextPassage)
-        self.server.register_function(self.remoteGetNextPasses)
+        self.server.register_function(self.remoteGetNextPasses, max_concurrency=1)
         
     def remoteUpdateTle(self):
         self.logger.warning("Received a request to update TLE")
@@ -123,26 +222,46 @@ class SatellitePredictor:
             return False
         return True
     
-    def remoteGetSatellitePosition(self):
+    def remoteGetSatellitePosition(self, timestamp=None, satcat_id=None):
         """
         Return a list with the elevation, azimuth and distance of the satellite right now
+        or at the given timestamp (float epoch), the main satellite if satcat_id is not given
         """
         self.logger.debug("Getting satellite position remote")
         
-        elevation, azimuth, distance = self.getSatellitePosition()
+        elevation, azimuth, distance = self.getSatellitePosition(timestamp, satcat_id)
         return [float(elevation), float(azimuth), float(distance)]
     
+    def remoteGetSatellitePositions(self, timestamps, satcat_id=None):
+        """
+        Receives a list of timestamps (float epoch) and returns the positions for all of them at once
+        [elevations, azimuths, distances] each one is a list with the same length as timestamps
+        """
+        self.logger.debug(f"Getting {len(timestamps)} satellite positions remote")
+        
+        elevations, azimuths, distances = self.getSatellitePositions(timestamps, satcat_id)
+        return [elevations.tolist(), azimuths.tolist(), distances.tolist()]
+
+    def remoteGetVisibleSatellites(self, timestamps, min_elevation=0.0, tnc_clients=None):
+        """
+        Receives a list of timestamps (float epoch) and returns, for each one, the satellites above min_elevation
+        [[[satcat_id, elevation, azimuth, distance], ...], ...] highest first, all of them in a single evaluation
+        tnc_clients -> [host, port] of the station of each timestamp, the positions are seen from its site (ground_stations)
+        """
+        self.logger.debug(f"Getting the visible satellites at {len(timestamps)} timestamps remote")
+        return self.satellite_set.visible(timestamps, min_elevation, tnc_clients)
+    
     def remoteGetNextPassage(self):
         self.logger.warning("Please implemenet this next passage")
         return "Next passage"
     
-    def remoteGetNextPasses(self):
+    def remoteGetNextPasses(self, num_passes=10):
         """
-        Sends a list with many dictionaries inside it
+        Sends a list with many dictionaries inside it, the next num_passes passages of all the satellites
         """
         self.logger.debug("Getting next passage remote")
         try:
-            data_list = self.getNextPasses()
+            data_list = self.getNextPasses(num_passes)
         except Exception as e:
             self.logger.error((f"Error getting next passes: {e}"))
             raise e
@@ -152,7 +271,8 @@ class SatellitePredictor:
 
     def updateTLE(self):
         """
-        Automatically updates the TLE data from CelesTrak using the satcat ID.
+        Automatically updates the TLE data of every satellite from CelesTrak using the satcat ID.
+        The ones that are not found are searched in SatNOGS, both are a single request that gives up after tle_request_timeout
         Requires an internet connection.
         """
 
@@ -161,101 +281,245 @@ class SatellitePredictor:
             self.logger.warning("Last update was less than an hour ago")
             return False
 
+        # a single request for all the satellites, with many of them the whole group of active satellites is downloaded
+        # (one file) and the ones that are tracked are taken from it
+        if len(self.satcat_ids) == 1:
+            params = {"CATNR": self.satcat_ids[0], "FORMAT": "tle"}
+        else:
+            params = {"GROUP": "active", "FORMAT": "tle"}
+        tles = {}
         try:
-            # Fetch TLE data from CelesTrak for the given satcat ID
-            url = f"https://celestrak.org/NORAD/elements/gp.php?CATNR={self.satcat_id}"
-            response = requests.get(url)
+            response = requests.get(CELESTRAK_URL, params=params, timeout=self.Config.get("tle_request_timeout"))
             response.raise_for_status()
             self.last_tle_update = datetime.now()
 
-            # Parse the TLE lines
-            tle_data = response.text.strip().split("\n")
-            if len(tle_data) >= 2:
-                self.tle_line1 = tle_data[1]
-                self.tle_line2 = tle_data[2]
-            else:
-                raise ValueError(f"TLE data for satellite {self.satcat_id} could not be retrieved.")
-
-            self.logger.debug(f"Updated TLE for satellite {self.satcat_id}")
+            found = parseTleText(response.text)
+            tles = {satcat_id: found[satcat_id] for satcat_id in self.satcat_ids if satcat_id in found}
+            self.logger.debug(f"Updated TLE for satellites {sorted(tles)}")
         except Exception as e:
-            self.logger.error(f"Error updating TLE: {e}")
-            self.updateTLE_fallback()
-            self.createSatellite()  # update the tle in the satellite object
+            self.logger.error(f"Error updating the TLEs from CelesTrak: {e}")
+
+        missing = [satcat_id for satcat_id in self.satcat_ids if satcat_id not in tles]
+        if missing:
+            tles.update(self.updateTLE_fallback(missing))
+        self.setTLEs(tles)
+    
+    def setTLE(self, tle_line1, tle_line2, satcat_id=None):
+        """
+        Uses the new TLE if the elements are different from the current ones
+        The satellite (and with it the predicted passages and their ephemerides) is only made again in that case
+        Returns True if the TLE changed
+        """
+        satcat_id = self.satcat_id if satcat_id is None else satcat_id
+        return bool(self.setTLEs({satcat_id: (tle_line1, tle_line2)}))
+
+    def setTLEs(self, tles):
+        """
+        setTLE for many satellites, {satcat_id: (tle_line1, tle_line2)}
+        The satellites that changed are made again together, returns their satcat_id
+        """
+        changed = []
+        for satcat_id, (tle_line1, tle_line2) in tles.items():
+            tle_line1, tle_line2 = tle_line1.strip(), tle_line2.strip()
+            if (tle_line1, tle_line2) == self.tles.get(satcat_id):
+                self.logger.debug(f"TLE for satellite {satcat_id} did not change")
+                continue
+            self.tles[satcat_id] = (tle_line1, tle_line2)
+            changed.append(satcat_id)
+
+        if changed:
+            self.createSatellite(changed)
+        return changed
             
-    def updateTLE_fallback(self):
+    def updateTLE_fallback(self, satcat_ids):
         """
         This funciton will attempt to get the tle from another source if celestrak fails. In this case it will use satnogs
+        Returns {satcat_id: (tle_line1, tle_line2)} with the ones that were found
         """
         self.logger.debug("Attempting to get TLE from SatNOGS")
+        tles = {}
         try:
-            url = "https://db.satnogs.org/api/tle/?&format=json"   # unfortunatly this will get all the tles and we need to search for our sat
-            response = requests.get(url)
+            url = "https://db.satnogs.org/api/tle/?&format=json"   # unfortunatly this will get all the tles and we need to search for our sats
+            response = requests.get(url, timeout=self.Config.get("tle_request_timeout"))
             response.raise_for_status()
 
             # Parse JSON response
             data = response.json()
-            for i in range(len(data)):
-                if self.satcat_id == data[i]['norad_cat_id']:
-                    latest_tle = data[i]  # Get the latest TLE entry
-                    tle_line1 = latest_tle['tle1']
-                    tle_line2 = latest_tle['tle2']
-                    break
-            self.tle_line1 = tle_line1
-            self.tle_line2 = tle_line2
-            self.logger.debug(f"current TLE for satellite {self.satcat_id}:\n{self.tle_line1}\n{self.tle_line2}")
+            for latest_tle in data:
+                if latest_tle['norad_cat_id'] in satcat_ids and latest_tle['norad_cat_id'] not in tles:
+                    tles[latest_tle['norad_cat_id']] = (latest_tle['tle1'], latest_tle['tle2'])
+            self.logger.debug(f"TLEs found in SatNOGS for {sorted(tles)} of {satcat_ids}")
             print("fallback good")
         except Exception as e:
             self.logger.error(f"Error getting TLE from SatNOGS: {e}")
-            return False
+        return tles
             
 
-    def loadTLE(self, tle_line1=None, tle_line2=None):
+    def loadTLE(self, tle_line1=None, tle_line2=None, satcat_id=None):
         """
-        Given a TLE data, loads them into the class
+        Given a TLE data, loads them into the class (the default one of the satellite if they are not given)
+        createSatellite has to be called after it
         """
-        default_tle1 = '1 60238U 24128D   25180.89646745  .00004045  00000+0  28654-3 0  9991'
-        default_tle2 = '2 60238  61.9914   5.9727 0052120  61.8031 298.8311 15.05478104 53319'
+        satcat_id = self.satcat_id if satcat_id is None else satcat_id
+        default_tle1, default_tle2 = DEFAULT_TLES.get(satcat_id, (None, None))
 
-        self.tle_line1 = tle_line1 if tle_line1 is not None else default_tle1
-        self.tle_line2 = tle_line2 if tle_line2 is not None else default_tle2
+        tle_line1 = tle_line1 if tle_line1 is not None else default_tle1
+        tle_line2 = tle_line2 if tle_line2 is not None else default_tle2
+        if tle_line1 is not None and tle_line2 is not None:
+            self.tles[satcat_id] = (tle_line1, tle_line2)
 
-    def createSatellite(self):
+    def createSatellite(self, satcat_ids=None):
         """
-        Creates the satellite object based on the TLE data provided
+        Creates the satellite objects based on the TLE data provided, of all the satellites if satcat_ids is None
+        The ones without a TLE are left out until updateTLE finds it
         """
-        
-        if self.tle_line1 is None or self.tle_line2 is None:
-            raise ValueError(f"TLE data not loaded for satellite {self.satcat_id}")
+        satcat_ids = self.satcat_ids if satcat_ids is None else satcat_ids
 
         self.ts = load.timescale()
-        self.satellite = EarthSatellite(self.tle_line1, self.tle_line2, str(self.satcat_id), self.ts)
+        with self.pass_lock:
+            # replaced instead of modified, other threads may be reading them
+            earth_satellites = dict(self.earth_satellites)
+            differences = dict(self.differences)
+            for satcat_id in satcat_ids:
+                if satcat_id not in self.tles:
+                    self.logger.warning(f"TLE data not loaded for satellite {satcat_id}")
+                    continue
+                tle_line1, tle_line2 = self.tles[satcat_id]
+                earth_satellites[satcat_id] = EarthSatellite(tle_line1, tle_line2, str(satcat_id), self.ts)
+                differences[satcat_id] = earth_satellites[satcat_id] - self.observer
+                self.pass_cache.pop(satcat_id, None)
+
+            satellite_set = SatelliteSet(self.ts, *self.observer_key, stations=self.ground_stations)
+            satellite_set.setTLEs({satcat_id: self.tles[satcat_id] for satcat_id in earth_satellites})
+
+            self.earth_satellites = earth_satellites
+            self.differences = differences
+            self.satellite_set = satellite_set
+            # they were computed with the old TLE
+            self.ephemerides = {key: value for key, value in self.ephemerides.items() if key[0] not in satcat_ids}
 
         return self.satellite
 
-    def getSatellitePosition(self):
+    def getDifference(self, satcat_id=None):
+        """
+        satellite - observer of the satellite (the main one if satcat_id is None)
+        """
+        satcat_id = self.satcat_id if satcat_id is None else satcat_id
+        difference = self.differences.get(satcat_id)
+        if difference is None:
+            raise ValueError(f"Satellite object not created for {satcat_id}")
+        return difference
+
+    def timeFromTimestamps(self, timestamps):
+        """
+        Converts float epochs (single value or array) into a skyfield Time
+        The seconds are counted from the start of each day, otherwise skyfield would add the leap seconds
+        since 1970 on top of the unix time
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        days = np.floor(timestamps / 86400.0)
+        return self.ts.utc(1970, 1, 1 + days, 0, 0, timestamps - days * 86400.0)
+
+    def getSatellitePositions(self, timestamps, satcat_id=None):
+        """
+        Same as getSatellitePosition but for an array of timestamps (float epoch)
+        sgp4 and the rotation to the observer are done with numpy for all the timestamps together (SatelliteSet), without
+        the nutation of skyfield (the difference with skyfield's altaz is below 0.0001°, a few tens of cm)
+        getSatellitePosition uses this too, both give the same position for the same instant
+        Returns three numpy arrays: elevations (degrees), azimuths (degrees) and distances (km)
+        """
+        satcat_id = self.satcat_id if satcat_id is None else satcat_id
+        try:
+            return self.satellite_set.satellitePositions(satcat_id, timestamps)
+        except KeyError:
+            raise ValueError(f"Satellite object not created for {satcat_id}")
+
+    def buildPassEphemeris(self, aos, los, refinements=2, satcat_id=None):
+        """
+        Samples the passage between aos and los (float epochs) every ephemeris_step seconds and fits the splines
+        The interpolation is checked against skyfield in the middle of every step (worst case for a spline)
+        The azimuth error is scaled by cos(elevation) so it is the real pointing error
+        If the error is above ephemeris_max_error the step is halved (passages close to the zenith need it),
+        after the refinements the ephemeris is discarded and None is returned
+        """
+        step = self.ephemeris_step
+        for _ in range(refinements + 1):
+            count = int(np.ceil((los - aos) / step)) + 1
+            timestamps = aos + np.arange(count) * step
+            ephemeris = PassEphemeris(timestamps, *self.getSatellitePositions(timestamps, satcat_id))
+
+            # compare with the direct evaluation
+            midpoints = timestamps[:-1] + step / 2
+            expected = np.array(self.getSatellitePositions(midpoints, satcat_id))
+            interpolated = np.array(ephemeris.positions(midpoints))
+            errors = np.abs(interpolated - expected)
+            errors[1] = np.abs((errors[1] + 180.0) % 360.0 - 180.0)  # azimuth wraps around
+            # close to the zenith the azimuth moves very fast but that is not a pointing error, scale it to an angle in the sky
+            errors[1] *= np.cos(np.radians(expected[0]))
+            ephemeris.max_error = errors.max(axis=1).tolist()
+
+            self.logger.debug(f"Ephemeris for passage at {aos}: {count} samples, max error elevation {ephemeris.max_error[0]:.2e}°, "
+                              f"azimuth {ephemeris.max_error[1]:.2e}°, distance {ephemeris.max_error[2]:.2e} km")
+
+            if max(ephemeris.max_error[:2]) <= self.ephemeris_max_error:
+                return ephemeris
+            step /= 2
+
+        self.logger.warning(f"Ephemeris for passage at {aos} discarded, error above {self.ephemeris_max_error}°")
+        return None
+
+    def addPassEphemeris(self, aos, los, satcat_id=None):
+        """
+        Builds the ephemeris of the passage and keeps it, also gets rid of the passages that are already over
+        """
+        satcat_id = self.satcat_id if satcat_id is None else satcat_id
+        ephemeris = self.buildPassEphemeris(aos, los, satcat_id=satcat_id)
+
+        # the dictionary is replaced instead of modified, other threads may be reading it in getPassEphemeris
+        now = datetime.now().timestamp()
+        ephemerides = {key: value for key, value in self.ephemerides.items() if value.end >= now}
+        if ephemeris is not None:
+            ephemerides[(satcat_id, aos)] = ephemeris
+        self.ephemerides = ephemerides
+        return ephemeris
+
+    def getPassEphemeris(self, timestamp, satcat_id=None):
+        """
+        Returns the ephemeris that covers the timestamp, None if the timestamp is out of all the known passages
+        """
+        satcat_id = self.satcat_id if satcat_id is None else satcat_id
+        for (owner, _), ephemeris in self.ephemerides.items():
+            if owner == satcat_id and ephemeris.contains(timestamp):
+                return ephemeris
+        return None
+
+    def getSatellitePosition(self, timestamp=None, satcat_id=None):
         """
         Calculate the satellite's position relative to the observer
+        timestamp is a float epoch, if it is None the current time is used
+        During a known passage the position comes from the interpolated ephemeris, otherwise SGP4 is used
         Returns the elevation (degrees), azimuth (degrees), and distance (km)
         """
-        # Check if the satellite object is created
-        if self.satellite is None:
-            raise ValueError(f"Satellite object not created for {self.satcat_id}")
+        if timestamp is None:
+            timestamp = datetime.now().timestamp()
+
+        ephemeris = self.getPassEphemeris(timestamp, satcat_id)
+        if ephemeris is not None:
+            return ephemeris.position(timestamp)
 
         # [TODO] - Findf a better method to determine if the TLE data is outdated
         # # Check if the satellite has up-to-date TLE data
         # if self.satellite.epoch.utc_datetime() < self.ts.now().utc_datetime():
         #     raise ValueError(f"Satellite TLE data outdated for {self.satcat_id}")
 
-        difference = self.satellite - self.observer
-        topocentric = difference.at(self.ts.now())
-
-        alt, az, distance = topocentric.altaz()
+        # the same evaluation as getSatellitePositions, with a single timestamp
+        elevations, azimuths, distances = self.getSatellitePositions([timestamp], satcat_id)
 
-        # print(f"Elevation: {alt.degrees:.2f}°")  # Elevation above the horizon
-        # print(f"Azimuth: {az.degrees:.2f}°")    # Direction from north
-        # print(f"Distance: {distance.km:.2f} km")
+        # print(f"Elevation: {elevations[0]:.2f}°")  # Elevation above the horizon
+        # print(f"Azimuth: {azimuths[0]:.2f}°")    # Direction from north
+        # print(f"Distance: {distances[0]:.2f} km")
 
-        return alt.degrees, az.degrees, distance.km
+        return float(elevations[0]), float(azimuths[0]), float(distances[0])
 
     def getNextPassage(self):
         """
@@ -311,122 +575,185 @@ class SatellitePredictor:
             self.logger.error("No pass found in the specified time window.")
             return None, None, None, None, None
 
-    def getNextPasses(self, num_passes=10):
+    def findPasses(self, start, end, min_elevation=10.0, satcat_id=None):
+        """
+        Finds the passages between start and end (float epochs) with a single find_events for the whole window
+        The elevations and azimuths of all the events come from a single vector Time
+        Returns (passes, resume):
+            passes -> list of (aos, los, peak_elevation, start_azimuth, end_azimuth), the times as float epochs
+            resume -> where the next search has to start, the aos of a passage that is not over at end (or end)
+        A passage that was already in progress at start is left out, like the ones below min_elevation
         """
-        Calculates the next `num_passes` passages of the satellite over the observer.
+        satcat_id = self.satcat_id if satcat_id is None else satcat_id
+        satellite = self.earth_satellites.get(satcat_id)
+        if satellite is None:
+            raise ValueError(f"Satellite object not created for {satcat_id}")
+
+        times, events = satellite.find_events(self.observer, self.timeFromTimestamps(start),
+                                              self.timeFromTimestamps(end), altitude_degrees=0.0)
+        if len(events) == 0:
+            return [], end
+
+        epochs = np.array([time.timestamp() for time in times.utc_datetime()])
+        elevations, azimuths, _ = self.getSatellitePositions(epochs, satcat_id)
+
+        passes = []
+        aos = None
+        for epoch, event, elevation, azimuth in zip(epochs.tolist(), events.tolist(), elevations.tolist(), azimuths.tolist()):
+            if event == 0:  # Rise (AOS)
+                aos, start_azimuth, peak_elevation = epoch, azimuth, 0.0
+            elif aos is None:
+                # Prevent crash after missing the start of a passage
+                continue
+            elif event == 1:  # Culmination (Peak)
+                peak_elevation = max(peak_elevation, elevation)
+            else:  # Set (LOS)
+                if peak_elevation >= min_elevation:
+                    passes.append((aos, epoch, peak_elevation, start_azimuth, azimuth))
+                else:
+                    self.logger.debug("Pass of %s at %s filtered out due to low peak elevation (%.2f° < %s°)", satcat_id, aos, peak_elevation, min_elevation)
+                aos = None
+
+        return passes, aos if aos is not None else end
+
+    def buildPasses(self, found, satcat_id=None):
+        """
+        Converts the passages of findPasses to the dictionaries sent to the scheduler, with their ephemerides
+        The azimuth/elevation points of all of them are computed in a single evaluation
+        """
+        if not found:
+            return []
+        satcat_id = self.satcat_id if satcat_id is None else satcat_id
+        tle_line1, tle_line2 = self.tles[satcat_id]
+
+        number_of_points = 20
+        aos_list = np.array([sat_pass[0] for sat_pass in found])
+        los_list = np.array([sat_pass[1] for sat_pass in found])
+        time_intervals = aos_list[:, None] + (los_list - aos_list)[:, None] * (np.arange(number_of_points) / number_of_points)
+        elevations, azimuths, _ = self.getSatellitePositions(time_intervals.ravel(), satcat_id)
+        tracks = np.stack([azimuths, elevations], axis=1).reshape(len(found), number_of_points, 2)
+
+        passes = []
+        for (aos, los, peak_elevation, start_azimuth, end_azimuth), time_interval, track in zip(found, time_intervals, tracks):
+            # the ephemeris goes with the passage so that master can tag the frames without asking us
+            ephemeris = self.addPassEphemeris(aos, los, satcat_id)
+            passes.append({
+                "satcat_id": satcat_id,
+                "callsign": self.callsigns.get(satcat_id) or "",
+                "aos": aos,
+                "los": los,
+                "max_elevation": peak_elevation,
+                "start_azimuth": start_azimuth,
+                "end_azimuth": end_azimuth,
+                "tle_line1": tle_line1,
+                "tle_line2": tle_line2,
+                "azimuth_elevation": track.tolist(),
+                "time_interval": time_interval.tolist(),
+                "ephemeris": ephemeris.toDict() if ephemeris is not None else {}
+            })
+            self.logger.info(f"Pass added. Satellite {satcat_id}, AOS: {datetime.fromtimestamp(aos, utc)}, LOS: {datetime.fromtimestamp(los, utc)}, Peak Elevation: {peak_elevation:.2f}°")
+        return passes
+
+    def getNextPasses(self, num_passes=10, start=None):
+        """
+        Calculates the next `num_passes` passages of all the satellites over the observer, sorted by aos.
         Args:
             num_passes (int): Number of satellite passes to calculate.
+            start (float): epoch where the search starts, now if it is None
         Returns:
             List of dictionaries containing:
-                - aos (datetime): Acquisition of Signal (rise time)
-                - los (datetime): Loss of Signal (set time)
-                - peak_elevation (float): Maximum elevation (degrees) during the pass
+                - satcat_id (int), callsign (str): satellite of the passage
+                - aos (float): Acquisition of Signal (rise time)
+                - los (float): Loss of Signal (set time)
+                - max_elevation (float): Maximum elevation (degrees) during the pass
                 - start_azimuth (float): Azimuth (degrees) at AOS
                 - end_azimuth (float): Azimuth (degrees) at LOS
+                - ephemeris (dict): PassEphemeris.toDict() of the passage, empty if it could not be built
+                - tracked (bool), conflicts (list): see PassTimeline.resolveConflicts, the antennas follow the
+                  tracked ones, conflicts has the satcat_id of the passages that overlap it
+        The passages of each satellite are kept in pass_cache for the same TLE, observer and pass_min_elevation, a
+        repeated request only filters them. When more are needed every satellite is searched up to the same day,
+        PASS_SEARCH_DAYS at a time (a single find_events each, see findPasses) up to PASS_SEARCH_LIMIT days after
+        start. Only the passages that are returned get their track and ephemeris
         """
-        self.logger.info("Starting to calculate next satellite passes.")
-        self.logger.debug(f"Number of passes requested: {num_passes}")
+        self.logger.debug("Getting the next %s passes", num_passes)
 
-        if self.satellite is None:
-            error_message = f"Satellite object not created for {self.satcat_id}"
+        if not self.earth_satellites:
+            error_message = "No satellite object created"
             self.logger.error(error_message)
             raise ValueError(error_message)
 
-        passes = []
-        now = self.ts.now()
-        self.logger.debug(f"Current time (UTC): {now.utc_datetime()}")
-
-        search_start = now
-        self.logger.debug(f"Search start time initialized to: {search_start.utc_datetime()}")
-
-        aos, los, peak_elevation = None, None, 0
-        start_azimuth, end_azimuth = None, None
-
-        attemptCounter = 0
-        while len(passes) < num_passes:
-            search_end = self.ts.utc(search_start.utc_datetime() + timedelta(days=1))
-            self.logger.debug(f"Search end time set to: {search_end.utc_datetime()}")
-
-            try:
-                times, events = self.satellite.find_events(self.observer, search_start, search_end, altitude_degrees=0.0)
-                self.logger.debug(f"Found {len(events)} events in the range {search_start.utc_datetime()} to {search_end.utc_datetime()}.")
-            except ValueError as e:
-                self.logger.error(f"Error finding events: {e}")
-                break
-
-            for i, event in enumerate(events):
-                time = times[i].utc_datetime()
-                self.logger.debug(f"Processing event {i}: {event} at {time}")
-
-                if event == 0:  # Rise (AOS)
-                    aos = time
-                    topocentric = (self.satellite - self.observer).at(times[i])
-                    start_azimuth = float(topocentric.altaz()[1].degrees)
-                    self.logger.debug(f"AOS detected at {aos} with start azimuth: {start_azimuth:.2f}°")
-                elif event == 1:  # Culmination (Peak)
-                    if not aos: # Prevent crash after missing the start of a passage
-                        self.logger.debug(f"Skipping Peak at {time} after missing AOS")
-                        continue
-                    topocentric = (self.satellite - self.observer).at(times[i])
-                    peak_elevation = float(max(peak_elevation, topocentric.altaz()[0].degrees))
-                    self.logger.debug(f"Peak elevation updated to: {peak_elevation:.2f}°")
-                elif event == 2: # Prevent crash after missing the start of a passage
-                    if not aos:
-                        self.logger.debug(f"Skipping LOS at {time} after missing AOS")
-                        continue
-                    los = time
-                    topocentric = (self.satellite - self.observer).at(times[i])
-                    end_azimuth = float(topocentric.altaz()[1].degrees)
-                    self.logger.debug(f"LOS detected at {los} with end azimuth: {end_azimuth:.2f}°")
-
-                    if peak_elevation < 10:
-                        self.logger.info(f"Pass filtered out due to low peak elevation ({peak_elevation:.2f}° < 10°).")
-                        aos, los, peak_elevation = None, None, 0
-                        start_azimuth, end_azimuth = None, None
-                        continue
-
-                    number_of_points = 20
-                    self.logger.debug(f"Calculating azimuth/elevation points for pass. Number of points: {number_of_points}")
-                    interval = (los - aos).total_seconds() / number_of_points
-                    time_interval = [aos + timedelta(seconds=i * interval) for i in range(number_of_points)]
-                    
-                    azimuth_elevation = []
-                    for t in time_interval:
-                        topocentric = (self.satellite - self.observer).at(self.ts.utc(t))
-                        alt, az, _ = topocentric.altaz()
-                        azimuth_elevation.append([float(az.degrees), float(alt.degrees)])
-
-                    time_interval = [t.timestamp() for t in time_interval]
-                    if aos and los:
-                        passes.append({
-                            "aos": aos.timestamp(),
-                            "los": los.timestamp(),
-                            "max_elevation": peak_elevation,
-                            "start_azimuth": start_azimuth,
-                            "end_azimuth": end_azimuth,
-                            "tle_line1": self.tle_line1,
-                            "tle_line2": self.tle_line2,
-                            "azimuth_elevation": azimuth_elevation,
-                            "time_interval": time_interval
-                        })
-                        self.logger.info(f"Pass added. AOS: {aos}, LOS: {los}, Peak Elevation: {peak_elevation:.2f}°")
-
-                        aos, los, peak_elevation = None, None, 0
-                        start_azimuth, end_azimuth = None, None
-
-                    if len(passes) >= num_passes:
-                        self.logger.info(f"Desired number of passes ({num_passes}) reached.")
-                        break
-
-            search_start = search_end
-            self.logger.debug(f"Moving search start to: {search_start.utc_datetime()}")
-            attemptCounter += 1
-            
-            if attemptCounter > 15:
-                self.logger.warning("Too many attempts to find passes. Exiting loop.")
-                break
+        if start is None:
+            start = datetime.now().timestamp()
+        limit = start + PASS_SEARCH_LIMIT * 86400.0
+
+        with self.pass_lock:
+            caches = {}
+            for satcat_id in self.earth_satellites:
+                key = (*self.tles[satcat_id], self.observer_key, self.min_elevation)
+                cache = self.pass_cache.get(satcat_id)
+                if cache is None or cache["key"] != key or start < cache["start"]:
+                    cache = self.pass_cache[satcat_id] = {"key": key, "start": start, "resume": start, "passes": [], "built": {}}
+                else:
+                    # the passages that already started are not needed anymore
+                    cache["passes"] = [sat_pass for sat_pass in cache["passes"] if sat_pass[0] >= start]
+                    cache["built"] = {aos: sat_pass for aos, sat_pass in cache["built"].items() if aos >= start}
+                    cache["start"] = start
+                caches[satcat_id] = cache
+
+            horizon = start
+            while True:
+                # every satellite was searched up to complete, no passage that starts before it is missing
+                complete = min([cache["resume"] for cache in caches.values()], default=limit)
+                merged = sorted((sat_pass[0], satcat_id, sat_pass) for satcat_id, cache in caches.items()
+                                for sat_pass in cache["passes"] if sat_pass[0] < complete)
+                if len(merged) >= num_passes or complete >= limit:
+                    break
 
-        self.logger.info(f"Completed calculation. Total passes found: {len(passes)}")
+                horizon = min(max(horizon, complete) + PASS_SEARCH_DAYS * 86400.0, limit)
+                self.logger.info("Searching passes of %d satellites up to %s", len(caches), datetime.fromtimestamp(horizon, utc))
+                for satcat_id, cache in list(caches.items()):
+                    while cache["resume"] < horizon:
+                        # a request far after the last one does not search the days in between
+                        search_start = max(cache["resume"], start)
+                        search_end = min(search_start + PASS_SEARCH_DAYS * 86400.0, limit)
+                        try:
+                            found, resume = self.findPasses(search_start, search_end, self.min_elevation, satcat_id)
+                        except ValueError as e:
+                            # left out of this request, it is searched again in the next one
+                            self.logger.error(f"Error finding events of {satcat_id}: {e}")
+                            del caches[satcat_id]
+                            break
+                        cache["passes"].extend(found)
+
+                        # a passage cut by the end of the window is searched again from a bit before its aos,
+                        # unless the window already ends at the limit or the passage is longer than a whole window
+                        # (the same search would give the same cut passage forever)
+                        if resume < search_end and search_end < limit and resume - 60.0 > search_start:
+                            cache["resume"] = resume - 60.0
+                        else:
+                            cache["resume"] = search_end
+
+            # the conflicts are checked with every passage known, one that is not returned can still overlap
+            resolved = resolveConflicts([{"satcat_id": satcat_id, "aos": sat_pass[0], "los": sat_pass[1], "max_elevation": sat_pass[2]}
+                                         for _, satcat_id, sat_pass in merged], self.priority)
+            selected = list(zip(merged[:num_passes], resolved[:num_passes]))
+
+            # the track and the ephemeris, the passages of each satellite in a single evaluation
+            missing = {}
+            for (aos, satcat_id, sat_pass), _ in selected:
+                if aos not in caches[satcat_id]["built"]:
+                    missing.setdefault(satcat_id, []).append(sat_pass)
+            for satcat_id, found in missing.items():
+                for sat_pass in self.buildPasses(found, satcat_id):
+                    caches[satcat_id]["built"][sat_pass["aos"]] = sat_pass
+
+            passes = [dict(caches[satcat_id]["built"][aos], tracked=conflict["tracked"], conflicts=conflict["conflicts"])
+                      for (aos, satcat_id, _), conflict in selected]
+
+        if len(passes) < num_passes:
+            self.logger.warning(f"Only {len(passes)} passes found in {PASS_SEARCH_LIMIT} days")
+        self.logger.debug("Completed calculation. Total passes found: %d", len(passes))
         return passes
 
 
@@ -0,0 +1,126 @@
+"""
+Positions of many satellites at once
+
+skyfield evaluates the satellites one at a time (an EarthSatellite each), with hundreds of them that is hundreds of
+calls for every timestamp. Here the TLEs of all the tracked satellites are in a single sgp4 SatrecArray, one call
+propagates every satellite to every timestamp and the conversion to elevation/azimuth is done with numpy for all
+of them together
+
+TEME -> ITRF is the rotation by the Greenwich sidereal time (theta_GMST1982, the same as TEME_to_ITRF of skyfield)
+without polar motion, the difference with skyfield is below 0.0001°
+
+Each timestamp can be seen from a different ground station (see GroundStations), the propagation is the same for
+all of them, only the last rotation changes, so more stations do not add sgp4 calls
+"""
+
+import numpy as np
+from sgp4.api import Satrec, SatrecArray
+from skyfield.sgp4lib import theta_GMST1982
+
+from GroundStations import GroundStations
+
+
+UNIX_EPOCH_JD = 2440587.5
+
+
+class SatelliteSet:
+
+    def __init__(self, ts, latitude, longitude, elevation=0.0, stations=None):
+        """
+        ts -> skyfield timescale, used for the UT1 of the sidereal time
+        latitude, longitude (degrees), elevation (meters) -> the observer, the reference site of GroundStations
+        stations -> {(host, port): (latitude, longitude, elevation)} the other sites, see setStations
+        """
+        self.ts = ts
+        self.stations = GroundStations((latitude, longitude, elevation), stations)
+
+        self.satcat_ids = []
+        self.index = {}          # satcat_id -> row of the results
+        self.satrecs = None
+        self.satrec_list = []    # the same Satrec one by one, for the positions of a single satellite
+
+    def __len__(self):
+        return len(self.satcat_ids)
+
+    def setStations(self, stations):
+        """
+        stations -> {(host, port): (latitude, longitude, elevation)}, replaces all the ground stations
+        """
+        self.stations = GroundStations(self.stations.reference, stations)
+
+    def setTLEs(self, tles):
+        """
+        tles -> {satcat_id: (tle_line1, tle_line2)}, replaces all the satellites
+        """
+        self.satcat_ids = list(tles)
+        self.index = {satcat_id: row for row, satcat_id in enumerate(self.satcat_ids)}
+        self.satrec_list = [Satrec.twoline2rv(line1, line2) for line1, line2 in tles.values()]
+        self.satrecs = SatrecArray(self.satrec_list) if tles else None
+
+    def positions(self, timestamps, tnc_clients=None):
+        """
+        Elevation (degrees), azimuth (degrees) and distance (km) of every satellite at every timestamp (float epochs)
+        tnc_clients -> the station of each timestamp, it is seen from that site (the observer if None or not known)
+        Returns three arrays of shape (satellites, timestamps), the row of each satellite is index[satcat_id]
+        A satellite that sgp4 can not propagate at a timestamp (decayed, bad TLE) gets nan
+        """
+        timestamps = np.atleast_1d(np.asarray(timestamps, dtype=np.float64))
+        if self.satrecs is None or len(timestamps) == 0:
+            empty = np.empty((len(self.satcat_ids), len(timestamps)))
+            return empty, empty.copy(), empty.copy()
+
+        # sgp4 takes the julian date in UTC, the unix time has no leap seconds so it is a division
+        days = np.floor(timestamps / 86400.0)
+        errors, positions, _ = self.satrecs.sgp4(UNIX_EPOCH_JD + days, (timestamps - days * 86400.0) / 86400.0)
+        return self.topocentric(timestamps, errors, positions, tnc_clients)
+
+    def satellitePositions(self, satcat_id, timestamps, tnc_clients=None):
+        """
+        Same as positions for a single satellite, returns three arrays of shape (timestamps,)
+        Raises KeyError if the satellite is not in the set
+        """
+        satrec = self.satrec_list[self.index[satcat_id]]
+        timestamps = np.atleast_1d(np.asarray(timestamps, dtype=np.float64))
+        if len(timestamps) == 0:
+            return np.empty(0), np.empty(0), np.empty(0)
+
+        days = np.floor(timestamps / 86400.0)
+        errors, positions, _ = satrec.sgp4_array(UNIX_EPOCH_JD + days, (timestamps - days * 86400.0) / 86400.0)
+        return self.topocentric(timestamps, errors, positions, tnc_clients)
+
+    def topocentric(self, timestamps, errors, positions, tnc_clients=None):
+        """
+        TEME positions of sgp4 (..., timestamps, 3) to elevation/azimuth/distance seen from the site of each timestamp
+        """
+        days = np.floor(timestamps / 86400.0)
+
+        # TEME -> ITRF, a rotation around z by the sidereal time of each timestamp (the same for all the satellites)
+        time = self.ts.utc(1970, 1, 1 + days, 0, 0, timestamps - days * 86400.0)
+        theta, _ = theta_GMST1982(time.whole, time.ut1_fraction)
+        cos, sin = np.cos(theta), np.sin(theta)
+        x = cos * positions[..., 0] + sin * positions[..., 1]
+        y = cos * positions[..., 1] - sin * positions[..., 0]
+        itrf = np.stack((x, y, positions[..., 2]), axis=-1)
+
+        rows = self.stations.rows(tnc_clients) if tnc_clients is not None else np.zeros(len(timestamps), dtype=np.intp)
+        elevations, azimuths, distances = self.stations.topocentric(itrf, rows)
+
+        if errors.any():
+            invalid = errors != 0
+            elevations[invalid] = azimuths[invalid] = distances[invalid] = np.nan
+        return elevations, azimuths, distances
+
+    def visible(self, timestamps, min_elevation=0.0, tnc_clients=None):
+        """
+        For each timestamp the satellites above min_elevation (seen from its tnc_client), highest first
+        Returns a list (one per timestamp) of [[satcat_id, elevation, azimuth, distance], ...]
+        """
+        elevations, azimuths, distances = self.positions(timestamps, tnc_clients)
+        result = []
+        for column in range(elevations.shape[1]):
+            # nan is never above the mask
+            rows = np.flatnonzero(elevations[:, column] >= min_elevation)
+            rows = rows[np.argsort(-elevations[rows, column])]
+            result.append([[self.satcat_ids[row], float(elevations[row, column]), float(azimuths[row, column]),
+                            float(distances[row, column])] for row in rows])
+        return result
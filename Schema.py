@@ -0,0 +1,118 @@
+"""
+Expected keys and types of the dictionaries that the modules send to each other
+
+Each schema is built once when the module is imported, validating a dictionary is a single comparison of the keys
+and one isinstance per key (the old typeChecking searched the type of each key in a list and rebuilt the set of keys
+on every call)
+
+Some values are normalized before the check, tnc_client can arrive as a tuple (calls inside the same process),
+a list (after xmlrpc) or "host:port", and it is always saved as [host, port]
+"""
+
+
+class Schema:
+
+    def __init__(self, name, fields, normalize=None):
+        """
+        fields -> {key: type or tuple of types}
+        normalize -> {key: function}, applied to the value before the check, it raises ValueError/TypeError if the value is wrong
+        """
+        self.name = name
+        self.fields = dict(fields)
+        self.keys = frozenset(self.fields)
+        self.normalize = dict(normalize or {})
+        self.checks = tuple(self.fields.items())
+
+    def validate(self, data):
+        """
+        Returns None if the dictionary is valid, otherwise a message with the problem
+        The values of the keys in normalize are replaced in the dictionary
+        """
+        if not isinstance(data, dict):
+            return f"{self.name} is not a dictionary ({type(data).__name__})"
+
+        if data.keys() != self.keys:
+            missing = sorted(self.keys - data.keys())
+            unknown = sorted(data.keys() - self.keys)
+            return f"{self.name} keys are different, missing: {missing}, unknown: {unknown}"
+
+        for key, function in self.normalize.items():
+            try:
+                data[key] = function(data[key])
+            except (ValueError, TypeError) as e:
+                return f"{self.name} key {key} is not valid: {e}"
+
+        for key, expected in self.checks:
+            if not isinstance(data[key], expected):
+                return f"{self.name} key {key} has the wrong type, expected {expected}, got {type(data[key]).__name__}"
+
+        return None
+
+    def isValid(self, data):
+        return self.validate(data) is None
+
+
+def normalizeTncClient(tnc_client):
+    """
+    (host, port), [host, port] or "host:port" -> [host, port]
+    """
+    # what comes from xmlrpc, nothing to convert
+    if type(tnc_client) is list and len(tnc_client) == 2 and type(tnc_client[0]) is str and type(tnc_client[1]) is int:
+        return tnc_client
+    if isinstance(tnc_client, str):
+        tnc_client = tnc_client.rsplit(":", 1)
+    if not isinstance(tnc_client, (list, tuple)) or len(tnc_client) != 2:
+        raise ValueError(f"expected [host, port], got {tnc_client!r}")
+    host, port = tnc_client
+    if not isinstance(host, str):
+        raise TypeError(f"host must be a string, got {type(host).__name__}")
+    return [host, int(port)]
+
+
+# frame that master sends to the data warehouse (remoteSaveKiss)
+FRAME = Schema("frame", {
+    "timestamp": float,
+    "elevation": float,
+    "azimuth": float,
+    "distance": float,
+    "tnc_client": list,
+    "passage_number": int,
+    "kiss": bytes,
+}, normalize={"tnc_client": normalizeTncClient})
+
+# passage that master sends to the data warehouse (remoteCreatePassage)
+PASSAGE = Schema("passage", {
+    "passage_number": int,
+    "satcat_id": int,
+    "azimuth_elevation": list,
+    "tle_line1": str,
+    "tle_line2": str,
+    "gs_clients": list,
+    "frame_count": int,
+    "aos": float,
+    "los": float,
+    "start_azimuth": float,
+    "end_azimuth": float,
+    "max_elevation": float,
+    "time_interval": list,
+    "frame_list": list,
+    "observers": dict,
+})
+
+# passage predicted by the satellite predictor (remoteGetNextPasses)
+PREDICTED_PASSAGE = Schema("predicted passage", {
+    "satcat_id": int,
+    "callsign": str,
+    "tracked": bool,
+    "conflicts": list,
+    "azimuth_elevation": list,
+    "tle_line1": str,
+    "tle_line2": str,
+    "time_interval": list,
+    "aos": float,
+    "los": float,
+    "start_azimuth": float,
+    "end_azimuth": float,
+    "max_elevation": float,
+    "ephemeris": dict,
+})
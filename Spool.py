@@ -0,0 +1,461 @@
+"""
+Durable queue of frames on disk, the frames are written here before they are forwarded to the master
+If the master is down (or the program crashes) the frames stay in the spool until they are delivered
+
+Files (inside the folder of the spool):
+    segment_00000001.spool   -> append only segments, a new one is started after spool_segment_size bytes
+    cursor                   -> position of the first frame that was not acknowledged by the master yet and the
+                                last record id given so far (the segments with it can already be deleted)
+    id                       -> random id of this spool, used by the master to discard frames it already has
+
+Record (little endian):
+    uint32 length | uint32 crc32 | uint64 record_id | float64 timestamp | uint16 port | uint8 len(host) | host | kiss
+    length and crc32 cover everything after the crc32
+
+The writes are buffered and a background thread does the flush + fsync every spool_fsync_interval seconds,
+so the cost of the fsync is shared by all the frames of that interval. Only what was already fsynced is
+read by the drainer, a frame is never forwarded before it is safe on disk.
+
+On startup the last segment is checked and a partial record at the end (crash in the middle of a write) is cut off.
+A record that does not match its crc or its length in data that was already synced (a damaged disk, ...) can not
+be skipped on its own, the drainer logs it and continues from the next segment. The rest of that segment is lost
+(if it is the one being written a new one is started first), the frames after it are still delivered.
+The cursor is not fsynced, after a crash it can be a bit behind and some frames are sent again.
+That is what the ids are for, SpoolDrainer sends "<spool id>:<record id>" with every frame and the master ignores
+the ones it has already received (exactly once).
+
+The record ids never go back while the id of the spool is the same, the last one is also kept in the cursor so
+it is not lost when every segment was acknowledged and deleted. If the spool lost its numbering anyway (the cursor
+was deleted by hand, ...) the drainer sees that the master already has ids after the last one of the spool
+(SpoolDrainer mark) and the spool takes a new id, otherwise the master would ignore the new frames.
+"""
+
+import glob
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+
+HEADER = struct.Struct("<II")        # length, crc32
+RECORD = struct.Struct("<QdHB")      # record_id, timestamp, port, len(host)
+SEGMENT_NAME = "segment_{:08d}.spool"
+READ_BLOCK = 256 * 1024
+MAX_HOST_LENGTH = 255                # the length of the host is a uint8 of the record
+
+
+def checkHost(host):
+    """
+    Raises ValueError if the host of a tnc does not fit in a record, used where the tncs are configured
+    """
+    if len(str(host).encode()) > MAX_HOST_LENGTH:
+        raise ValueError(f"The host of a tnc can not be longer than {MAX_HOST_LENGTH} bytes: {host!r}")
+    return host
+
+
+class Spool:
+
+    def __init__(self, folder, segment_size=16 * 1024 * 1024, fsync_interval=0.05):
+        self.folder = folder
+        self.segment_size = segment_size
+        self.fsync_interval = fsync_interval
+        self.logger = logging.getLogger(f"Spool:{os.path.basename(folder)}")
+        os.makedirs(folder, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.new_data = threading.Condition(self.lock)   # notified when there is more data fsynced
+        self.closed = False
+
+        self.id = self.loadId()
+        self.recover()
+
+        self.syncer = threading.Thread(target=self.syncLoop, name=f"spool-sync:{os.path.basename(folder)}", daemon=True)
+        self.syncer.start()
+
+    ######################################################################################
+    #
+    # Opening and recovery
+    #
+    ######################################################################################
+
+    def loadId(self):
+        path = os.path.join(self.folder, "id")
+        if os.path.exists(path):
+            with open(path) as file:
+                return file.read().strip()
+
+        spool_id = uuid.uuid4().hex
+        with open(path, "w") as file:
+            file.write(spool_id)
+        return spool_id
+
+    def segmentPath(self, sequence):
+        return os.path.join(self.folder, SEGMENT_NAME.format(sequence))
+
+    def listSegments(self):
+        paths = glob.glob(os.path.join(self.folder, "segment_*.spool"))
+        return sorted(int(os.path.basename(path)[8:-6]) for path in paths)
+
+    def recover(self):
+        """
+        Finds the end of the valid data, cuts the partial record (if any) and opens the last segment to append
+        """
+        segments = self.listSegments() or [1]
+        self.write_sequence = segments[-1]
+        path = self.segmentPath(self.write_sequence)
+
+        self.last_record_id = 0
+        offset = 0
+        if os.path.exists(path):
+            for record_id, _, _, _, _, end in self.iterRecords(self.write_sequence, 0, os.path.getsize(path)):
+                self.last_record_id = record_id
+                offset = end
+            if offset != os.path.getsize(path):
+                self.logger.warning(f"Cutting {os.path.getsize(path) - offset} bytes of a partial record in {path}")
+                os.truncate(path, offset)
+
+        # the last segment can be empty, the last id is then in the one before it
+        for sequence in reversed(segments[:-1]):
+            if self.last_record_id:
+                break
+            for record in self.iterRecords(sequence, 0, os.path.getsize(self.segmentPath(sequence))):
+                self.last_record_id = record[0]
+
+        self.file = open(path, "ab")
+        self.write_offset = offset
+        self.synced = (self.write_sequence, offset)
+        self.dirty = False
+
+        # all the segments with records can be acknowledged and deleted, the cursor has the last id given
+        self.cursor, acked_record_id = self.loadCursor(segments[0])
+        self.last_record_id = max(self.last_record_id, acked_record_id)
+        # every id after this one was given by this process, see SpoolDrainer.checkMark
+        self.recovered_record_id = self.last_record_id
+        self.logger.info(f"Spool {self.id} opened, last record {self.last_record_id}, cursor {self.cursor}")
+
+    def loadCursor(self, first_sequence):
+        """
+        Returns the cursor (segment, offset) and the last record id that was given when it was saved
+        """
+        try:
+            with open(os.path.join(self.folder, "cursor")) as file:
+                saved = json.load(file)
+            cursor = (saved["segment"], saved["offset"])
+            last_record_id = int(saved.get("last_record_id", 0))
+        except (OSError, ValueError, KeyError):
+            cursor = (first_sequence, 0)
+            last_record_id = 0
+
+        # segments before the first one were already acknowledged and deleted
+        if cursor[0] < first_sequence:
+            cursor = (first_sequence, 0)
+        return cursor, last_record_id
+
+    def iterRecords(self, sequence, offset, end):
+        """
+        Yields (record_id, timestamp, host, port, kiss, end_offset) of the valid records between offset and end
+        Stops at the first record that is not complete or does not match its crc
+        """
+        with open(self.segmentPath(sequence), "rb") as file:
+            file.seek(offset)
+            data = b""
+            position = 0
+            while True:
+                # read the segment in blocks, only what is needed for the records that are asked for
+                if position + HEADER.size > len(data) or position + HEADER.size + HEADER.unpack_from(data, position)[0] > len(data):
+                    remaining = end - offset - len(data)
+                    if remaining <= 0:
+                        return
+                    data = data[position:] + file.read(min(READ_BLOCK, remaining))
+                    offset += position
+                    position = 0
+                    continue
+
+                length, crc = HEADER.unpack_from(data, position)
+                body_start = position + HEADER.size
+                body = data[body_start:body_start + length]
+                if length < RECORD.size or zlib.crc32(body) != crc:
+                    return
+
+                record_id, timestamp, port, host_length = RECORD.unpack_from(body)
+                host = body[RECORD.size:RECORD.size + host_length].decode()
+                kiss = body[RECORD.size + host_length:]
+                position = body_start + length
+                yield record_id, timestamp, host, port, kiss, offset + position
+
+    ######################################################################################
+    #
+    # Writing
+    #
+    ######################################################################################
+
+    def append(self, kiss, host, port, timestamp):
+        """
+        Adds a frame to the spool, returns its record id
+        It is only buffered here, it is on disk after the next sync (at most fsync_interval seconds)
+        """
+        host = host.encode()
+        with self.lock:
+            self.last_record_id += 1
+            body = RECORD.pack(self.last_record_id, timestamp, port, len(host)) + host + kiss
+            self.file.write(HEADER.pack(len(body), zlib.crc32(body)) + body)
+            self.write_offset += HEADER.size + len(body)
+            self.dirty = True
+
+            if self.write_offset >= self.segment_size:
+                self.rotate()
+            return self.last_record_id
+
+    def rotate(self):
+        """
+        Closes the current segment and starts a new one, must be called with the lock
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+        self.write_sequence += 1
+        self.file = open(self.segmentPath(self.write_sequence), "ab")
+        self.write_offset = 0
+        self.synced = (self.write_sequence, 0)
+        self.dirty = False
+        self.new_data.notify_all()
+
+    def sync(self):
+        """
+        Flush + fsync of everything that was appended
+        The fsync is done without the lock, append is never blocked by the disk
+        """
+        with self.lock:
+            if not self.dirty or self.closed:
+                return
+            self.file.flush()
+            self.dirty = False
+            position = (self.write_sequence, self.write_offset)
+            # a copy of the descriptor, the file can be closed by rotate while this one is in fsync
+            descriptor = os.dup(self.file.fileno())
+
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+        with self.lock:
+            if position > self.synced:
+                self.synced = position
+                self.new_data.notify_all()
+
+    def syncLoop(self):
+        while not self.closed:
+            time.sleep(self.fsync_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                self.logger.error(f"Error while syncing the spool: {e}")
+
+    ######################################################################################
+    #
+    # Reading
+    #
+    ######################################################################################
+
+    def read(self, max_records):
+        """
+        Returns (records, position) with up to max_records frames after the cursor that are already on disk
+        records -> list of (record_id, timestamp, host, port, kiss)
+        position -> give it to ack once the records were delivered
+        """
+        with self.lock:
+            sequence, offset = self.cursor
+            synced = self.synced
+
+        records = []
+        while len(records) < max_records:
+            if sequence == synced[0]:
+                end = synced[1]
+            elif sequence < synced[0]:
+                end = os.path.getsize(self.segmentPath(sequence))
+            else:
+                break
+
+            full = False
+            for record_id, timestamp, host, port, kiss, end_offset in self.iterRecords(sequence, offset, end):
+                records.append((record_id, timestamp, host, port, kiss))
+                offset = end_offset
+                if len(records) == max_records:
+                    full = True
+                    break
+
+            if not full and offset < end:
+                # everything before end is on disk, a record that stops the reading there is damaged
+                sequence, offset = self.skipDamaged(sequence, offset)
+                break
+
+            # move to the next segment only when this one is finished
+            if offset >= end and sequence < synced[0]:
+                sequence, offset = sequence + 1, 0
+            else:
+                break
+
+        return records, (sequence, offset)
+
+    def skipDamaged(self, sequence, offset):
+        """
+        Position after a damaged record, the start of the next segment
+        If the damaged record is in the segment that is being written a new segment is started
+        """
+        self.logger.error(f"Damaged record in {self.segmentPath(sequence)} at offset {offset}, "
+                          f"skipping the rest of the segment")
+        with self.lock:
+            if sequence == self.write_sequence:
+                self.rotate()
+        return sequence + 1, 0
+
+    def ack(self, position):
+        """
+        Everything before position was delivered, moves the cursor and deletes the segments that are done
+        """
+        with self.lock:
+            previous = self.cursor[0]
+            self.cursor = position
+            last_record_id = self.last_record_id
+
+        # the last id is saved before the segments are deleted, the next ids go on from it after a restart
+        path = os.path.join(self.folder, "cursor")
+        with open(path + ".tmp", "w") as file:
+            json.dump({"segment": position[0], "offset": position[1], "last_record_id": last_record_id}, file)
+        os.replace(path + ".tmp", path)
+
+        for sequence in range(previous, position[0]):
+            try:
+                os.remove(self.segmentPath(sequence))
+            except FileNotFoundError:
+                pass
+
+    def resetId(self):
+        """
+        Gives the spool a new id, the master sees its frames as the ones of a new spool
+        Used when the master already has ids after the last one of the spool, the numbering was lost
+        """
+        spool_id = uuid.uuid4().hex
+        path = os.path.join(self.folder, "id")
+        with open(path + ".tmp", "w") as file:
+            file.write(spool_id)
+        os.replace(path + ".tmp", path)
+
+        self.logger.warning(f"Spool {self.id} renamed to {spool_id}, the master already had records after {self.recovered_record_id}")
+        self.id = spool_id
+
+    def wait(self, timeout):
+        """
+        Waits until there is data after the cursor or the timeout expires
+        """
+        with self.lock:
+            if self.synced != self.cursor:
+                return True
+            return self.new_data.wait(timeout)
+
+    def pending(self):
+        """
+        Approximate number of bytes waiting to be delivered
+        """
+        with self.lock:
+            if self.cursor[0] == self.write_sequence:
+                return self.write_offset - self.cursor[1]
+            size = self.write_offset - self.cursor[1]
+        for sequence in range(self.cursor[0], self.write_sequence):
+            try:
+                size += os.path.getsize(self.segmentPath(sequence))
+            except FileNotFoundError:
+                pass
+        return size
+
+    def close(self):
+        self.sync()
+        with self.lock:
+            self.closed = True
+            self.file.close()
+
+
+class SpoolDrainer:
+    """
+    Thread that sends the frames of the spool to the master and acknowledges them when the master answers
+    There is a single drainer per spool, so the frames are delivered in order
+
+    send(batch) receives a list of [kiss, host, port, timestamp, key] and must raise if the batch was not delivered,
+    in that case the same frames are sent again later (exponential backoff between retry_min and retry_max seconds)
+    mark(spool_id) returns the last record id of the spool that the master has (Master.remoteGetSpoolMark), it is
+    asked before the first batch, if it is after the last id of the spool the numbering was lost and the spool
+    takes a new id (Spool.resetId) so the master does not ignore the frames
+    """
+
+    def __init__(self, spool, send, batch_size=64, batch_delay=0.005, retry_min=1.0, retry_max=60.0, mark=None):
+        self.spool = spool
+        self.send = send
+        self.mark = mark
+        self.mark_checked = mark is None
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.stats = {"forwarded": 0, "failed": 0, "batches": 0}
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.drainLoop, name=f"spool-drain:{self.spool.id[:8]}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def drainLoop(self):
+        backoff = self.retry_min
+        while self.running:
+            if not self.spool.wait(0.5):
+                continue
+
+            records, position = self.spool.read(self.batch_size)
+            if len(records) < self.batch_size and self.batch_delay:
+                # give the batch some time to fill
+                time.sleep(self.batch_delay)
+                records, position = self.spool.read(self.batch_size)
+            if not records:
+                # only the end of a finished segment was left, move to the next one
+                if position != self.spool.cursor:
+                    self.spool.ack(position)
+                continue
+
+            try:
+                if not self.mark_checked:
+                    self.checkMark()
+                batch = [[kiss, host, port, timestamp, f"{self.spool.id}:{record_id}"]
+                         for record_id, timestamp, host, port, kiss in records]
+                self.send(batch)
+            except Exception as e:
+                self.stats["failed"] += len(records)
+                self.spool.logger.error(f"Error while forwarding {len(records)} spooled frames, retrying in {backoff:.1f} seconds: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.retry_max)
+                continue
+
+            backoff = self.retry_min
+            self.spool.ack(position)
+            self.stats["forwarded"] += len(batch)
+            self.stats["batches"] += 1
+
+    def checkMark(self):
+        """
+        The ids after recovered_record_id were given by this process, the master can not have any of them yet
+        """
+        master_mark = int(self.mark(self.spool.id))
+        if master_mark > self.spool.recovered_record_id:
+            self.spool.resetId()
+        self.mark_checked = True
@@ -15,93 +15,43 @@ Frame Dictionary:
     
 but as far is this module knows, this does not matter
     this module will only send the following data to master
-        kiss (str) - the kiss frame "0x86 0xa2 0x86 0xa2 0x86 0xa2 ..."
+        kiss (bytes) - the kiss frame
         tnc_client_ip (str) - the ip of the tnc client that decoded the message
         tnc_client_port (int) - the port of the tnc client that decoded the message
         timestamp (float) - the timestamp when the frame was received
 """
 
 
-import xmlrpc.client
-from ConfigParser import ConfigParser
+from RpcClient import createRpcProxy
+from kiss import ReadableFrame, KissDecoder
+from Spool import Spool, SpoolDrainer, checkHost
+from ConfigParser import getConfig
+from LogSetup import createLogger
 import logging
 import socket
-import threading
 import os
 
 
-import binascii
 import datetime
 import time
 
-# KISS special characters
-KISS_FEND = 0xC0  # Frame End
-KISS_FESC = 0xDB  # Frame Escape
-KISS_TFEND = 0xDC # Transposed Frame End
-KISS_TFESC = 0xDD # Transposed Frame Escape
-
-def print_byte_array(byte_array):
-    hex_data = binascii.hexlify(byte_array).decode()  # Convert to hex string
-    # Add \x prefix to each byte
-    formatted_hex_data = ''.join(f'0x{hex_data[i:i+2]} ' for i in range(0, len(hex_data), 2))
-    # print(formatted_hex_data)
-    return formatted_hex_data
-
-def decode_kiss(data):
-    """Decode KISS-encoded data."""
-    decoded = bytearray()
-    i = 0
-    while i < len(data):
-        if data[i] == KISS_FESC:
-            i += 1
-            if i < len(data):
-                if data[i] == KISS_TFEND:
-                    decoded.append(KISS_FEND)
-                elif data[i] == KISS_TFESC:
-                    decoded.append(KISS_FESC)
-                else:
-                    decoded.append(data[i])
-        else:
-            decoded.append(data[i])
-        i += 1
-    return decoded
-
 class TncClient:
-    def __init__(self, tncHost, tncPort):
-        
-        self.Config = ConfigParser()
-        self.Config.loadDefaultValues()
-        self.Config.loadConfig()
+    def __init__(self, tncHost, tncPort, spool_folder=None):
         
-        # set up logger
-        self.logger = logging.getLogger(f"TC:{tncHost}:{tncPort}")
-        self.logger.setLevel(logging.DEBUG)
-
-        # Create console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG)
-
-        # Create file handler
-        log_path = os.path.join(self.Config.get("log_folder"), f"TC_{tncHost}_{tncPort}.log")
-        file_handler = logging.FileHandler(log_path)
-        file_handler.setLevel(logging.DEBUG)
-
-        # Define a common formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-        # Attach the formatter to handlers
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
+        # the host goes with every frame of the spool, a host that does not fit is refused here and not on each frame
+        checkHost(tncHost)
 
-        # Add handlers to the logger
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        # loaded once per process and reloaded when config.ini changes (see ConfigParser.getConfig)
+        self.Config = getConfig()
+        
+        # set up logger, the level comes from log_level in the config (see LogSetup)
+        self.logger = createLogger(f"TC:{tncHost}:{tncPort}", self.Config.get("log_folder"), self.Config.get("log_level"), file_name=f"TC_{tncHost}_{tncPort}")
     
         
         # set up the necessary endpoints
         self.master_host = self.Config.get("master_rpc_host")
         self.master_port = self.Config.get("master_rpc_port")
-        self.master_proxy = xmlrpc.client.ServerProxy(f"http://{self.master_host}:{self.master_port}")
+        self.master_proxy = createRpcProxy(self.Config, self.master_host, self.master_port)
         self.logger.debug(f"Master endpoint: {self.master_host}:{self.master_port}")
         
         # set up the tnc host and port
@@ -109,10 +59,45 @@ class TncClient:
         self.tncPort = tncPort
         self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         
-        self.buffer = bytearray()
+        # the socket is read into a preallocated buffer, the decoder keeps the incomplete frames between reads
+        self.recv_buffer = bytearray(self.Config.get("tnc_recv_buffer_size"))
+        self.recv_view = memoryview(self.recv_buffer)
+        self.decoder = KissDecoder()
+        self.data = self.recv_view[:0]
         
         self.last_message_timestamp = 0
         
+        # the frames are written to the spool and a drainer thread sends them to the master, nothing is lost if master is down
+        spool_folder = spool_folder or os.path.join(self.Config.get("spool_folder"), f"TC_{tncHost}_{tncPort}")
+        self.spool = Spool(spool_folder, segment_size=self.Config.get("spool_segment_size"),
+                           fsync_interval=self.Config.get("spool_fsync_interval"))
+        self.drainer = SpoolDrainer(self.spool, self.forwardBatch,
+                                    batch_size=self.Config.get("tnc_batch_size"),
+                                    batch_delay=self.Config.get("tnc_batch_delay"),
+                                    retry_min=self.Config.get("tnc_reconnect_min"),
+                                    retry_max=self.Config.get("tnc_reconnect_max"),
+                                    mark=self.spoolMark)
+        self.drainer.start()
+        
+        # the endpoint of the master and the batches can change in config.ini while the client is running
+        self.Config.onChange(self.configChanged, keys=["master_rpc_host", "master_rpc_port", "rpc_client_pool_size",
+                                                       "rpc_client_timeout", "rpc_client_retries", "tnc_batch_size",
+                                                       "tnc_batch_delay", "tnc_reconnect_min", "tnc_reconnect_max"])
+    
+    def configChanged(self, changed):
+        """
+        Called by the config when the master endpoint or the settings of the batches change
+        The drainer reads its settings before each batch, the new values are used from the next one
+        """
+        self.master_host = self.Config.get("master_rpc_host")
+        self.master_port = self.Config.get("master_rpc_port")
+        self.master_proxy = createRpcProxy(self.Config, self.master_host, self.master_port)
+        
+        self.drainer.batch_size = self.Config.get("tnc_batch_size")
+        self.drainer.batch_delay = self.Config.get("tnc_batch_delay")
+        self.drainer.retry_min = self.Config.get("tnc_reconnect_min")
+        self.drainer.retry_max = self.Config.get("tnc_reconnect_max")
+        self.logger.info(f"Configuration updated: {sorted(changed)}")
         
     
     def attemptConnection(self):
@@ -135,14 +120,16 @@ class TncClient:
         try:
             # set timeout
             self.logger.debug(f"Receiving data from TNC at {self.tncHost}:{self.tncPort}")
-            self.data = self.client.recv(1024)
+            received = self.client.recv_into(self.recv_view)
             self.last_message_timestamp = datetime.datetime.now().timestamp()    # not sure if this is okay. Do i get many things that are not a valid message?
+            self.data = self.recv_view[:received]
             
             # check to see if client has disconnected
-            if self.data == b'':
+            if received == 0:
                 self.logger.warning(f"Connection closed by TNC at {self.tncHost}:{self.tncPort}")
                 self.client.close()
                 self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # recreate the socket
+                self.decoder.reset()   # the incomplete frame will never be finished
                 return False  # this will forece to enter attmptConnection
 
         except Exception as e:
@@ -153,24 +140,19 @@ class TncClient:
     def processData(self):
         """
         Using the receievd data from TNC. it will process the data
+        Returns a list with every frame that was completed by the data, can be empty
+        A frame that is not complete yet stays in the decoder until the next read
         """
         # Process received data
         self.logger.debug("Processing received data")
-        for byte in self.data:
-            if byte == KISS_FEND:
-                if self.buffer:
-                    # Decode KISS frame
-                    decoded_data = decode_kiss(self.buffer[1:])
-                    self.buffer.clear()
-                    self.logger.debug(f"  Decoded data: {decoded_data}")
-                    return decoded_data
-            else:
-                self.buffer.append(byte)
+        frames = self.decoder.feed(self.data)
+        self.logger.debug("  Decoded %d frames", len(frames))
+        return frames
 
     def forwardData(self, data):
         """
-        It will forward the data to the master
-        kiss (str) - the kiss frame "0x86 0xa2 0x86 0xa2 0x86 0xa2 ..."
+        It will forward the data to the master, the frame is written to the spool and the drainer sends it
+        kiss (bytes) - the kiss frame, it goes as raw bytes (xmlrpc base64)
         tnc_client_ip (str) - the ip of the tnc client that decoded the message
         tnc_client_port (int) - the port of the tnc client that decoded the message
         timestamp (float) - the timestamp when the frame was received
@@ -180,17 +162,26 @@ class TncClient:
             self.logger.warning("Received None data to forward, skipping")
             return False
         
-        # conevrt the data to a string
-        byte_str = print_byte_array(data)
-        self.logger.debug(f"Forwarding data to the master: {byte_str}")
-        try:
-            self.master_proxy.remoteReceiveKiss(byte_str, self.tncHost, self.tncPort, self.last_message_timestamp)
-            self.logger.debug(f"Data forwarded to the master\n")
-        except Exception as e:
-            self.logger.error(f"Error while forwarding KISS to the master: {e}\n")
-            return False
-        
+        # the readable string is only built if the debug log is enabled
+        self.logger.debug("Spooling data for the master: %s", ReadableFrame(data))
+        self.spool.append(bytes(data), self.tncHost, self.tncPort, self.last_message_timestamp)
         return True
+    
+    def forwardBatch(self, batch):
+        """
+        Called by the drainer with the frames of the spool (Master.remoteReceiveKissBatch)
+        Raises if the batch did not reach the master, the drainer will send it again
+        """
+        
+        self.logger.debug("Forwarding %d frames to the master", len(batch))
+        return self.master_proxy.remoteReceiveKissBatch(batch)
+    
+    def spoolMark(self, spool_id):
+        """
+        Called by the drainer before the first batch, the last record id of the spool that the master has
+        """
+        
+        return self.master_proxy.remoteGetSpoolMark(spool_id)
 
     def tncLoop(self):
         """
@@ -201,15 +192,11 @@ class TncClient:
             try:
                 if self.receiveData():
                     
-                    if len(self.data) < 10:   # make sure that we are not receiving garbage
-                        time.sleep(1)    # add a little delay to reduce the load on the system
-                        continue
-                    
-                    self.logger.debug("Received data from TNC")
-                    self.logger.debug(f"  Data: {self.data}")
+                    self.logger.debug("Received %d bytes from TNC", len(self.data))
                     
-                    decoded_data = self.processData()                    
-                    self.forwardData(decoded_data)
+                    # a single read can have many frames (or only part of one), all of them are forwarded
+                    for decoded_data in self.processData():
+                        self.forwardData(decoded_data)
                 else:
                     self.attemptConnection()
             except Exception as e:
@@ -225,17 +212,10 @@ def startSingle(tncHost, tncPort):
                 
 if __name__ == "__main__":
     
-    host_list = ["172.20.38.89", "172.20.38.66"]
-    port_list = [8001, 7000]
+    # all the TNCs of config.ini (tnc_clients) are now handled by TncService in a single event loop
+    # startSingle is still available to debug a single TNC
+    from TncService import TncService
+    import asyncio
     
-    threading_list = []
-    
-    for ip, port in zip(host_list, port_list):  
-        t = threading.Thread(target=startSingle, args=(ip, port))
-        t.start()
-        threading_list.append(t)
-    
-    for t in threading_list:
-        t.join()
-
-
+    service = TncService()
+    asyncio.run(service.run())
@@ -0,0 +1,234 @@
+"""
+Receives the frames of all the TNCs on a single asyncio event loop and forwards them to the master
+
+Replaces the old thread per TNC (TncClient), every connection is a coroutine:
+    - reads the socket and splits the frames with kiss.KissDecoder
+    - when the connection fails it reconnects with exponential backoff without blocking the others
+    - the frames are written to a spool on disk (see Spool), a drainer thread sends them to the master
+      in the background so a slow master never stops the reads. If the master is down the frames wait in the spool
+    - the drainer sends the frames in batches (Master.remoteReceiveKissBatch), a batch is sent when it has
+      tnc_batch_size frames or after tnc_batch_delay seconds
+
+Configuration (config.ini):
+    tnc_clients            -> list of the TNCs, [host:port, host:port, ...]
+    tnc_reconnect_min      -> seconds to wait after the first failed connection, doubles on each failure
+    tnc_reconnect_max      -> maximum seconds between attempts
+    tnc_stats_interval     -> seconds between the logs with the stats of each connection (0 to disable)
+    tnc_batch_size         -> maximum frames in a single call to the master
+    tnc_batch_delay        -> maximum seconds that a frame waits for the batch to fill
+
+    spool_folder, spool_segment_size, spool_fsync_interval -> see Spool
+
+Each frame of the batch is the same that TncClient sends, with its own timestamp and the key of the spool:
+    [kiss (bytes), tnc_client_ip (str), tnc_client_port (int), timestamp (float), key (str)]
+"""
+
+from RpcClient import createRpcProxy
+from Spool import Spool, SpoolDrainer, checkHost
+from ConfigParser import getConfig
+from LogSetup import createLogger
+from kiss import KissDecoder
+import asyncio
+import logging
+import random
+import os
+import time
+
+
+def parseTncList(tnc_list):
+    """
+    ["host:port", ...] -> [(host, port), ...]
+    Raises ValueError if a host is too long for the spool (see Spool.checkHost)
+    """
+    endpoints = []
+    for entry in tnc_list:
+        if isinstance(entry, (list, tuple)):
+            endpoints.append((checkHost(entry[0]), int(entry[1])))
+            continue
+        if not entry:
+            continue
+        host, port = entry.rsplit(":", 1)
+        endpoints.append((checkHost(host.strip()), int(port)))
+    return endpoints
+
+
+class TncConnection:
+    """
+    A single TNC, keeps reconnecting until the service is stopped
+    """
+
+    def __init__(self, service, host, port):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.decoder = KissDecoder()
+        self.stats = {
+            "connected": False,
+            "connections": 0,
+            "failed_connections": 0,
+            "bytes": 0,
+            "frames": 0,
+            "last_frame": None,
+        }
+
+    async def run(self):
+        backoff = self.service.reconnect_min
+        while True:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout=10)
+            except (OSError, asyncio.TimeoutError) as e:
+                self.stats["failed_connections"] += 1
+                # some jitter so that all the TNCs of a station that went down dont reconnect at the same time
+                delay = backoff * random.uniform(0.8, 1.2)
+                self.service.logger.debug(f"Failed to connect to TNC at {self.host}:{self.port} ({e}), retrying in {delay:.1f} seconds")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, self.service.reconnect_max)
+                continue
+
+            self.service.logger.info(f"Connected to TNC at {self.host}:{self.port}")
+            self.stats["connected"] = True
+            self.stats["connections"] += 1
+            backoff = self.service.reconnect_min
+
+            try:
+                await self.readLoop(reader)
+            except OSError as e:
+                self.service.logger.error(f"Error receiving data from TNC at {self.host}:{self.port}: {e}")
+            finally:
+                self.stats["connected"] = False
+                self.decoder.reset()   # the incomplete frame will never be finished
+                writer.close()
+
+            self.service.logger.warning(f"Connection closed by TNC at {self.host}:{self.port}")
+
+    async def readLoop(self, reader):
+        while True:
+            data = await reader.read(self.service.recv_buffer_size)
+            if not data:
+                return
+            timestamp = time.time()
+            self.stats["bytes"] += len(data)
+
+            for frame in self.decoder.feed(data):
+                self.stats["frames"] += 1
+                self.stats["last_frame"] = timestamp
+                self.service.enqueue(frame, self.host, self.port, timestamp)
+
+
+class TncService:
+
+    def __init__(self, tnc_list=None, spool_folder=None):
+        # loaded once per process and reloaded when config.ini changes (see ConfigParser.getConfig)
+        self.Config = getConfig()
+
+        # set up logger, the level comes from log_level in the config (see LogSetup)
+        self.logger = createLogger(self.__class__.__name__, self.Config.get("log_folder"), self.Config.get("log_level"))
+
+        # set up the necessary endpoints
+        self.master_host = self.Config.get("master_rpc_host")
+        self.master_port = self.Config.get("master_rpc_port")
+        self.master_proxy = createRpcProxy(self.Config, self.master_host, self.master_port)
+        self.logger.debug(f"Master endpoint: {self.master_host}:{self.master_port}")
+
+        self.reconnect_min = self.Config.get("tnc_reconnect_min")
+        self.reconnect_max = self.Config.get("tnc_reconnect_max")
+        self.recv_buffer_size = self.Config.get("tnc_recv_buffer_size")
+        self.stats_interval = self.Config.get("tnc_stats_interval")
+
+        # every frame goes to the spool before it is forwarded
+        spool_folder = spool_folder or os.path.join(self.Config.get("spool_folder"), self.__class__.__name__)
+        self.spool = Spool(spool_folder,
+                           segment_size=self.Config.get("spool_segment_size"),
+                           fsync_interval=self.Config.get("spool_fsync_interval"))
+        self.drainer = SpoolDrainer(self.spool, self.forwardBatch,
+                                    batch_size=self.Config.get("tnc_batch_size"),
+                                    batch_delay=self.Config.get("tnc_batch_delay"),
+                                    retry_min=self.reconnect_min, retry_max=self.reconnect_max,
+                                    mark=self.spoolMark)
+
+        tnc_list = tnc_list if tnc_list is not None else self.Config.get("tnc_clients")
+        self.connections = [TncConnection(self, host, port) for host, port in parseTncList(tnc_list)]
+        self.logger.info(f"Managing {len(self.connections)} TNCs")
+
+        # everything except the list of TNCs and the spool can change in config.ini while the service is running
+        self.Config.onChange(self.configChanged, keys=["master_rpc_host", "master_rpc_port", "rpc_client_pool_size",
+                                                       "rpc_client_timeout", "rpc_client_retries", "tnc_batch_size",
+                                                       "tnc_batch_delay", "tnc_reconnect_min", "tnc_reconnect_max",
+                                                       "tnc_recv_buffer_size", "tnc_stats_interval"])
+
+    def configChanged(self, changed):
+        """
+        Called by the config (from its own thread), the connections and the drainer read these values on each use
+        A new tnc_stats_interval is used after the current wait, the stats only run if the service started with an interval
+        """
+        self.master_host = self.Config.get("master_rpc_host")
+        self.master_port = self.Config.get("master_rpc_port")
+        self.master_proxy = createRpcProxy(self.Config, self.master_host, self.master_port)
+
+        self.reconnect_min = self.Config.get("tnc_reconnect_min")
+        self.reconnect_max = self.Config.get("tnc_reconnect_max")
+        self.recv_buffer_size = self.Config.get("tnc_recv_buffer_size")
+        self.stats_interval = self.Config.get("tnc_stats_interval")
+
+        self.drainer.batch_size = self.Config.get("tnc_batch_size")
+        self.drainer.batch_delay = self.Config.get("tnc_batch_delay")
+        self.drainer.retry_min = self.reconnect_min
+        self.drainer.retry_max = self.reconnect_max
+        self.logger.info(f"Configuration updated: {sorted(changed)}")
+
+    def enqueue(self, frame, host, port, timestamp):
+        self.spool.append(frame, host, port, timestamp)
+
+    def forwardBatch(self, batch):
+        """
+        Called by the drainer, raises if the batch did not reach the master
+        Frames refused by the master (out of a passage) are not a failure
+        """
+        return self.master_proxy.remoteReceiveKissBatch(batch)
+
+    def spoolMark(self, spool_id):
+        """
+        Called by the drainer before the first batch, the last record id of the spool that the master has
+        """
+        return self.master_proxy.remoteGetSpoolMark(spool_id)
+
+    async def statsLoop(self):
+        while True:
+            # tnc_stats_interval can be changed to 0 while running (hot reload), then the stats are only skipped
+            await asyncio.sleep(self.stats_interval or 60.0)
+            if not self.stats_interval:
+                continue
+            connected = sum(connection.stats["connected"] for connection in self.connections)
+            self.logger.info(f"{connected}/{len(self.connections)} TNCs connected, spool: {self.spool.pending()} bytes, {self.drainer.stats}")
+            for connection in self.connections:
+                self.logger.debug(f"  {connection.host}:{connection.port} {connection.stats}")
+
+    def getStats(self):
+        """
+        Stats of every connection and of the forwarding to the master
+        """
+        return {
+            "connections": {f"{connection.host}:{connection.port}": dict(connection.stats) for connection in self.connections},
+            "spool_pending": self.spool.pending(),
+            **self.drainer.stats,
+        }
+
+    async def run(self):
+        self.drainer.start()
+        tasks = [asyncio.create_task(connection.run()) for connection in self.connections]
+        if self.stats_interval:
+            tasks.append(asyncio.create_task(self.statsLoop()))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.drainer.stop()
+            self.spool.close()
+
+
+if __name__ == "__main__":
+
+    service = TncService()
+    asyncio.run(service.run())
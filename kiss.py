@@ -0,0 +1,170 @@
+"""
+Everything related with the KISS frames, shared by all the modules and utils
+
+KISS encoding/decoding:
+    decode_kiss / encode_kiss work on a single frame
+    KissDecoder receives the data as it comes from the socket and returns every complete frame
+
+    Instead of walking the data one byte at a time the frames are split on FEND with bytes.split
+    and unescaped with bytes.replace, both run in C
+
+Representation of the frames:
+    The frames travel between the modules as raw bytes (xmlrpc base64), on disk they are saved as a compact
+    hex string ("86a286a2...") because json can not hold bytes. The old format "0x86 0xa2 0x86 ..." is only
+    generated for the logs and for the user, and only when it is really needed
+
+    Older archives have the frames in the old format, frame_to_bytes accepts all of them
+
+AX.25:
+    ax25_source reads the source callsign of a frame, Master uses it to know which satellite sent the frame
+"""
+
+import binascii
+import re
+import xmlrpc.client
+
+
+# KISS special characters
+KISS_FEND = 0xC0  # Frame End
+KISS_FESC = 0xDB  # Frame Escape
+KISS_TFEND = 0xDC # Transposed Frame End
+KISS_TFESC = 0xDD # Transposed Frame Escape
+
+_FEND = bytes([KISS_FEND])
+_FESC = bytes([KISS_FESC])
+_ESCAPED_FEND = bytes([KISS_FESC, KISS_TFEND])
+_ESCAPED_FESC = bytes([KISS_FESC, KISS_TFESC])
+
+# only used for corrupted data, FESC followed by something that is not TFEND or TFESC
+_ESCAPE_PATTERN = re.compile(b"\\xdb(.?)", re.DOTALL)
+_ESCAPE_TABLE = {bytes([KISS_TFEND]): _FEND, bytes([KISS_TFESC]): _FESC}
+
+
+def _unescape(match):
+    return _ESCAPE_TABLE.get(match.group(1), match.group(1))
+
+
+def decode_kiss(data):
+    """
+    Decode KISS-encoded data (FEND and the command byte already removed)
+    FESC TFEND -> FEND, FESC TFESC -> FESC
+    A FESC followed by anything else is dropped, same as the old byte by byte decoder
+    """
+    data = bytes(data)
+    escapes = data.count(_FESC)
+    if escapes == 0:
+        return data
+
+    # when every FESC starts a valid escape the replaces are enough (the order matters)
+    if escapes == data.count(_ESCAPED_FEND) + data.count(_ESCAPED_FESC):
+        return data.replace(_ESCAPED_FEND, _FEND).replace(_ESCAPED_FESC, _FESC)
+
+    return _ESCAPE_PATTERN.sub(_unescape, data)
+
+
+def encode_kiss(data, command=0x00):
+    """
+    Encode AX.25 data in KISS format, FEND + command + escaped data + FEND
+    """
+    escaped = bytes(data).replace(_FESC, _ESCAPED_FESC).replace(_FEND, _ESCAPED_FEND)
+    return bytes([KISS_FEND, command]) + escaped + _FEND
+
+
+class KissDecoder:
+    """
+    Streaming decoder, feed it the data as it arrives and it returns the decoded frames
+    The incomplete frame at the end is kept until the rest of it arrives
+
+    The first byte of each frame (command byte) is removed, frames without any data are ignored
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Returns a list with all the frames that were completed by data
+        """
+        start = len(self.buffer)
+        self.buffer += data
+        if self.buffer.find(_FEND, start) == -1:
+            return []
+
+        parts = self.buffer.split(_FEND)
+        self.buffer = parts.pop()
+
+        return [decode_kiss(part[1:]) for part in parts if len(part) > 1]
+
+    def reset(self):
+        """
+        Drops the incomplete frame, used when the connection is lost
+        """
+        self.buffer = bytearray()
+
+
+def frame_to_bytes(kiss):
+    """
+    Returns the frame as bytes, kiss can be:
+        bytes, bytearray, memoryview
+        xmlrpc.client.Binary
+        compact hex string "86a286a2..."
+        old string representation "0x86 0xa2 0x86 0xa2 ..."
+    """
+    if isinstance(kiss, bytes):
+        return kiss
+    if isinstance(kiss, (bytearray, memoryview)):
+        return bytes(kiss)
+    if isinstance(kiss, xmlrpc.client.Binary):
+        return kiss.data
+    if isinstance(kiss, str):
+        if "x" in kiss:
+            kiss = kiss.replace("0x", "")
+        return bytes.fromhex(kiss)
+    raise TypeError(f"Unsupported frame type: {type(kiss)}")
+
+
+def ax25_source(frame):
+    """
+    Source callsign of an AX.25 frame (the decoded KISS frame, without the command byte), "CALL" or "CALL-SSID"
+    The address field is destination (7 bytes) + source (7 bytes), each character shifted one bit to the left
+    Returns None if the frame is too short or the address is not valid
+    """
+    if len(frame) < 14:
+        return None
+    callsign = bytes(byte >> 1 for byte in frame[7:13]).rstrip(b" ")
+    if not callsign.isalnum():
+        return None
+    ssid = (frame[13] >> 1) & 0x0F
+    callsign = callsign.decode("ascii")
+    return f"{callsign}-{ssid}" if ssid else callsign
+
+
+def frame_to_hex(kiss):
+    """
+    Compact hex string used to save the frames "86a286a2..."
+    """
+    return frame_to_bytes(kiss).hex()
+
+
+def print_byte_array(byte_array):
+    """
+    Old string representation of the frame "0x86 0xa2 0x86 0xa2 ..."
+    """
+    hex_data = binascii.hexlify(frame_to_bytes(byte_array)).decode()  # Convert to hex string
+    # Add \x prefix to each byte
+    return ''.join(f'0x{hex_data[i:i+2]} ' for i in range(0, len(hex_data), 2))
+
+
+class ReadableFrame:
+    """
+    Only converts the frame to "0x86 0xa2 ..." when it is printed
+    Use it as a logging argument, if the level is disabled the string is never built:
+        logger.debug("Frame: %s", ReadableFrame(data))
+    """
+    __slots__ = ("kiss",)
+
+    def __init__(self, kiss):
+        self.kiss = kiss
+
+    def __str__(self):
+        return print_byte_array(self.kiss)
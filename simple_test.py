@@ -8,7 +8,7 @@ import datetime
 proxy = xmlrpc.client.ServerProxy("http://localhost:1711")
 
 # send a message to the master
-kiss_frame = "hello world"
+kiss_frame = b"hello world"
 tnc_client_ip = "localhost"
 tnc_client_port = 4533
 timestamp = datetime.datetime.now().timestamp()
@@ -0,0 +1,11 @@
+"""
+The modules are at the root of the repo, the same as the utils the tests import them from there
+
+Run from the root of the repo:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,128 @@
+"""
+Archive, passages identified by satellite and aos, the frames and the migration of the old archives
+"""
+
+import json
+import sqlite3
+
+from Archive import Archive
+
+
+AOS = 1751241600.0
+
+# passages of the archives made before the satellite was a column
+OLD_PASSAGES = """
+CREATE TABLE passages (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    passage_number  INTEGER,
+    aos             REAL UNIQUE,
+    los             REAL,
+    max_elevation   REAL,
+    start_azimuth   REAL,
+    end_azimuth     REAL,
+    tle_line1       TEXT,
+    tle_line2       TEXT,
+    frame_count     INTEGER DEFAULT 0,
+    status          TEXT,
+    header          TEXT
+)
+"""
+
+
+def passageHeader(satcat_id=60238, aos=AOS, **values):
+    header = {"passage_number": 1, "satcat_id": satcat_id, "aos": aos, "los": aos + 600.0, "max_elevation": 45.0,
+              "start_azimuth": 10.0, "end_azimuth": 200.0, "tle_line1": "line1", "tle_line2": "line2",
+              "frame_count": 0, "status": "open", "callsign": "CALL", "frame_list": []}
+    header.update(values)
+    return header
+
+
+def test_insert_passage(tmp_path):
+    archive = Archive(str(tmp_path / "archive.sqlite"))
+    passage_id = archive.insertPassage(passageHeader())
+    passages = archive.queryPassages()
+    assert len(passages) == 1
+    assert passages[0]["id"] == passage_id
+    assert passages[0]["satcat_id"] == 60238 and passages[0]["aos"] == AOS
+    # what is not a column is kept in the header, without the frames
+    assert passages[0]["callsign"] == "CALL" and "frame_list" not in passages[0]
+    archive.close()
+
+
+def test_same_passage_is_updated(tmp_path):
+    archive = Archive(str(tmp_path / "archive.sqlite"))
+    passage_id = archive.insertPassage(passageHeader())
+    assert archive.insertPassage(passageHeader(frame_count=12, status="closed")) == passage_id
+    passages = archive.queryPassages()
+    assert [(passage["frame_count"], passage["status"]) for passage in passages] == [(12, "closed")]
+    archive.close()
+
+
+def test_satellites_with_the_same_aos(tmp_path):
+    archive = Archive(str(tmp_path / "archive.sqlite"))
+    first = archive.insertPassage(passageHeader(satcat_id=60238))
+    second = archive.insertPassage(passageHeader(satcat_id=25544))
+    assert first != second
+    assert sorted(passage["satcat_id"] for passage in archive.queryPassages()) == [25544, 60238]
+    archive.close()
+
+
+def test_passage_without_satellite(tmp_path):
+    archive = Archive(str(tmp_path / "archive.sqlite"))
+    passage_id = archive.insertPassage(passageHeader(satcat_id=None))
+    assert archive.insertPassage(passageHeader(satcat_id=None, status="closed")) == passage_id
+    assert archive.queryPassages()[0]["satcat_id"] == 0
+    archive.close()
+
+
+def test_frames(tmp_path):
+    archive = Archive(str(tmp_path / "archive.sqlite"))
+    passage_id = archive.insertPassage(passageHeader())
+    frames = [{"epoch": AOS + index, "passage_number": 1, "elevation": 20.0 + index, "azimuth": 100.0, "distance": 900.0,
+               "tnc_client": ["10.0.0.1", 8001], "kiss": "86a2c0"} for index in range(3)]
+    archive.insertFrames([Archive.frameRow(passage_id, frame) for frame in frames])
+
+    rows = archive.queryFrames(min_elevation=21.0)
+    assert len(rows) == 2
+    assert all(row["kiss"] == bytes.fromhex("86a2c0") for row in rows)
+
+    archive.replaceFrames(passage_id, [Archive.frameRow(passage_id, frames[0])])
+    assert len(archive.queryFrames()) == 1
+    archive.close()
+
+
+def test_migration_of_an_archive_keyed_by_aos(tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute(OLD_PASSAGES)
+    connection.execute("INSERT INTO passages (id, passage_number, aos, header) VALUES (7, 1, ?, ?)",
+                       (AOS, json.dumps({"satcat_id": 60238})))
+    connection.execute("INSERT INTO passages (id, passage_number, aos, header) VALUES (8, 2, ?, '{}')", (AOS + 6000.0,))
+    connection.commit()
+    connection.close()
+
+    archive = Archive(path)
+    assert [(passage["id"], passage["satcat_id"]) for passage in archive.queryPassages()] == [(7, 60238), (8, 0)]
+    # the old rows are found again by satellite and aos, another satellite can have the same aos
+    assert archive.insertPassage(passageHeader(satcat_id=60238)) == 7
+    assert archive.insertPassage(passageHeader(satcat_id=25544)) not in (7, 8)
+    archive.close()
+
+
+def test_insert_missing_frames_keeps_the_archived_ones(tmp_path):
+    archive = Archive(str(tmp_path / "archive.sqlite"))
+    passage_id = archive.insertPassage(passageHeader())
+    frames = [{"epoch": AOS + index * 0.5, "passage_number": 1, "tnc_client": ["10.0.0.1", 8001], "kiss": "86a2"}
+              for index in range(5)]
+    # the same frame from another station is not the same row
+    frames.append(dict(frames[0], tnc_client=["10.0.0.2", 8001]))
+    archive.insertFrames([Archive.frameRow(passage_id, frame) for frame in frames[:3]])
+    ids = [row["id"] for row in archive.queryFrames()]
+
+    # recovery after a crash, the log has every frame but only some of them were archived
+    assert archive.insertMissingFrames(passage_id, [Archive.frameRow(passage_id, frame) for frame in frames]) == 3
+    rows = archive.queryFrames()
+    assert len(rows) == 6
+    assert set(ids) < {row["id"] for row in rows}
+    assert archive.insertMissingFrames(passage_id, [Archive.frameRow(passage_id, frame) for frame in frames]) == 0
+    archive.close()
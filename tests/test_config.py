@@ -0,0 +1,71 @@
+"""
+ConfigParser, the values of config.ini with their types and what is logged when the file is loaded again
+"""
+
+import logging
+import os
+
+from ConfigParser import ConfigParser
+from LogSetup import createLogger
+
+
+class Records(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+def makeConfig(tmp_path, text):
+    # the logger of the config goes to tmp_path and not to logs/
+    createLogger("ConfigParser", str(tmp_path), console=False)
+    path = tmp_path / "config.ini"
+    path.write_text(text)
+    return ConfigParser(str(path))
+
+
+def test_values_and_defaults(tmp_path):
+    config = makeConfig(tmp_path, "tnc_batch_size: 32\nratio: 0.5  # comment\nflag: true\nhosts: [a:1, b:2]\nname: text\n")
+    config.loadConfig()
+    assert config.get("tnc_batch_size") == 32
+    assert config.get("ratio") == 0.5
+    assert config.get("flag") is True
+    assert config.get("hosts") == ["a:1", "b:2"]
+    assert config.get("name") == "text"
+    assert config.get("spool_folder") == "spool"
+
+
+def test_reload_logs_only_the_changed_keys(tmp_path):
+    config = makeConfig(tmp_path, "log_level: DEBUG\ntnc_batch_size: 32\n")
+    records = Records()
+    config.logger.addHandler(records)
+    try:
+        config.loadConfig()
+        first = [message for level, message in records.messages if message.startswith("Loaded key")]
+        assert len(first) == len(config.config_dict)
+        assert all(level == logging.DEBUG for level, _ in records.messages)
+
+        records.messages.clear()
+        (tmp_path / "config.ini").write_text("log_level: DEBUG\ntnc_batch_size: 48\n")
+        os.utime(tmp_path / "config.ini", ns=(0, 0))
+        assert config.reloadIfChanged() == {"tnc_batch_size": (32, 48)}
+        assert [message for _, message in records.messages if message.startswith("Loaded key")] == [
+            "Loaded key: tnc_batch_size, value: 48"]
+        assert all(level == logging.DEBUG for level, _ in records.messages)
+    finally:
+        config.logger.removeHandler(records)
+
+
+def test_nothing_logged_at_info(tmp_path):
+    config = makeConfig(tmp_path, "tnc_batch_size: 32\n")
+    records = Records()
+    config.logger.addHandler(records)
+    try:
+        config.loadConfig()
+        config.loadConfig()
+        assert records.messages == []
+    finally:
+        config.logger.removeHandler(records)
@@ -0,0 +1,125 @@
+"""
+FrameFusion, grouping the copies of each transmission and the bitwise majority vote
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from FrameFusion import fuse_frames, fused_to_dict, group_frames, majority_vote
+from Records import Frame, FrameColumns
+
+
+STATION_A = ("10.0.0.1", 8001)
+STATION_B = ("10.0.0.2", 8001)
+STATION_C = ("10.0.0.3", 8001)
+
+
+def frame(kiss, station, epoch, **values):
+    return dict({"kiss": kiss, "tnc_client": list(station), "epoch": epoch}, **values)
+
+
+def test_group_frames_reordered():
+    # two transmissions 2 s apart, the copies arrive out of order
+    timestamps = [1002.1, 1000.0, 1002.0, 1000.2, 1000.1]
+    lengths = [10, 10, 10, 10, 10]
+    stations = [STATION_B, STATION_A, STATION_A, STATION_C, STATION_B]
+    groups = group_frames(timestamps, lengths, stations)
+    assert groups[1] == groups[3] == groups[4]
+    assert groups[0] == groups[2]
+    assert groups[0] != groups[1]
+
+
+def test_group_frames_same_station_twice_is_a_new_transmission():
+    timestamps = [1000.0, 1000.1, 1000.2, 1000.3]
+    stations = [STATION_A, STATION_B, STATION_A, STATION_B]
+    groups = group_frames(timestamps, [10] * 4, stations)
+    assert groups[0] == groups[1]
+    assert groups[2] == groups[3]
+    assert groups[0] != groups[2]
+
+
+def test_group_frames_by_length_and_window():
+    timestamps = [1000.0, 1000.1, 1000.2, 1001.0]
+    lengths = [10, 12, 10, 10]
+    stations = [STATION_A, STATION_B, STATION_C, STATION_B]
+    groups = group_frames(timestamps, lengths, stations, time_window=0.5)
+    assert groups[0] == groups[2]
+    # another length, and a copy after the window
+    assert len({groups[0], groups[1], groups[3]}) == 3
+
+
+def test_group_frames_empty():
+    assert len(group_frames([], [], [])) == 0
+
+
+def test_majority_vote():
+    frame_matrix = np.array([[0b10110000], [0b10100000], [0b00110000]], dtype=np.uint8)
+    fused, confidence = majority_vote(frame_matrix, [0])
+    assert fused.tolist() == [[0b10110000]]
+    # bits 0 and 3 had a copy that did not agree
+    assert np.allclose(confidence[0], [2 / 3, 1, 1, 2 / 3, 1, 1, 1, 1])
+
+
+def test_majority_vote_tie_keeps_the_first_copy():
+    frame_matrix = np.array([[0b11110000], [0b00001111], [0b00000000], [0b11111111]], dtype=np.uint8)
+    fused, confidence = majority_vote(frame_matrix, [0, 2])
+    assert fused.tolist() == [[0b11110000], [0b00000000]]
+    assert np.all(confidence == 0.5)
+
+
+def test_fuse_frames_corrects_the_bit_errors():
+    original = bytes([0x86, 0xa2, 0x40, 0x40])
+    copies = [bytes([0x87, 0xa2, 0x40, 0x40]), bytes([0x86, 0xa2, 0x41, 0x40]), original]
+    frame_list = [frame(kiss, station, 1000.0 + index * 0.1) for index, (kiss, station) in
+                  enumerate(zip(copies, [STATION_A, STATION_B, STATION_C]))]
+    frame_list.append(frame(b"\x01\x02", STATION_A, 1003.0))
+
+    fused_list = fuse_frames(frame_list)
+    assert [fused["kiss"] for fused in fused_list] == [original, b"\x01\x02"]
+    assert fused_list[0]["copies"] == 3 and fused_list[0]["timestamp"] == 1000.0
+    assert sorted(map(tuple, fused_list[0]["tnc_clients"])) == [STATION_A, STATION_B, STATION_C]
+    assert fused_list[0]["confidence"].min() == np.float32(2 / 3)
+
+
+def test_fuse_frames_uses_the_given_groups():
+    # far apart in time, only the groups of the data warehouse put them together
+    frame_list = [frame(b"\xff", STATION_A, 1000.0, group=4), frame(b"\xff", STATION_B, 1010.0, group=4),
+                  frame(b"\x00", STATION_C, 1020.0, group=4), frame(b"\x0f", STATION_A, 1001.0, group=7)]
+    fused_list = fuse_frames(frame_list)
+    assert [(fused["kiss"], fused["copies"]) for fused in fused_list] == [(b"\xff", 3), (b"\x0f", 1)]
+
+    # without the groups the time window splits them
+    for item in frame_list:
+        del item["group"]
+    assert len(fuse_frames(frame_list)) == 4
+
+
+def test_fuse_frame_columns():
+    columns = FrameColumns()
+    for kiss, station, timestamp, group in [(b"\xf0", STATION_A, 1000.0, 0), (b"\xf1", STATION_B, 1000.1, 0),
+                                            (b"\xf0", STATION_C, 1000.2, 0), (b"\xaa", STATION_A, 1002.0, 1)]:
+        columns.append(Frame(kiss, *station, timestamp, group=group))
+    fused_list = fuse_frames(columns)
+    assert [(fused["kiss"], fused["copies"]) for fused in fused_list] == [(b"\xf0", 3), (b"\xaa", 1)]
+
+
+def test_fused_to_dict():
+    frame_list = [frame(b"\x80\x01", STATION_A, 1000.0), frame(b"\x00\x01", STATION_B, 1000.1),
+                  frame(b"\x80\x01", STATION_C, 1000.2)]
+    fused = fused_to_dict(fuse_frames(frame_list)[0])
+    assert fused == {
+        "timestamp": 1000.0,
+        "tnc_clients": [list(STATION_A), list(STATION_B), list(STATION_C)],
+        "copies": 3,
+        "kiss": "8001",
+        "min_confidence": pytest.approx(2 / 3),
+        "uncertain_bits": [0],
+        "uncertain_confidence": [pytest.approx(0.667)],
+    }
+    json.dumps(fused)
+
+
+def test_fuse_nothing():
+    assert fuse_frames([]) == []
@@ -0,0 +1,53 @@
+"""
+KissDecoder, the frames as they arrive from the socket
+"""
+
+from kiss import KISS_FEND, KISS_FESC, KISS_TFEND, KISS_TFESC, KissDecoder, decode_kiss, encode_kiss
+
+
+def test_frame_split_across_feeds():
+    decoder = KissDecoder()
+    data = encode_kiss(b"hello world")
+    assert decoder.feed(data[:4]) == []
+    assert decoder.feed(data[4:-1]) == []
+    assert decoder.feed(data[-1:]) == [b"hello world"]
+
+
+def test_many_frames_in_one_feed():
+    decoder = KissDecoder()
+    data = encode_kiss(b"first") + encode_kiss(b"second") + encode_kiss(b"third")[:5]
+    assert decoder.feed(data) == [b"first", b"second"]
+    assert decoder.feed(encode_kiss(b"third")[5:]) == [b"third"]
+
+
+def test_empty_frames_are_ignored():
+    decoder = KissDecoder()
+    # back to back FENDs and a frame with only the command byte
+    data = bytes([KISS_FEND, KISS_FEND, KISS_FEND, 0x00, KISS_FEND]) + encode_kiss(b"data")
+    assert decoder.feed(data) == [b"data"]
+
+
+def test_escapes():
+    payload = bytes([0x01, KISS_FEND, 0x02, KISS_FESC, 0x03])
+    data = encode_kiss(payload)
+    assert data[2:-1] == bytes([0x01, KISS_FESC, KISS_TFEND, 0x02, KISS_FESC, KISS_TFESC, 0x03])
+    assert KissDecoder().feed(data) == [payload]
+
+
+def test_escape_split_across_feeds():
+    decoder = KissDecoder()
+    data = encode_kiss(bytes([KISS_FEND, KISS_FESC]))
+    # the cut is between FESC and TFEND
+    assert decoder.feed(data[:3]) == []
+    assert decoder.feed(data[3:]) == [bytes([KISS_FEND, KISS_FESC])]
+
+
+def test_invalid_escape_is_dropped():
+    assert decode_kiss(bytes([0x01, KISS_FESC, 0x02, KISS_FESC, KISS_TFEND])) == bytes([0x01, 0x02, KISS_FEND])
+
+
+def test_reset_drops_the_partial_frame():
+    decoder = KissDecoder()
+    decoder.feed(encode_kiss(b"lost")[:-1])
+    decoder.reset()
+    assert decoder.feed(encode_kiss(b"kept")) == [b"kept"]
@@ -0,0 +1,177 @@
+"""
+RpcServer pool model and RpcClient, with real servers on free ports of localhost
+"""
+
+import socket
+import threading
+import time
+import xmlrpc.client
+
+import pytest
+
+from RpcClient import RpcProxy
+from RpcServer import PoolXMLRPCServer
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(max_workers=4, keepalive_timeout=15.0):
+        rpc_server = PoolXMLRPCServer(("localhost", 0), max_workers=max_workers, keepalive_timeout=keepalive_timeout,
+                                      use_builtin_types=True, logRequests=False)
+        threading.Thread(target=rpc_server.serve_forever, daemon=True).start()
+        servers.append(rpc_server)
+        return rpc_server
+
+    yield start
+    for rpc_server in servers:
+        rpc_server.shutdown()
+        rpc_server.server_close()
+
+
+def proxy(rpc_server, **kwargs):
+    return RpcProxy("localhost", rpc_server.server_address[1], **kwargs)
+
+
+def httpRequest(method_name, *params):
+    body = xmlrpc.client.dumps(params, method_name).encode()
+    return (f"POST /RPC2 HTTP/1.1\r\nHost: localhost\r\nContent-Type: text/xml\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+def readResponse(connection):
+    data = b""
+    while b"\r\n\r\n" not in data:
+        data += connection.recv(4096)
+    head, body = data.split(b"\r\n\r\n", 1)
+    length = int([line.split(b":")[1] for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")][0])
+    while len(body) < length:
+        body += connection.recv(4096)
+    return xmlrpc.client.loads(body)[0][0]
+
+
+def test_slow_call_does_not_block_the_others(server):
+    rpc_server = server()
+    release = threading.Event()
+    rpc_server.register_function(lambda: release.wait(5.0), "slow")
+    rpc_server.register_function(lambda: "fast", "fast")
+
+    slow = threading.Thread(target=proxy(rpc_server).slow)
+    slow.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    assert proxy(rpc_server).fast() == "fast"
+    assert time.monotonic() - start < 1.0
+    assert slow.is_alive()
+    release.set()
+    slow.join()
+
+
+def test_max_concurrency(server):
+    rpc_server = server(max_workers=8)
+    lock = threading.Lock()
+    active = [0, 0]    # now, maximum
+
+    def limited():
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.1)
+        with lock:
+            active[0] -= 1
+        return True
+
+    rpc_server.register_function(limited, "limited", max_concurrency=2)
+    client = proxy(rpc_server, pool_size=8)
+    threads = [threading.Thread(target=client.limited) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert active[1] == 2
+
+
+def test_connection_is_kept_between_requests(server):
+    rpc_server = server()
+    rpc_server.register_function(lambda value: value * 2, "double")
+    with socket.create_connection(rpc_server.server_address) as connection:
+        connection.sendall(httpRequest("double", 2))
+        assert readResponse(connection) == 4
+        connection.sendall(httpRequest("double", 5))
+        assert readResponse(connection) == 10
+
+
+def test_idle_connection_is_closed(server):
+    rpc_server = server(keepalive_timeout=0.3)
+    rpc_server.register_function(lambda: True, "ping")
+    with socket.create_connection(rpc_server.server_address) as connection:
+        connection.sendall(httpRequest("ping"))
+        assert readResponse(connection) is True
+        start = time.monotonic()
+        connection.settimeout(5.0)
+        assert connection.recv(1) == b""
+        assert 0.2 < time.monotonic() - start < 2.0
+
+
+def test_idle_connections_do_not_take_the_workers(server):
+    rpc_server = server(max_workers=2)
+    rpc_server.register_function(lambda: True, "ping")
+    connections = [socket.create_connection(rpc_server.server_address) for _ in range(4)]
+    try:
+        for connection in connections:
+            connection.sendall(httpRequest("ping"))
+            assert readResponse(connection) is True
+        # 4 open connections and 2 workers, a new client is answered
+        assert proxy(rpc_server, timeout=2.0).ping() is True
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def test_sent_call_is_not_retried(server):
+    rpc_server = server()
+    calls = []
+
+    def slow():
+        calls.append(time.monotonic())
+        time.sleep(1.0)
+        return True
+
+    rpc_server.register_function(slow, "slow")
+    with pytest.raises(OSError):
+        proxy(rpc_server, timeout=0.3, retries=2).slow()
+    time.sleep(0.5)
+    assert len(calls) == 1
+
+
+def test_refused_connection_is_retried():
+    # nothing listens on the port, every attempt is refused before anything is sent
+    listener = socket.socket()
+    listener.bind(("localhost", 0))
+    port = listener.getsockname()[1]
+    listener.close()
+
+    start = time.monotonic()
+    with pytest.raises(ConnectionRefusedError):
+        RpcProxy("localhost", port, timeout=1.0, retries=2).ping()
+    # waits 0.05 and 0.1 seconds between the attempts
+    assert time.monotonic() - start >= 0.15
+
+
+def test_fault_is_not_retried(server):
+    rpc_server = server()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ValueError("bad")
+
+    rpc_server.register_function(fail, "fail")
+    client = proxy(rpc_server)
+    with pytest.raises(xmlrpc.client.Fault):
+        client.fail()
+    assert len(calls) == 1
+    # the connection goes back to the pool and can be used again
+    with pytest.raises(xmlrpc.client.Fault):
+        client.fail()
@@ -0,0 +1,139 @@
+"""
+getNextPasses with findPasses and buildPasses replaced by stubs, no TLE or skyfield search is needed
+"""
+
+import logging
+import threading
+
+import pytest
+
+from SatellitePredictor import PASS_SEARCH_DAYS, PASS_SEARCH_LIMIT, SatellitePredictor
+
+
+START = 1751241600.0
+DAY = 86400.0
+
+
+class StubPasses:
+    """
+    findPasses of satellites with a passage every period seconds (duration seconds long) from offset
+    Records every search (satcat_id, start, end)
+    """
+
+    def __init__(self, period=6000.0, duration=600.0, offsets=None):
+        self.period = period
+        self.duration = duration
+        self.offsets = offsets or {}
+        self.calls = []
+
+    def __call__(self, start, end, min_elevation=10.0, satcat_id=None):
+        self.calls.append((satcat_id, start, end))
+        offset = self.offsets.get(satcat_id, 0.0)
+        passes = []
+        aos = START + offset + max(0, (start - START - offset) // self.period) * self.period
+        while aos < end:
+            if aos >= start:
+                if aos + self.duration > end:
+                    # not over at the end of the window, the next search starts from its aos
+                    return passes, aos
+                passes.append((aos, aos + self.duration, 45.0, 10.0, 200.0))
+            aos += self.period
+        return passes, end
+
+
+def makePredictor(find_passes, satcat_ids=(1,)):
+    predictor = SatellitePredictor.__new__(SatellitePredictor)
+    predictor.logger = logging.getLogger("test")
+    predictor.satcat_ids = list(satcat_ids)
+    predictor.satcat_id = predictor.satcat_ids[0]
+    predictor.priority = {satcat_id: rank for rank, satcat_id in enumerate(satcat_ids)}
+    predictor.tles = {satcat_id: (f"line1 {satcat_id}", f"line2 {satcat_id}") for satcat_id in satcat_ids}
+    predictor.earth_satellites = {satcat_id: object() for satcat_id in satcat_ids}
+    predictor.observer_key = (38.7, -9.3, 0.0)
+    predictor.min_elevation = 10.0
+    predictor.pass_cache = {}
+    predictor.pass_lock = threading.Lock()
+    predictor.findPasses = find_passes
+    predictor.buildPasses = lambda found, satcat_id=None: [{"satcat_id": satcat_id, "aos": sat_pass[0], "los": sat_pass[1],
+                                                            "max_elevation": sat_pass[2]} for sat_pass in found]
+    return predictor
+
+
+def test_next_passes_sorted():
+    stub = StubPasses()
+    passes = makePredictor(stub).getNextPasses(num_passes=5, start=START + 1)
+    assert [sat_pass["aos"] for sat_pass in passes] == [START + 6000.0 * index for index in range(1, 6)]
+    assert all(sat_pass["tracked"] and sat_pass["conflicts"] == [] for sat_pass in passes)
+
+
+def test_passes_of_many_satellites_are_merged():
+    stub = StubPasses(offsets={1: 0.0, 2: 3000.0})
+    passes = makePredictor(stub, satcat_ids=(1, 2)).getNextPasses(num_passes=4, start=START)
+    assert [(sat_pass["satcat_id"], sat_pass["aos"]) for sat_pass in passes] == [
+        (1, START), (2, START + 3000.0), (1, START + 6000.0), (2, START + 9000.0)]
+
+
+def test_overlapping_passages_follow_the_priority():
+    stub = StubPasses(offsets={1: 300.0, 2: 0.0})
+    passes = makePredictor(stub, satcat_ids=(1, 2)).getNextPasses(num_passes=2, start=START)
+    assert [(sat_pass["satcat_id"], sat_pass["tracked"], sat_pass["conflicts"]) for sat_pass in passes] == [
+        (2, False, [1]), (1, True, [2])]
+
+
+def test_repeated_request_uses_the_cache():
+    stub = StubPasses()
+    predictor = makePredictor(stub)
+    first = predictor.getNextPasses(num_passes=5, start=START)
+    calls = len(stub.calls)
+    assert predictor.getNextPasses(num_passes=5, start=START) == first
+    # the passage that already started is dropped, the rest are the same
+    assert predictor.getNextPasses(num_passes=4, start=START + 10) == first[1:]
+    assert len(stub.calls) == calls
+
+
+def test_cut_passage_is_searched_again():
+    # the window ends in the middle of a passage, it is found by the next search
+    stub = StubPasses(period=PASS_SEARCH_DAYS * DAY - 300.0)
+    passes = makePredictor(stub).getNextPasses(num_passes=2, start=START)
+    assert [sat_pass["aos"] for sat_pass in passes] == [START, START + PASS_SEARCH_DAYS * DAY - 300.0]
+    assert stub.calls[1][1] == START + PASS_SEARCH_DAYS * DAY - 360.0
+
+
+def test_passage_longer_than_the_window_does_not_repeat_the_search():
+    # findPasses always says that a passage started at the start of the window is not over
+    calls = []
+
+    def findPasses(start, end, min_elevation=10.0, satcat_id=None):
+        calls.append((start, end))
+        return [], start
+
+    passes = makePredictor(findPasses).getNextPasses(num_passes=3, start=START)
+    assert passes == []
+    assert len(set(calls)) == len(calls)
+    assert calls[-1][1] == START + PASS_SEARCH_LIMIT * DAY
+
+
+def test_passage_cut_by_the_limit_ends_the_search():
+    stub = StubPasses(period=PASS_SEARCH_LIMIT * DAY - 100.0)
+    passes = makePredictor(stub).getNextPasses(num_passes=3, start=START)
+    assert [sat_pass["aos"] for sat_pass in passes] == [START]
+    assert len(set(stub.calls)) == len(stub.calls)
+
+
+def test_satellite_with_errors_is_left_out():
+    stub = StubPasses()
+
+    def findPasses(start, end, min_elevation=10.0, satcat_id=None):
+        if satcat_id == 2:
+            raise ValueError("Satellite object not created for 2")
+        return stub(start, end, min_elevation, satcat_id)
+
+    passes = makePredictor(findPasses, satcat_ids=(1, 2)).getNextPasses(num_passes=3, start=START)
+    assert [sat_pass["satcat_id"] for sat_pass in passes] == [1, 1, 1]
+
+
+def test_no_satellites():
+    predictor = makePredictor(StubPasses())
+    predictor.earth_satellites = {}
+    with pytest.raises(ValueError):
+        predictor.getNextPasses(start=START)
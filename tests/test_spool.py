@@ -0,0 +1,198 @@
+"""
+Spool, recovery after a restart and the acknowledgements of the drainer
+"""
+
+import os
+import time
+
+import pytest
+
+from Spool import MAX_HOST_LENGTH, Spool, SpoolDrainer, checkHost
+
+
+def appendFrames(spool, count, start=0):
+    ids = [spool.append(f"frame {start + index}".encode(), "10.0.0.1", 8001, 1700000000.0 + start + index)
+           for index in range(count)]
+    spool.sync()
+    return ids
+
+
+def waitFor(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_read_and_ack(tmp_path):
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    assert appendFrames(spool, 5) == [1, 2, 3, 4, 5]
+
+    records, position = spool.read(3)
+    assert [record[0] for record in records] == [1, 2, 3]
+    assert records[0][1:] == (1700000000.0, "10.0.0.1", 8001, b"frame 0")
+    # nothing acknowledged yet, the same records are read again
+    assert [record[0] for record in spool.read(3)[0]] == [1, 2, 3]
+
+    spool.ack(position)
+    records, position = spool.read(10)
+    assert [record[0] for record in records] == [4, 5]
+    spool.ack(position)
+    assert spool.read(10)[0] == []
+    spool.close()
+
+
+def test_recover_continues_after_the_cursor(tmp_path):
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    appendFrames(spool, 5)
+    records, position = spool.read(2)
+    spool.ack(position)
+    spool_id = spool.id
+    spool.close()
+
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    assert spool.id == spool_id
+    assert [record[0] for record in spool.read(10)[0]] == [3, 4, 5]
+    assert spool.append(b"new", "10.0.0.1", 8001, 0.0) == 6
+    spool.close()
+
+
+def test_recover_cuts_a_partial_record(tmp_path):
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    appendFrames(spool, 3)
+    spool.close()
+
+    # a crash in the middle of a write
+    path = spool.segmentPath(spool.write_sequence)
+    size = os.path.getsize(path)
+    with open(path, "ab") as file:
+        file.write(b"\x40\x00\x00\x00partial")
+
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    assert os.path.getsize(path) == size
+    assert [record[0] for record in spool.read(10)[0]] == [1, 2, 3]
+    assert spool.append(b"new", "10.0.0.1", 8001, 0.0) == 4
+    spool.close()
+
+
+def test_ids_go_on_after_every_segment_is_acked(tmp_path):
+    # 5 records fill a segment, the last one is rotated too and every record ends up in a segment that is deleted
+    spool = Spool(str(tmp_path), segment_size=200, fsync_interval=0.01)
+    appendFrames(spool, 10)
+    while True:
+        records, position = spool.read(100)
+        spool.ack(position)
+        if not records and position == spool.cursor:
+            break
+    # only the empty segment that is being written is left
+    assert [os.path.getsize(spool.segmentPath(sequence)) for sequence in spool.listSegments()] == [0]
+    spool.close()
+
+    spool = Spool(str(tmp_path), segment_size=200, fsync_interval=0.01)
+    assert spool.last_record_id == 10
+    assert spool.append(b"new", "10.0.0.1", 8001, 0.0) == 11
+    spool.close()
+
+
+def test_drainer_sends_the_keys_and_acks(tmp_path):
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    appendFrames(spool, 4)
+    received = []
+    drainer = SpoolDrainer(spool, received.extend, batch_size=3, batch_delay=0, mark=lambda spool_id: 0)
+    drainer.start()
+    waitFor(lambda: len(received) == 4)
+    drainer.stop()
+
+    assert [frame[4] for frame in received] == [f"{spool.id}:{record_id}" for record_id in range(1, 5)]
+    assert received[0][:4] == [b"frame 0", "10.0.0.1", 8001, 1700000000.0]
+    assert spool.read(10)[0] == []
+    spool.close()
+
+
+def test_drainer_retries_a_failed_batch(tmp_path):
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    appendFrames(spool, 2)
+    received = []
+    failures = [ConnectionRefusedError("master down")]
+
+    def send(batch):
+        if failures:
+            raise failures.pop()
+        received.extend(batch)
+
+    drainer = SpoolDrainer(spool, send, batch_delay=0, retry_min=0.01)
+    drainer.start()
+    waitFor(lambda: len(received) == 2)
+    drainer.stop()
+    assert drainer.stats["failed"] == 2 and drainer.stats["forwarded"] == 2
+    spool.close()
+
+
+def test_drainer_renames_a_spool_that_lost_its_ids(tmp_path):
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    appendFrames(spool, 3)
+    old_id = spool.id
+    received = []
+    # the master already has records of this spool after the last one it has
+    drainer = SpoolDrainer(spool, received.extend, batch_delay=0, mark=lambda spool_id: 50 if spool_id == old_id else 0)
+    drainer.start()
+    waitFor(lambda: len(received) == 3)
+    drainer.stop()
+
+    assert spool.id != old_id
+    assert [frame[4] for frame in received] == [f"{spool.id}:{record_id}" for record_id in range(1, 4)]
+    with open(os.path.join(str(tmp_path), "id")) as file:
+        assert file.read().strip() == spool.id
+    spool.close()
+
+
+def damageRecord(spool, sequence, index):
+    # one byte of the kiss of a record, the crc does not match anymore
+    path = spool.segmentPath(sequence)
+    offset = 0
+    for _ in range(index + 1):
+        offset = next(spool.iterRecords(sequence, offset, os.path.getsize(path)))[5]
+    with open(path, "r+b") as file:
+        file.seek(offset - 1)
+        byte = file.read(1)
+        file.seek(offset - 1)
+        file.write(bytes([byte[0] ^ 0xff]))
+
+
+def test_damaged_record_in_a_middle_segment(tmp_path):
+    # 5 records per segment, the second segment has records 6 to 10
+    spool = Spool(str(tmp_path), segment_size=200, fsync_interval=0.01)
+    appendFrames(spool, 15)
+    damageRecord(spool, 2, 1)
+
+    received = []
+    drainer = SpoolDrainer(spool, received.extend, batch_size=4, batch_delay=0)
+    drainer.start()
+    waitFor(lambda: len(received) == 11)
+    drainer.stop()
+
+    # the rest of the damaged segment is skipped, the frames after it are delivered
+    assert [int(frame[4].split(":")[1]) for frame in received] == [1, 2, 3, 4, 5, 6, 11, 12, 13, 14, 15]
+    assert spool.read(10)[0] == []
+    assert not spool.wait(0.05)
+    spool.close()
+
+
+def test_damaged_record_in_the_segment_being_written(tmp_path):
+    spool = Spool(str(tmp_path), fsync_interval=0.01)
+    appendFrames(spool, 3)
+    damageRecord(spool, spool.write_sequence, 1)
+
+    records, position = spool.read(10)
+    assert [record[0] for record in records] == [1]
+    spool.ack(position)
+    # the next frames go to a new segment
+    appendFrames(spool, 2, start=3)
+    assert [record[0] for record in spool.read(10)[0]] == [4, 5]
+    spool.close()
+
+
+def test_host_too_long():
+    checkHost("h" * MAX_HOST_LENGTH)
+    with pytest.raises(ValueError):
+        checkHost("h" * (MAX_HOST_LENGTH + 1))
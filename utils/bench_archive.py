@@ -0,0 +1,102 @@
+"""
+Insert rate and query time of the sqlite archive (Archive) with a year of synthetic data
+
+    NUMBER_OF_PASSAGES passages spread over a year, FRAMES_PER_PASSAGE frames each received by NUMBER_OF_STATIONS stations
+    The frames are inserted in batches of BATCH_SIZE, the same way the data warehouse does with the group commit
+    The last line goes through the whole archive a page at a time, like DataWarehouse.remoteQueryFrames
+
+Run from the root of the repo:
+    python utils/bench_archive.py
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Archive import Archive
+
+
+NUMBER_OF_PASSAGES = 1500
+FRAMES_PER_PASSAGE = 200
+NUMBER_OF_STATIONS = 10
+BATCH_SIZE = 1000
+YEAR = 365 * 24 * 3600
+START = 1700000000.0
+
+
+def build(archive):
+    random.seed(0)
+    rows = []
+    inserted = 0
+    start = time.perf_counter()
+    for passage_number in range(NUMBER_OF_PASSAGES):
+        aos = START + passage_number * YEAR / NUMBER_OF_PASSAGES
+        max_elevation = random.uniform(5, 90)
+        passage_id = archive.insertPassage({"passage_number": passage_number, "aos": aos, "los": aos + 600,
+                                            "max_elevation": max_elevation, "status": "closed"})
+        for index in range(FRAMES_PER_PASSAGE):
+            timestamp = aos + index * 3
+            elevation = max_elevation * (1 - abs(index / FRAMES_PER_PASSAGE * 2 - 1))
+            station = random.randrange(NUMBER_OF_STATIONS)
+            rows.append((passage_id, passage_number, timestamp, elevation, random.uniform(0, 360), 1000.0,
+                         f"10.0.0.{station}", 8000, random.randbytes(100)))
+            if len(rows) == BATCH_SIZE:
+                archive.insertFrames(rows)
+                inserted += len(rows)
+                rows = []
+    archive.insertFrames(rows)
+    inserted += len(rows)
+    return inserted, time.perf_counter() - start
+
+
+def timed(function, repeat=5):
+    result = function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    folder = tempfile.mkdtemp(prefix="archive_")
+    try:
+        archive = Archive(os.path.join(folder, "archive.sqlite"))
+        inserted, elapsed = build(archive)
+        size = os.path.getsize(archive.path) + os.path.getsize(archive.path + "-wal")
+        print(f"Inserted {inserted} frames in {elapsed:.1f} s ({inserted / elapsed:.0f} frames/s), {size / 1e6:.0f} MB")
+
+        last_month = START + YEAR - 30 * 24 * 3600
+        queries = {
+            "above 30 deg from one station in the last month": lambda: archive.queryFrames(
+                start=last_month, min_elevation=30, tnc_client=["10.0.0.3", 8000]),
+            "all the frames of one passage": lambda: archive.queryFrames(passage_number=NUMBER_OF_PASSAGES // 2),
+            "one hour of frames": lambda: archive.queryFrames(start=START + YEAR / 2, end=START + YEAR / 2 + 3600),
+            "above 85 deg, whole year": lambda: archive.queryFrames(min_elevation=85),
+        }
+        for name, query in queries.items():
+            frames, elapsed = timed(query)
+            print(f"  {name:50s} {len(frames):6d} frames  {elapsed * 1000:7.2f} ms")
+
+        # pages of remoteQueryFrames, each page continues after the last frame of the previous one
+        pages = 0
+        after = None
+        slowest = 0
+        start = time.perf_counter()
+        while True:
+            page_start = time.perf_counter()
+            frames = archive.queryFrames(limit=1000, after=after)
+            slowest = max(slowest, time.perf_counter() - page_start)
+            if not frames:
+                break
+            pages += 1
+            after = (frames[-1]["timestamp"], frames[-1]["id"])
+        elapsed = time.perf_counter() - start
+        print(f"  {'all the frames in pages of 1000':50s} {pages:6d} pages   {elapsed / pages * 1000:7.2f} ms/page (slowest {slowest * 1000:.2f} ms)")
+        archive.close()
+    finally:
+        shutil.rmtree(folder)
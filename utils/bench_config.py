@@ -0,0 +1,45 @@
+"""
+Time to get the configuration in every module, a new ConfigParser each time (loadDefaultValues + loadConfig, the
+file parsed again) vs getConfig (parsed once per process), and the time of a reload check without changes
+
+Run from the root of the repo (needs config.ini):
+    python utils/bench_config.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ConfigParser import ConfigParser, getConfig
+from bench_folders import useTempFolders
+
+
+REPEAT = 2000
+
+
+def oldConfig():
+    config = ConfigParser()
+    config.loadDefaultValues()
+    config.loadConfig()
+    return config
+
+
+def timed(function):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        function()
+    return (time.perf_counter() - start) / REPEAT
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    shared = getConfig()
+    results = (("new ConfigParser", timed(oldConfig)),
+               ("getConfig", timed(getConfig)),
+               ("reloadIfChanged", timed(shared.reloadIfChanged)),
+               ("get", timed(lambda: shared.get("tnc_batch_size"))))
+
+    for name, elapsed in results:
+        print(f"{name:18s} {elapsed * 1e6:9.2f} us")
@@ -0,0 +1,72 @@
+"""
+Accuracy and latency of the interpolated passage ephemeris
+
+Computes the next passages (this builds the ephemeris of each one), then picks random times inside them
+and compares the interpolated position against the direct skyfield evaluation
+
+Run from the root of the repo (needs config.ini):
+    python utils/bench_ephemeris.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from SatellitePredictor import SatellitePredictor
+from bench_folders import useTempFolders
+
+
+SAMPLES_PER_PASS = 2000
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    predictor = SatellitePredictor()
+    predictor.server.server_close()
+    predictor.logger.setLevel("WARNING")
+
+    start = time.perf_counter()
+    passes = predictor.getNextPasses(num_passes=10)
+    print(f"getNextPasses with ephemeris: {time.perf_counter() - start:.2f}s for {len(passes)} passes")
+
+    rng = np.random.default_rng(0)
+    worst = np.zeros(3)
+    for passage in passes:
+        ephemeris = predictor.getPassEphemeris(passage["aos"])
+        timestamps = rng.uniform(passage["aos"], passage["los"], SAMPLES_PER_PASS)
+
+        interpolated = np.array([ephemeris.position(t) for t in timestamps]).T
+        alt, az, distance = predictor.difference.at(predictor.timeFromTimestamps(timestamps)).altaz()
+        errors = np.abs(interpolated - np.array([alt.degrees, az.degrees, distance.km]))
+        errors[1] = np.abs((errors[1] + 180.0) % 360.0 - 180.0) * np.cos(alt.radians)   # pointing error
+        worst = np.maximum(worst, errors.max(axis=1))
+        print(f"  max elevation {passage['max_elevation']:5.1f}°  validation bound {np.round(ephemeris.max_error, 6).tolist()}"
+              f"  random samples {np.round(errors.max(axis=1), 6).tolist()}")
+
+    print(f"Worst error: elevation {worst[0]:.2e}°, azimuth (scaled by cos(elevation)) {worst[1]:.2e}°, distance {worst[2]:.2e} km")
+
+    # latency, interpolated vs sgp4
+    timestamp = (passes[0]["aos"] + passes[0]["los"]) / 2
+    ephemeris = predictor.getPassEphemeris(timestamp)
+    repeat = 100000
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ephemeris.position(timestamp)
+    print(f"PassEphemeris.position: {(time.perf_counter() - start) / repeat * 1e6:.2f} us")
+
+    repeat = 10000
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predictor.getSatellitePosition(timestamp)
+    print(f"getSatellitePosition (inside passage): {(time.perf_counter() - start) / repeat * 1e6:.2f} us")
+
+    timestamp = passes[0]["aos"] - 600
+    repeat = 1000
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predictor.getSatellitePosition(timestamp)
+    print(f"getSatellitePosition (sgp4, outside passage): {(time.perf_counter() - start) / repeat * 1e6:.2f} us")
@@ -0,0 +1,41 @@
+"""
+Temporary folders for the benches
+
+The modules started by a bench (Master, DataWarehouse, SatellitePredictor, ...) write their logs, passages,
+archive and spool in the folders of the config, that are data/, logs/ and spool/ in the repo. useTempFolders
+points all of them to a temporary folder that is removed at exit, call it before any module is created
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ConfigParser import getConfig
+from LogSetup import createLogger
+
+
+def useTempFolders(prefix="bench_"):
+    """
+    Returns the temporary folder, log_folder, data_folder, archive_path, parquet_folder and spool_folder are inside it
+    """
+    folder = tempfile.mkdtemp(prefix=prefix)
+    atexit.register(shutil.rmtree, folder, ignore_errors=True)
+
+    # the config logs to logs/ before it is loaded, its logger already exists when the config creates it
+    createLogger("ConfigParser", os.path.join(folder, "logs"), "INFO", console=False)
+    config = getConfig()
+    folders = {
+        "log_folder": os.path.join(folder, "logs"),
+        "data_folder": os.path.join(folder, "data"),
+        "archive_path": os.path.join(folder, "data", "archive.sqlite"),
+        "parquet_folder": os.path.join(folder, "data", "parquet"),
+        "spool_folder": os.path.join(folder, "spool"),
+    }
+    config.config_dict = {**config.config_dict, **folders}
+    # a reload of config.ini during the bench would bring back the folders of the file
+    config.onChange(lambda changed: setattr(config, "config_dict", {**config.config_dict, **folders}))
+    return folder
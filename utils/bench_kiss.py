@@ -0,0 +1,107 @@
+"""
+Throughput of the KISS decoder, old byte by byte loop vs kiss.KissDecoder
+
+The stream is built from captured frames: the data_dump_*.pkl files written by multi_launcher and the
+passages in data/ (if there are any in the current folder). Without captures random frames are used.
+The stream is fed in 1024 byte chunks, the same as the socket reads
+
+Run from the root of the repo:
+    python utils/bench_kiss.py
+"""
+
+import glob
+import os
+import pickle
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kiss import KissDecoder, encode_kiss, frame_to_bytes
+
+
+CHUNK_SIZE = 1024
+TARGET_SIZE = 4 * 1024 * 1024   # the captured frames are repeated until the stream has this size
+
+
+def old_decode_kiss(data):
+    """Copy of the decoder that used to be in TncClient"""
+    decoded = bytearray()
+    i = 0
+    while i < len(data):
+        if data[i] == 0xDB:
+            i += 1
+            if i < len(data):
+                if data[i] == 0xDC:
+                    decoded.append(0xC0)
+                elif data[i] == 0xDD:
+                    decoded.append(0xDB)
+                else:
+                    decoded.append(data[i])
+        else:
+            decoded.append(data[i])
+        i += 1
+    return decoded
+
+
+def old_decoder(chunks):
+    frames = []
+    buffer = bytearray()
+    for data in chunks:
+        for byte in data:
+            if byte == 0xC0:
+                if buffer:
+                    frames.append(bytes(old_decode_kiss(buffer[1:])))
+                    buffer.clear()
+            else:
+                buffer.append(byte)
+    return frames
+
+
+def new_decoder(chunks):
+    decoder = KissDecoder()
+    frames = []
+    for data in chunks:
+        frames.extend(decoder.feed(data))
+    return frames
+
+
+def load_captured_frames():
+    frames = []
+    for path in glob.glob("data_dump_*.pkl"):
+        with open(path, "rb") as f:
+            frames += [bytes(entry["data"]) for entry in pickle.load(f)]
+    for path in glob.glob(os.path.join("data", "*.json")) + glob.glob(os.path.join("data", "*", "")):
+        from DataWarehouse import DataWarehouse
+        for passage in DataWarehouse.loadPassage(path).values():
+            frames += [frame["kiss"] for frame in passage.get("frame_list", [])]
+    return [frame for frame in frames if frame]
+
+
+if __name__ == "__main__":
+    frames = load_captured_frames()
+    if frames:
+        print(f"Using {len(frames)} captured frames")
+    else:
+        print("No captures found, using random frames")
+        random.seed(0)
+        frames = [random.randbytes(random.randint(20, 250)) for _ in range(1000)]
+
+    stream = b"".join(encode_kiss(frame) for frame in frames)
+    stream = stream * max(1, TARGET_SIZE // len(stream))
+    chunks = [stream[i:i + CHUNK_SIZE] for i in range(0, len(stream), CHUNK_SIZE)]
+    megabytes = len(stream) / 1e6
+
+    start = time.perf_counter()
+    old_frames = old_decoder(chunks)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_frames = new_decoder(chunks)
+    new_time = time.perf_counter() - start
+
+    assert old_frames == new_frames, "decoders do not agree"
+    print(f"Stream of {megabytes:.1f} MB, {len(new_frames)} frames")
+    print(f"  old byte by byte: {megabytes / old_time:8.2f} MB/s")
+    print(f"  KissDecoder:      {megabytes / new_time:8.2f} MB/s  ({old_time / new_time:.0f}x)")
@@ -0,0 +1,71 @@
+"""
+Frames per second through the whole chain, Master -> DataWarehouse, one call per frame vs batches
+
+    single  -> Master.remoteReceiveKiss for each frame (and DataWarehouse.remoteSaveKiss)
+    batch   -> Master.remoteReceiveKissBatch with BATCH_SIZE frames (and DataWarehouse.remoteSaveKissBatch)
+
+Sat predictor, master and data warehouse are the real ones, the frames are inside a prepared passage
+
+Run from the root of the repo (needs config.ini, and the ports of the config free):
+    python utils/bench_kiss_batch.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DataWarehouse import DataWarehouse
+from Master import Master
+from RpcClient import createRpcProxy
+from SatellitePredictor import SatellitePredictor
+from bench_folders import useTempFolders
+
+
+NUMBER_OF_FRAMES = 4000
+BATCH_SIZE = 64
+KISS = bytes([0x86, 0xa2, 0x86, 0xa2, 0x86, 0xa2, 0x60, 0x86, 0xa8, 0x6c, 0x92, 0xa6, 0xa8, 0x63, 0x03, 0x00]) * 4
+
+
+def start_server(server):
+    server.logRequests = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    predictor = SatellitePredictor()
+    master = Master()
+    data_warehouse = DataWarehouse()
+    for logger in (predictor.logger, master.logger, data_warehouse.logger):
+        logger.setLevel("WARNING")
+
+    for server in (predictor.server, master.server, data_warehouse.server):
+        start_server(server)
+
+    proxy = createRpcProxy(master.Config, master.server_host, master.server_port)
+
+    passage = predictor.getNextPasses(num_passes=1)[0]
+    master.remotePreparePass(dict(passage))
+    step = (passage["los"] - passage["aos"]) / NUMBER_OF_FRAMES
+    frames = [[KISS, "localhost", 8000 + i % 10, passage["aos"] + i * step] for i in range(NUMBER_OF_FRAMES)]
+
+    start = time.perf_counter()
+    for frame in frames:
+        proxy.remoteReceiveKiss(*frame)
+    single = NUMBER_OF_FRAMES / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, NUMBER_OF_FRAMES, BATCH_SIZE):
+        proxy.remoteReceiveKissBatch(frames[i:i + BATCH_SIZE])
+    batch = NUMBER_OF_FRAMES / (time.perf_counter() - start)
+
+    saved = data_warehouse.passageDict[master.passage_number]["frame_count"]
+    print(f"single:      {single:8.0f} frames/s")
+    print(f"batch of {BATCH_SIZE}: {batch:8.0f} frames/s  ({batch / single:.1f}x)")
+    print(f"frames saved by the data warehouse: {saved}/{2 * NUMBER_OF_FRAMES}")
+
+    for server in (predictor.server, master.server, data_warehouse.server):
+        server.shutdown()
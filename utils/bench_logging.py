@@ -0,0 +1,108 @@
+"""
+Frames per second saved by the data warehouse (remoteSaveKissBatch) with the different logging set ups
+
+    sync DEBUG   -> the old loggers, console and file handlers called by the thread that saves the frames
+    queue DEBUG  -> LogSetup, the handlers run in the thread of the QueueListener
+    queue INFO   -> LogSetup at the default level, the debug calls of each frame are skipped
+
+The console goes to os.devnull and the files to a temporary folder, the time of queue DEBUG does not include
+the writes that are still in the queue, they are waited for and shown apart
+
+Run from the root of the repo (needs config.ini, and the ports of the config free):
+    python utils/bench_logging.py
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LogSetup
+from DataWarehouse import DataWarehouse
+from LogSetup import createLogger
+from bench_folders import useTempFolders
+
+
+FRAME_COUNT = 20000
+BATCH_SIZE = 64
+
+
+def passage(passage_number):
+    return {
+        "passage_number": passage_number, "satcat_id": 60238, "azimuth_elevation": [[0.0, 0.0]], "tle_line1": "", "tle_line2": "",
+        "gs_clients": [], "frame_count": 0, "aos": 1.7e9, "los": 1.7e9 + 600, "start_azimuth": 0.0,
+        "end_azimuth": 180.0, "max_elevation": 45.0, "time_interval": [1.7e9, 1.7e9 + 600], "frame_list": [], "observers": {},
+    }
+
+
+def batches(passage_number):
+    batch = []
+    for index in range(FRAME_COUNT):
+        batch.append({
+            "timestamp": 1.7e9 + index * 0.01, "elevation": 10.0, "azimuth": 20.0, "distance": 1000.0,
+            "tnc_client": ["localhost", 8000 + index % 5], "passage_number": passage_number,
+            "kiss": index.to_bytes(4, "big") * 25,
+        })
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def syncLogger(folder, devnull):
+    logger = logging.getLogger("bench_sync")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    formatter = logging.Formatter(LogSetup.FORMAT)
+    for handler in (logging.StreamHandler(devnull), logging.FileHandler(os.path.join(folder, "sync.log"))):
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    return logger
+
+
+def run(data_warehouse, logger, passage_number):
+    """
+    Returns (seconds saving the frames, seconds until the queue of the logger is empty)
+    """
+    data_warehouse.logger = logger
+    data_warehouse.remoteCreatePassage(passage(passage_number))
+    prepared = list(batches(passage_number))
+
+    start = time.perf_counter()
+    for batch in prepared:
+        data_warehouse.remoteSaveKissBatch(batch)
+    elapsed = time.perf_counter() - start
+
+    listener = LogSetup._listeners.get(logger.name)
+    if listener is not None:
+        while not listener.queue.empty():
+            time.sleep(0.001)
+    return elapsed, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    data_warehouse = DataWarehouse()
+    # only the logging is measured, the frames are not archived
+    data_warehouse.archive = None
+    folder = tempfile.mkdtemp(prefix="logging_")
+    data_warehouse.data_folder = folder
+    devnull = open(os.devnull, "w")
+
+    setups = (("sync DEBUG", syncLogger(folder, devnull)),
+              ("queue DEBUG", createLogger("bench_queue_debug", folder, "DEBUG", stream=devnull)),
+              ("queue INFO", createLogger("bench_queue_info", folder, "INFO", stream=devnull)))
+
+    print(f"{FRAME_COUNT} frames in batches of {BATCH_SIZE}")
+    for passage_number, (name, logger) in enumerate(setups, start=1):
+        elapsed, drained = run(data_warehouse, logger, passage_number)
+        print(f"  {name:12s} {FRAME_COUNT / elapsed / 1e3:6.1f} k frames/s   ({elapsed * 1000:6.0f} ms, logs written after {drained * 1000:6.0f} ms)")
+
+    LogSetup.stopLogging()
+    devnull.close()
+    shutil.rmtree(folder)
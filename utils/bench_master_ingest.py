@@ -0,0 +1,96 @@
+"""
+Frames per second through Master.remoteReceiveKiss
+
+Three ways of getting the satellite position and passage number are compared:
+    legacy   -> two calls to sat predictor per frame (what remoteReceiveKiss used to do)
+    fallback -> a single call to sat predictor (no prepared passage in master)
+    cached   -> answered locally from the ephemeris of the prepared passage
+
+The data warehouse is replaced by a stub that accepts everything, sat predictor is the real one
+
+Run from the root of the repo (needs config.ini, and the ports of the config free):
+    python utils/bench_master_ingest.py
+"""
+
+import os
+import sys
+import threading
+import time
+import types
+import xmlrpc.client
+from xmlrpc.server import SimpleXMLRPCServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Master import Master
+from SatellitePredictor import SatellitePredictor
+from bench_folders import useTempFolders
+
+
+NUMBER_OF_FRAMES = 2000
+KISS = "0x86 0xa2 0x86 0xa2 0x86 0xa2 0x60 0x86 0xa8 0x6c 0x92 0xa6 0xa8 0x63 0x03 0x00 " * 4
+
+
+def start_server(server):
+    server.logRequests = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def legacy_state(self, timestamp, kiss=None, tnc_client=None):
+    """
+    Same work as the old remoteReceiveKiss, the position is asked twice
+    """
+    elevation, azimuth, distance = self.sat_predict_proxy.remoteGetSatellitePosition(timestamp)
+    elevation, _, _ = self.sat_predict_proxy.remoteGetSatellitePosition(timestamp)
+    return self.getCurrentPassageNumber(elevation), elevation, azimuth, distance
+
+
+def run(proxy, timestamps):
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        proxy.remoteReceiveKiss(KISS, "localhost", 8000, timestamp)
+    return len(timestamps) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    predictor = SatellitePredictor()
+    master = Master()
+    for logger in (predictor.logger, master.logger):
+        logger.setLevel("WARNING")
+
+    data_warehouse = SimpleXMLRPCServer((master.data_warehouse_host, master.data_warehouse_port))
+    data_warehouse.register_function(lambda data_dict: True, "remoteCreatePassage")
+    data_warehouse.register_function(lambda data_dict: True, "remoteSaveKiss")
+
+    for server in (predictor.server, master.server, data_warehouse):
+        start_server(server)
+
+    proxy = xmlrpc.client.ServerProxy(f"http://{master.server_host}:{master.server_port}")
+
+    # prepare the next passage and send frames spread over it
+    passage = predictor.getNextPasses(num_passes=1)[0]
+    step = (passage["los"] - passage["aos"]) / NUMBER_OF_FRAMES
+    timestamps = [passage["aos"] + i * step for i in range(NUMBER_OF_FRAMES)]
+
+    master.getSatelliteState = types.MethodType(legacy_state, master)
+    master.remotePreparePass(dict(passage))
+    legacy = run(proxy, timestamps)
+
+    del master.getSatelliteState
+    master.pass_states = {}
+    master.passage_number -= 1
+    master.remotePreparePass({key: value for key, value in passage.items() if key != "ephemeris"})
+    fallback = run(proxy, timestamps)
+
+    master.pass_states = {}
+    master.passage_number -= 1
+    master.remotePreparePass(dict(passage))
+    cached = run(proxy, timestamps)
+
+    print(f"legacy   (2 predictor calls): {legacy:8.1f} frames/s  {1000 / legacy:.3f} ms/frame")
+    print(f"fallback (1 predictor call):  {fallback:8.1f} frames/s  {1000 / fallback:.3f} ms/frame")
+    print(f"cached   (0 predictor calls): {cached:8.1f} frames/s  {1000 / cached:.3f} ms/frame")
+
+    for server in (predictor.server, master.server, data_warehouse):
+        server.shutdown()
@@ -0,0 +1,133 @@
+"""
+Cost of following many satellites
+
+    positions -> elevation/azimuth/distance of N satellites at a batch of timestamps
+                 skyfield: one EarthSatellite per satellite, a call for each of them
+                 SatelliteSet: all of them in a single sgp4 SatrecArray call
+    tagging   -> time to find the passages that cover the timestamp of a frame with P passages prepared in master
+                 scan: every passage checked, PassTimeline: binary search
+
+The satellites are copies of the default TLE with the RAAN and the mean anomaly moved, so they are spread around
+the sky. At the end the positions of both are compared
+
+Run from the root of the repo:
+    python utils/bench_multi_satellite.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from skyfield.api import EarthSatellite, load, wgs84
+
+from PassTimeline import PassTimeline
+from SatelliteSet import SatelliteSet
+
+
+TLE_LINE1 = "1 60238U 24128D   25180.89646745  .00004045  00000+0  28654-3 0  9991"
+TLE_LINE2 = "2 60238  61.9914   5.9727 0052120  61.8031 298.8311 15.05478104 53319"
+LATITUDE, LONGITUDE = 38.7314, -9.3024
+START = 1751241600.0          # 2025-06-30 00:00 UTC
+NUM_SATELLITES = [1, 10, 100, 500]
+NUM_TIMESTAMPS = 64           # a batch of frames of TncService
+NUM_PASSES = [10, 100, 1000]
+REPEAT = 5
+
+
+def checksum(line):
+    return line[:68] + str(sum(int(char) if char.isdigit() else char == "-" for char in line[:68]) % 10)
+
+
+def syntheticTles(count):
+    """
+    {satcat_id: (line1, line2)} copies of the default TLE, the RAAN and the mean anomaly are columns 18-25 and 44-51
+    """
+    tles = {}
+    for index in range(count):
+        satcat_id = 70000 + index
+        raan = (5.9727 + index * 137.5) % 360.0
+        mean_anomaly = (298.8311 + index * 57.3) % 360.0
+        line1 = TLE_LINE1.replace("60238U", f"{satcat_id}U")
+        line2 = f"2 {satcat_id}" + TLE_LINE2[7:17] + f"{raan:8.4f}" + TLE_LINE2[25:43] + f"{mean_anomaly:8.4f}" + TLE_LINE2[51:]
+        tles[satcat_id] = (checksum(line1), checksum(line2))
+    return tles
+
+
+def skyfieldPositions(ts, differences, timestamps):
+    days = np.floor(timestamps / 86400.0)
+    time_ = ts.utc(1970, 1, 1 + days, 0, 0, timestamps - days * 86400.0)
+    results = []
+    for difference in differences:
+        alt, az, distance = difference.at(time_).altaz()
+        results.append((alt.degrees, az.degrees, distance.km))
+    return np.array(results).transpose(1, 0, 2)
+
+
+def timed(function, *args):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scanPasses(intervals, timestamps):
+    for timestamp in timestamps:
+        [item for aos, los, item in intervals if aos <= timestamp < los]
+
+
+def timelinePasses(timeline, timestamps):
+    for timestamp in timestamps:
+        timeline.at(timestamp)
+
+
+if __name__ == "__main__":
+    ts = load.timescale()
+    observer = wgs84.latlon(LATITUDE, LONGITUDE)
+    timestamps = START + np.arange(NUM_TIMESTAMPS) * 0.5
+
+    print(f"positions of N satellites at {NUM_TIMESTAMPS} timestamps")
+    print(f"{'N':>6} {'skyfield':>12} {'SatelliteSet':>14}")
+    for count in NUM_SATELLITES:
+        tles = syntheticTles(count)
+        differences = [EarthSatellite(line1, line2, str(satcat_id), ts) - observer for satcat_id, (line1, line2) in tles.items()]
+        satellite_set = SatelliteSet(ts, LATITUDE, LONGITUDE)
+        satellite_set.setTLEs(tles)
+        old = timed(skyfieldPositions, ts, differences, timestamps)
+        new = timed(satellite_set.positions, timestamps)
+        print(f"{count:>6} {old * 1000:>10.2f}ms {new * 1000:>12.2f}ms")
+
+    # passages of 10 minutes spread over a day, a frame every second of the day
+    random.seed(1)
+    frames = START + np.sort(np.random.default_rng(1).uniform(0, 86400, 10000))
+    print(f"\ntagging {len(frames)} frames")
+    print(f"{'P':>6} {'scan':>12} {'PassTimeline':>14}")
+    for count in NUM_PASSES:
+        intervals = []
+        for number in range(count):
+            aos = START + random.uniform(0, 86400 - 600)
+            intervals.append((aos, aos + random.uniform(300, 700), number))
+        timeline = PassTimeline(intervals)
+        old = timed(scanPasses, intervals, frames.tolist())
+        new = timed(timelinePasses, timeline, frames.tolist())
+        print(f"{count:>6} {old / len(frames) * 1e6:>10.2f}us {new / len(frames) * 1e6:>12.2f}us")
+
+    # both give the same positions (only where the satellite is above the horizon matters)
+    tles = syntheticTles(100)
+    differences = [EarthSatellite(line1, line2, str(satcat_id), ts) - observer for satcat_id, (line1, line2) in tles.items()]
+    satellite_set = SatelliteSet(ts, LATITUDE, LONGITUDE)
+    satellite_set.setTLEs(tles)
+    timestamps = START + np.arange(0, 86400, 60.0)
+    expected = skyfieldPositions(ts, differences, timestamps)
+    result = np.array(satellite_set.positions(timestamps))
+    visible = expected[0] > 0
+    errors = np.abs(result - expected)
+    errors[1] = np.abs((errors[1] + 180.0) % 360.0 - 180.0)
+    print(f"\n100 satellites for a day, {visible.sum()} positions above the horizon, max difference "
+          f"elevation {errors[0][visible].max():.2e}°, azimuth {errors[1][visible].max():.2e}°, "
+          f"distance {errors[2][visible].max() * 1000:.2f} m")
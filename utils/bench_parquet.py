@@ -0,0 +1,149 @@
+"""
+Time to load the frames for an analysis from the json archive and from the parquet export (ParquetExport)
+
+    NUMBER_OF_PASSAGES passages spread over a year, FRAMES_PER_PASSAGE frames each received by NUMBER_OF_STATIONS stations
+    json    -> every passage is a json file like the ones of dumpData, the frames as "0x86 0xa2 ..." strings,
+               loaded with DataWarehouse.loadPassage and filtered in python
+    parquet -> the same frames in the archive exported with ParquetExport, the filters are pushed down to the files
+
+Also times the incremental export of a new passage and the compaction of the partitions
+
+Needs pyarrow:
+    pip install pyarrow
+
+Run from the root of the repo:
+    python utils/bench_parquet.py
+"""
+
+import glob
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Archive import Archive
+from DataWarehouse import DataWarehouse
+from kiss import print_byte_array
+import ParquetExport
+
+
+NUMBER_OF_PASSAGES = 300
+FRAMES_PER_PASSAGE = 200
+NUMBER_OF_STATIONS = 10
+YEAR = 365 * 24 * 3600
+START = 1700000000.0
+
+
+def makePassage(passage_number):
+    aos = START + passage_number * YEAR / NUMBER_OF_PASSAGES
+    max_elevation = random.uniform(5, 90)
+    frames = []
+    for index in range(FRAMES_PER_PASSAGE):
+        frames.append({
+            "timestamp": aos + index * 3,
+            "elevation": max_elevation * (1 - abs(index / FRAMES_PER_PASSAGE * 2 - 1)),
+            "azimuth": random.uniform(0, 360),
+            "distance": random.uniform(500, 2500),
+            "tnc_client": [f"10.0.0.{random.randrange(NUMBER_OF_STATIONS)}", 8000],
+            "passage_number": passage_number,
+            "kiss": random.randbytes(100),
+        })
+    header = {"passage_number": passage_number, "aos": aos, "los": aos + 600, "max_elevation": max_elevation, "status": "closed"}
+    return header, frames
+
+
+def addPassage(archive, json_folder, passage_number):
+    header, frames = makePassage(passage_number)
+    passage_id = archive.insertPassage(header)
+    archive.insertFrames([Archive.frameRow(passage_id, frame) for frame in frames])
+
+    for frame in frames:
+        frame["kiss"] = print_byte_array(frame["kiss"])
+    with open(os.path.join(json_folder, f"{passage_number}.json"), "w") as f:
+        json.dump({str(passage_number): {**header, "frame_list": frames}}, f, indent=4)
+
+
+def loadJson(json_folder, min_elevation=None, station=None, start=None):
+    """
+    What the analysis had to do before, load every passage and filter the frames
+    """
+    frames = []
+    for path in glob.glob(os.path.join(json_folder, "*.json")):
+        for passage in DataWarehouse.loadPassage(path).values():
+            for frame in passage["frame_list"]:
+                if min_elevation is not None and frame["elevation"] < min_elevation:
+                    continue
+                if station is not None and frame["tnc_client"][0] != station:
+                    continue
+                if start is not None and frame["timestamp"] < start:
+                    continue
+                frames.append(frame)
+    return frames
+
+
+def timed(function, repeat=3):
+    result = function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def folderSize(folder):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names)
+
+
+if __name__ == "__main__":
+    ParquetExport.requirePyarrow()
+    random.seed(0)
+    folder = tempfile.mkdtemp(prefix="parquet_")
+    try:
+        json_folder = os.path.join(folder, "json")
+        parquet_folder = os.path.join(folder, "parquet")
+        os.makedirs(json_folder)
+        archive = Archive(os.path.join(folder, "archive.sqlite"))
+        for passage_number in range(NUMBER_OF_PASSAGES):
+            addPassage(archive, json_folder, passage_number)
+
+        start = time.perf_counter()
+        exported = ParquetExport.exportFrames(archive, parquet_folder)
+        print(f"Exported {exported} frames in {time.perf_counter() - start:.2f} s")
+        print(f"  json {folderSize(json_folder) / 1e6:.1f} MB, parquet {folderSize(parquet_folder) / 1e6:.1f} MB")
+
+        last_month = START + YEAR - 30 * 24 * 3600
+        queries = {
+            "all the frames": (
+                lambda: loadJson(json_folder),
+                lambda: ParquetExport.readFrames(parquet_folder)),
+            "above 30 deg from one station": (
+                lambda: loadJson(json_folder, min_elevation=30, station="10.0.0.3"),
+                lambda: ParquetExport.readFrames(parquet_folder, min_elevation=30, stations=["10.0.0.3_8000"])),
+            "the last month": (
+                lambda: loadJson(json_folder, start=last_month),
+                lambda: ParquetExport.readFrames(parquet_folder, start=last_month)),
+        }
+        for name, (json_query, parquet_query) in queries.items():
+            frames, json_elapsed = timed(json_query)
+            table, parquet_elapsed = timed(parquet_query)
+            assert len(frames) == table.num_rows, (len(frames), table.num_rows)
+            print(f"  {name:35s} {len(frames):7d} frames  json {json_elapsed * 1000:8.1f} ms  "
+                  f"parquet {parquet_elapsed * 1000:7.1f} ms  ({json_elapsed / parquet_elapsed:.0f}x)")
+
+        # a new passage after LOS, only its frames are written
+        addPassage(archive, json_folder, NUMBER_OF_PASSAGES)
+        start = time.perf_counter()
+        exported = ParquetExport.exportFrames(archive, parquet_folder)
+        print(f"Incremental export of {exported} frames in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        start = time.perf_counter()
+        compacted = ParquetExport.compact(parquet_folder)
+        print(f"Compacted {compacted} partitions in {time.perf_counter() - start:.2f} s")
+        assert ParquetExport.readFrames(parquet_folder).num_rows == (NUMBER_OF_PASSAGES + 1) * FRAMES_PER_PASSAGE
+        archive.close()
+    finally:
+        shutil.rmtree(folder)
@@ -0,0 +1,85 @@
+"""
+Rate of PassageIndex (duplicates and groups of the frames of an open passage) with a synthetic passage
+
+    NUMBER_OF_STATIONS stations receive NUMBER_OF_TRANSMISSIONS frames each with random bit errors,
+    RETRIED of the frames are received twice (retries). The frames arrive mixed between the stations
+
+The groups are compared with the ones FrameFusion.group_frames finds at LOS, and the duplicate check with
+what it costs to look for the frame in the list of the passage
+
+Run from the root of the repo:
+    python utils/bench_passage_index.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FrameFusion import group_frames
+from PassageIndex import PassageIndex
+
+
+NUMBER_OF_STATIONS = 10
+NUMBER_OF_TRANSMISSIONS = 5000
+RETRIED = 0.05
+BIT_ERROR_RATE = 0.002
+
+
+def makeFrames():
+    random.seed(0)
+    frames = []
+    for transmission in range(NUMBER_OF_TRANSMISSIONS):
+        original = random.randbytes(random.choice((60, 100, 200)))
+        epoch = 1000.0 + transmission * 2
+        for station in range(NUMBER_OF_STATIONS):
+            payload = bytearray(original)
+            for bit in range(len(payload) * 8):
+                if random.random() < BIT_ERROR_RATE:
+                    payload[bit // 8] ^= 1 << (bit % 8)
+            frames.append((bytes(payload).hex(), ("10.0.0.1", 8000 + station), epoch + random.random() * 0.2))
+    retries = random.sample(frames, int(len(frames) * RETRIED))
+    # the order in which the data warehouse receives them, the stations are not in sync
+    frames.sort(key=lambda frame: frame[2] + random.random())
+    return frames, retries
+
+
+def groupsToPartition(groups):
+    partition = {}
+    for frame, group in groups:
+        partition.setdefault(group, set()).add(frame)
+    return {frozenset(members) for members in partition.values()}
+
+
+if __name__ == "__main__":
+    frames, retries = makeFrames()
+    incoming = frames + retries
+
+    index = PassageIndex()
+    groups = []
+    start = time.perf_counter()
+    for number, (kiss, station, epoch) in enumerate(incoming):
+        group = index.add(kiss, station, epoch)
+        if group is not None:
+            groups.append((number, group))
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {len(incoming)} frames in {elapsed * 1000:.1f} ms ({elapsed / len(incoming) * 1e6:.2f} us/frame)")
+    print(f"  {index.duplicates} duplicates found ({len(retries)} retries sent), {len(index.groups)} groups "
+          f"({NUMBER_OF_TRANSMISSIONS} transmissions)")
+
+    # the same groups that the fusion would find at LOS
+    group_ids = group_frames([frame[2] for frame in frames], [len(frame[0]) // 2 for frame in frames], [frame[1] for frame in frames])
+    expected = groupsToPartition(enumerate(group_ids))
+    found = groupsToPartition(groups)
+    print(f"  {len(expected & found)}/{len(expected)} groups equal to FrameFusion.group_frames")
+
+    # what a duplicate check costs without the index, the whole list of the passage
+    saved = []
+    start = time.perf_counter()
+    for kiss, station, epoch in incoming[:5000]:
+        if not any(frame[0] == kiss and frame[1] == station for frame in saved):
+            saved.append((kiss, station, epoch))
+    elapsed = time.perf_counter() - start
+    print(f"Scanning the list: {elapsed / 5000 * 1e6:.2f} us/frame for the first 5000 frames, growing with the passage")
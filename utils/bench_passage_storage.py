@@ -0,0 +1,97 @@
+"""
+Memory and LOS save time of a passage, old storage (everything in memory, one json at LOS) vs PassageLog
+
+    old -> frames kept in the passage dictionary, json.dump(indent=4) of the whole passage at LOS
+    new -> frames appended to the log of the passage as they arrive, at LOS only the header is written
+
+Run from the root of the repo (needs config.ini, and the ports of the config free):
+    python utils/bench_passage_storage.py
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DataWarehouse import DataWarehouse
+from bench_folders import useTempFolders
+
+
+FRAME_COUNTS = [1000, 10000, 50000]
+BATCH_SIZE = 64
+
+
+def passage(passage_number):
+    return {
+        "passage_number": passage_number, "satcat_id": 60238, "azimuth_elevation": [[0.0, 0.0]], "tle_line1": "", "tle_line2": "",
+        "gs_clients": [], "frame_count": 0, "aos": 1.7e9, "los": 1.7e9 + 600, "start_azimuth": 0.0,
+        "end_azimuth": 180.0, "max_elevation": 45.0, "time_interval": [1.7e9, 1.7e9 + 600], "frame_list": [], "observers": {},
+    }
+
+
+def frames(passage_number, count):
+    for index in range(count):
+        yield {
+            "timestamp": 1.7e9 + index * 0.01, "elevation": 10.0, "azimuth": 20.0, "distance": 1000.0,
+            "tnc_client": ["localhost", 8000 + index % 5], "passage_number": passage_number,
+            "kiss": bytes([index % 256]) * 100,
+        }
+
+
+def run_old(data_warehouse, count, folder):
+    passage_dict = passage(0)
+    for frame in frames(0, count):
+        passage_dict["frame_list"].append(data_warehouse.prepareFrame(frame).toRecord())
+    memory = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    with open(os.path.join(folder, "old.json"), "w") as f:
+        json.dump({0: passage_dict}, f, indent=4)
+    return memory, time.perf_counter() - start
+
+
+def run_new(data_warehouse, count, folder):
+    data_warehouse.data_folder = folder
+    data_warehouse.remoteCreatePassage(passage(1))
+    batch = []
+    for frame in frames(1, count):
+        batch.append(frame)
+        if len(batch) == BATCH_SIZE:
+            data_warehouse.remoteSaveKissBatch(batch)
+            batch = []
+    data_warehouse.remoteSaveKissBatch(batch)
+    memory = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    data_warehouse.savePreviousPassage()
+    elapsed = time.perf_counter() - start
+
+    # the fusion runs in the background, wait for it before the folder is removed
+    fused = os.path.join(folder, os.listdir(folder)[0], "fused.jsonl")
+    while not os.path.exists(fused) and time.perf_counter() - start < 60:
+        time.sleep(0.05)
+    return memory, elapsed
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    data_warehouse = DataWarehouse()
+    data_warehouse.logger.setLevel("WARNING")
+
+    for count in FRAME_COUNTS:
+        results = []
+        for run in (run_old, run_new):
+            folder = tempfile.mkdtemp(prefix="passages_")
+            tracemalloc.start()
+            results.append(run(data_warehouse, count, folder))
+            tracemalloc.stop()
+            shutil.rmtree(folder)
+
+        (old_memory, old_save), (new_memory, new_save) = results
+        print(f"{count:6d} frames  memory old {old_memory / 1e6:7.1f} MB  new {new_memory / 1e6:5.1f} MB   "
+              f"LOS save old {old_save * 1000:8.1f} ms  new {new_save * 1000:5.1f} ms")
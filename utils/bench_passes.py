@@ -0,0 +1,128 @@
+"""
+Time to predict the next passages with a fixed TLE and a fixed start, so the runs can be compared
+
+    old  -> the previous getNextPasses: one find_events per day and a skyfield call for each event and each
+            of the 20 points of every passage (without the ephemerides)
+    new  -> findPasses (a single find_events for PASS_SEARCH_DAYS) and the points of all the passages in one vector Time
+    getNextPasses -> the whole call, with the ephemerides of the passages (pass cache emptied before each call)
+    cached -> the same request again, answered from the pass cache
+
+The passages of old and new are compared at the end
+
+Run from the root of the repo (needs config.ini, and the ports of the config free):
+    python utils/bench_passes.py
+"""
+
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from SatellitePredictor import SatellitePredictor
+from bench_folders import useTempFolders
+
+
+TLE_LINE1 = "1 60238U 24128D   25180.89646745  .00004045  00000+0  28654-3 0  9991"
+TLE_LINE2 = "2 60238  61.9914   5.9727 0052120  61.8031 298.8311 15.05478104 53319"
+START = 1751241600.0      # 2025-06-30 00:00 UTC, a few hours after the epoch of the TLE
+NUM_PASSES = [1, 10, 30]
+REPEAT = 5
+
+
+def oldNextPasses(predictor, num_passes, start):
+    passes = []
+    search_start = predictor.timeFromTimestamps(start)
+    aos, peak_elevation = None, 0
+    for _ in range(16):
+        search_end = predictor.ts.utc(search_start.utc_datetime() + timedelta(days=1))
+        times, events = predictor.satellite.find_events(predictor.observer, search_start, search_end, altitude_degrees=0.0)
+        for i, event in enumerate(events):
+            time_ = times[i].utc_datetime()
+            if event == 0:
+                aos = time_
+                start_azimuth = float((predictor.satellite - predictor.observer).at(times[i]).altaz()[1].degrees)
+            elif event == 1:
+                if not aos:
+                    continue
+                peak_elevation = float(max(peak_elevation, (predictor.satellite - predictor.observer).at(times[i]).altaz()[0].degrees))
+            elif event == 2:
+                if not aos:
+                    continue
+                los = time_
+                end_azimuth = float((predictor.satellite - predictor.observer).at(times[i]).altaz()[1].degrees)
+                if peak_elevation < 10:
+                    aos, peak_elevation = None, 0
+                    continue
+                interval = (los - aos).total_seconds() / 20
+                azimuth_elevation = []
+                for t in [aos + timedelta(seconds=i * interval) for i in range(20)]:
+                    alt, az, _ = (predictor.satellite - predictor.observer).at(predictor.ts.utc(t)).altaz()
+                    azimuth_elevation.append([float(az.degrees), float(alt.degrees)])
+                passes.append((aos.timestamp(), los.timestamp(), peak_elevation, start_azimuth, end_azimuth, azimuth_elevation))
+                aos, peak_elevation = None, 0
+                if len(passes) >= num_passes:
+                    return passes
+        search_start = search_end
+    return passes
+
+
+def coldNextPasses(predictor, num_passes, start):
+    predictor.pass_cache = {}
+    return predictor.getNextPasses(num_passes, start)
+
+
+def newNextPasses(predictor, num_passes, start):
+    # getNextPasses without the ephemerides
+    found = []
+    search_start = start
+    while len(found) < num_passes:
+        passes, resume = predictor.findPasses(search_start, search_start + 3 * 86400.0)
+        found.extend(passes)
+        search_start = resume - 60.0 if resume < search_start + 3 * 86400.0 else search_start + 3 * 86400.0
+    found = found[:num_passes]
+    aos = np.array([sat_pass[0] for sat_pass in found])
+    los = np.array([sat_pass[1] for sat_pass in found])
+    predictor.getSatellitePositions((aos[:, None] + (los - aos)[:, None] * (np.arange(20) / 20)).ravel())
+    return found
+
+
+def timed(function, *args):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    predictor = SatellitePredictor()
+    predictor.logger.setLevel("WARNING")
+    predictor.loadTLE(TLE_LINE1, TLE_LINE2)
+    predictor.createSatellite()
+
+    print(f"{'passes':>6} {'old':>10} {'new':>10} {'getNextPasses':>14} {'cached':>10}")
+    for num_passes in NUM_PASSES:
+        old = timed(oldNextPasses, predictor, num_passes, START)
+        new = timed(newNextPasses, predictor, num_passes, START)
+        full = timed(coldNextPasses, predictor, num_passes, START)
+        cached = timed(predictor.getNextPasses, num_passes, START)
+        print(f"{num_passes:>6} {old * 1000:>8.1f}ms {new * 1000:>8.1f}ms {full * 1000:>12.1f}ms {cached * 1e6:>8.1f}us")
+
+    # the same TLE again keeps the cache, one hour later only the passages that already started are dropped
+    predictor.setTLE(TLE_LINE1, TLE_LINE2)
+    later = timed(predictor.getNextPasses, 10, START + 3600.0)
+    print(f"same TLE again, 10 passes one hour later: {later * 1e6:.1f}us")
+
+    # both give the same passages
+    old_passes = oldNextPasses(predictor, 10, START)
+    new_passes = coldNextPasses(predictor, 10, START)
+    aos = max(abs(old[0] - new["aos"]) for old, new in zip(old_passes, new_passes))
+    elevation = max(abs(old[2] - new["max_elevation"]) for old, new in zip(old_passes, new_passes))
+    track = max(np.abs(np.array(old[5]) - np.array(new["azimuth_elevation"])).max() for old, new in zip(old_passes, new_passes))
+    print(f"{len(new_passes)} passes, max difference aos {aos:.3f} s, peak elevation {elevation:.2e}°, track {track:.2e}°")
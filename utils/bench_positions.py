@@ -0,0 +1,64 @@
+"""
+Benchmark of the satellite position API
+Compares asking for the positions one timestamp at a time against a single batched call,
+both in process and over xmlrpc
+
+Run from the root of the repo (needs config.ini):
+    python utils/bench_positions.py
+"""
+
+import os
+import sys
+import threading
+import time
+import xmlrpc.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from SatellitePredictor import SatellitePredictor
+from bench_folders import useTempFolders
+
+
+SIZES = [1, 100, 10000]
+MAX_SCALAR_RPC_CALLS = 1000   # scalar rpc calls are slow, above this the time is extrapolated
+
+
+def timeit(function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    predictor = SatellitePredictor()
+    threading.Thread(target=predictor.server.serve_forever, daemon=True).start()
+    proxy = xmlrpc.client.ServerProxy(f"http://{predictor.server_host}:{predictor.server_port}")
+
+    # benchmark only the hot path, not the logging
+    predictor.logger.setLevel("WARNING")
+
+    now = time.time()
+    print(f"{'timestamps':>10} {'scalar':>12} {'batched':>12} {'scalar rpc':>12} {'batched rpc':>12}")
+    for size in SIZES:
+        timestamps = now + np.arange(size, dtype=np.float64)
+
+        scalar = timeit(lambda: [predictor.getSatellitePosition(t) for t in timestamps])
+        batched = timeit(lambda: predictor.getSatellitePositions(timestamps), repeat=5)
+
+        rpc_calls = timestamps[:MAX_SCALAR_RPC_CALLS].tolist()
+        scalar_rpc = timeit(lambda: [proxy.remoteGetSatellitePosition(t) for t in rpc_calls]) * size / len(rpc_calls)
+        batched_rpc = timeit(lambda: proxy.remoteGetSatellitePositions(timestamps.tolist()), repeat=3)
+
+        print(f"{size:>10} {scalar * 1000:>10.2f}ms {batched * 1000:>10.2f}ms {scalar_rpc * 1000:>10.2f}ms {batched_rpc * 1000:>10.2f}ms")
+
+    # make sure both paths agree
+    timestamps = now + np.arange(100, dtype=np.float64)
+    batched_positions = np.array(predictor.getSatellitePositions(timestamps))
+    scalar_positions = np.array([predictor.getSatellitePosition(t) for t in timestamps]).T
+    print(f"Max difference between scalar and batched: {np.abs(batched_positions - scalar_positions).max():.3e}")
+
+    predictor.server.shutdown()
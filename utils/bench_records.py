@@ -0,0 +1,95 @@
+"""
+Memory and construction time of the frames of a passage as dictionaries, Records.Frame and Records.FrameColumns
+
+    A synthetic passage of NUMBER_OF_FRAMES frames of FRAME_LENGTH bytes from NUMBER_OF_STATIONS stations
+    dict          -> the dictionary master sends to the data warehouse (Schema.FRAME)
+    saved dict    -> the dictionary saved in frames.jsonl (what the fusion and the analysis loaded before)
+    Frame         -> Records.Frame (__slots__)
+    FrameColumns  -> all the frames of the passage in arrays, built from the saved dictionaries one at a time
+
+Run from the root of the repo:
+    python utils/bench_records.py
+"""
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Records import Frame, FrameColumns
+
+
+NUMBER_OF_FRAMES = 10000
+NUMBER_OF_STATIONS = 10
+FRAME_LENGTH = 100
+
+
+def makeInputs():
+    # bytearray and the + 0.0 in the builders, each one makes its own payloads and floats so that all the memory is counted
+    random.seed(0)
+    return [(bytearray(random.randbytes(FRAME_LENGTH)), "10.0.0.1", 8000 + random.randrange(NUMBER_OF_STATIONS),
+             1700000000.0 + index * 0.06, random.uniform(0, 90), random.uniform(0, 360), random.uniform(500, 2500))
+            for index in range(NUMBER_OF_FRAMES)]
+
+
+def buildDicts(inputs):
+    return [{"timestamp": timestamp + 0.0, "elevation": elevation + 0.0, "azimuth": azimuth + 0.0, "distance": distance + 0.0,
+             "tnc_client": (host, port), "passage_number": 1, "kiss": bytes(kiss)}
+            for kiss, host, port, timestamp, elevation, azimuth, distance in inputs]
+
+
+def buildFrames(inputs):
+    return [Frame(bytes(kiss), host, port, timestamp + 0.0, elevation + 0.0, azimuth + 0.0, distance + 0.0, 1)
+            for kiss, host, port, timestamp, elevation, azimuth, distance in inputs]
+
+
+def measure(build, *args):
+    """
+    Returns (result, bytes allocated by build, seconds)
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(*args)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # the time again without tracemalloc, it slows down the allocations
+    start = time.perf_counter()
+    build(*args)
+    return result, memory, min(elapsed, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    inputs = makeInputs()
+    payload = NUMBER_OF_FRAMES * FRAME_LENGTH
+    records = [frame.toRecord() for frame in buildFrames(inputs)]
+
+    results = {}
+    results["dict"] = measure(buildDicts, inputs)[1:]
+    results["saved dict"] = measure(lambda: [frame.toRecord() for frame in buildFrames(inputs)])[1:]
+    results["Frame"] = measure(buildFrames, inputs)[1:]
+    columns, memory, elapsed = measure(FrameColumns.fromRecords, records)
+    results["FrameColumns"] = (memory, elapsed)
+
+    print(f"{NUMBER_OF_FRAMES} frames of {FRAME_LENGTH} bytes ({payload / 1e6:.1f} MB of payload)")
+    for name, (memory, elapsed) in results.items():
+        print(f"  {name:14s} {memory / NUMBER_OF_FRAMES:7.0f} bytes/frame  {elapsed / NUMBER_OF_FRAMES * 1e6:6.2f} us/frame")
+    print(f"  (FrameColumns is built from the saved dicts, its time includes Frame.fromRecord)")
+
+    # conversions between the modules
+    frames = buildFrames(inputs)
+    for name, convert in (("toWire", lambda: [frame.toWire() for frame in frames]),
+                          ("fromWire", lambda: [Frame.fromWire(data) for data in wire]),
+                          ("toTnc", lambda: [frame.toTnc() for frame in frames]),
+                          ("fromTnc", lambda: [Frame.fromTnc(entry) for entry in tnc])):
+        wire = [frame.toWire() for frame in frames]
+        tnc = [frame.toTnc() for frame in frames]
+        start = time.perf_counter()
+        convert()
+        print(f"  {name:14s} {(time.perf_counter() - start) / NUMBER_OF_FRAMES * 1e6:6.2f} us/frame")
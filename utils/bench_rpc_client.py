@@ -0,0 +1,86 @@
+"""
+Calls per second against a local server, old client vs the pooled client
+
+    ServerProxy      -> xmlrpc.client.ServerProxy against the single server, a new connection for every call
+    RpcProxy         -> persistent connections against the pool server
+    RpcProxy threads -> same proxy shared by many threads
+    multicall        -> many calls per request
+
+Run from the root of the repo (needs config.ini):
+    python utils/bench_rpc_client.py
+"""
+
+import os
+import sys
+import threading
+import time
+import xmlrpc.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ConfigParser import getConfig
+from RpcClient import createRpcProxy
+from RpcServer import createRpcServer
+from bench_folders import useTempFolders
+
+
+NUMBER_OF_CALLS = 3000
+NUMBER_OF_THREADS = 4
+MULTICALL_SIZE = 100
+FRAME = "0x86 0xa2 0x86 0xa2 0x86 0xa2 0x60 0x86 0xa8 0x6c 0x92 0xa6 0xa8 0x63 0x03 0x00 " * 4
+
+
+def start_server(config, model):
+    server = createRpcServer(config, "localhost", 0, model=model)
+    server.logRequests = False
+    server.register_function(lambda kiss, host, port, timestamp: True, "remoteReceiveKiss")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def calls(proxy, count):
+    for _ in range(count):
+        proxy.remoteReceiveKiss(FRAME, "localhost", 8000, time.time())
+
+
+def rate(function, count):
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    config = getConfig()
+
+    single_server = start_server(config, "single")
+    pool_server = start_server(config, "pool")
+    single_port = single_server.server_address[1]
+    pool_port = pool_server.server_address[1]
+
+    server_proxy = xmlrpc.client.ServerProxy(f"http://localhost:{single_port}")
+    print(f"ServerProxy:       {rate(lambda: calls(server_proxy, NUMBER_OF_CALLS), NUMBER_OF_CALLS):8.0f} calls/s")
+
+    rpc_proxy = createRpcProxy(config, "localhost", pool_port)
+    print(f"RpcProxy:          {rate(lambda: calls(rpc_proxy, NUMBER_OF_CALLS), NUMBER_OF_CALLS):8.0f} calls/s")
+
+    def threaded():
+        threads = [threading.Thread(target=calls, args=(rpc_proxy, NUMBER_OF_CALLS // NUMBER_OF_THREADS)) for _ in range(NUMBER_OF_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    print(f"RpcProxy {NUMBER_OF_THREADS} threads: {rate(threaded, NUMBER_OF_CALLS):8.0f} calls/s")
+
+    def multicall():
+        for _ in range(NUMBER_OF_CALLS // MULTICALL_SIZE):
+            batch = rpc_proxy.multicall()
+            for _ in range(MULTICALL_SIZE):
+                batch.remoteReceiveKiss(FRAME, "localhost", 8000, time.time())
+            batch()
+
+    print(f"multicall x{MULTICALL_SIZE}:     {rate(multicall, NUMBER_OF_CALLS):8.0f} calls/s")
+
+    single_server.shutdown()
+    pool_server.shutdown()
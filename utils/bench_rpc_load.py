@@ -0,0 +1,79 @@
+"""
+Load test of the rpc server concurrency models
+
+Measures the latency of the calls used for every frame (remoteGetSatellitePosition) while another client
+keeps asking for the next passages (the slowest call of the system). With the single model every frame waits
+for the prediction to finish, with the pool model the latency should stay close to the idle one
+
+Run from the root of the repo (needs config.ini, and the sat predictor port free):
+    python utils/bench_rpc_load.py
+"""
+
+import os
+import sys
+import threading
+import time
+import xmlrpc.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from RpcServer import createRpcServer
+from SatellitePredictor import SatellitePredictor
+from bench_folders import useTempFolders
+
+
+NUMBER_OF_CALLS = 1000
+
+
+def measure_ingest(url, timestamp):
+    proxy = xmlrpc.client.ServerProxy(url)
+    latencies = []
+    for _ in range(NUMBER_OF_CALLS):
+        start = time.perf_counter()
+        proxy.remoteGetSatellitePosition(timestamp)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def keep_predicting(url, stop_event, counter):
+    proxy = xmlrpc.client.ServerProxy(url)
+    while not stop_event.is_set():
+        proxy.remoteGetNextPasses()
+        counter.append(1)
+
+
+def report(name, latencies):
+    print(f"  {name:<22} p50 {np.percentile(latencies, 50):8.2f}ms  p99 {np.percentile(latencies, 99):8.2f}ms  max {latencies.max():8.2f}ms")
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    predictor = SatellitePredictor()
+    predictor.logger.setLevel("WARNING")
+    predictor.server.server_close()
+    url = f"http://{predictor.server_host}:{predictor.server_port}"
+    timestamp = time.time()
+
+    for model in ["single", "pool"]:
+        predictor.server = createRpcServer(predictor.Config, predictor.server_host, predictor.server_port, model=model)
+        predictor.server.logRequests = False
+        predictor.registerFunctions()
+        threading.Thread(target=predictor.server.serve_forever, daemon=True).start()
+
+        print(f"Model: {model}")
+        report("idle", measure_ingest(url, timestamp))
+
+        stop_event = threading.Event()
+        predictions = []
+        predicting = threading.Thread(target=keep_predicting, args=(url, stop_event, predictions))
+        predicting.start()
+        time.sleep(0.1)
+        report("during predictions", measure_ingest(url, timestamp))
+        stop_event.set()
+        predicting.join()
+        print(f"  ({len(predictions)} predictions completed during the test)")
+
+        predictor.server.shutdown()
+        predictor.server.server_close()
@@ -0,0 +1,62 @@
+"""
+Validations per second of the frames and passages with Schema, compared with the old typeChecking
+(set of the keys rebuilt on every call and expected_keys.index(key) for each key)
+
+Run from the root of the repo:
+    python utils/bench_schema.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Schema import FRAME, PASSAGE
+
+
+FRAME_KEYS = ["timestamp", "elevation", "azimuth", "distance", "tnc_client", "passage_number", "kiss"]
+FRAME_TYPES = [float, float, float, float, list, int, bytes]
+PASSAGE_KEYS = ["passage_number", "satcat_id", "azimuth_elevation", "tle_line1", "tle_line2", "gs_clients", "frame_count",
+                "aos", "los", "start_azimuth", "end_azimuth", "max_elevation", "time_interval", "frame_list", "observers"]
+PASSAGE_TYPES = [int, int, list, str, str, list, int, float, float, float, float, float, list, list, dict]
+REPEAT = 200000
+
+
+def oldTypeChecking(data_dict, expected_keys, expected_types):
+    if not isinstance(data_dict, dict):
+        return False
+    if not type(expected_keys) == list:
+        return False
+    if not type(expected_types) == list:
+        return False
+    if len(expected_keys) != len(expected_types):
+        return False
+    if set(data_dict.keys()) != set(expected_keys):
+        return False
+    for key, value in data_dict.items():
+        if not isinstance(value, expected_types[expected_keys.index(key)]):
+            return False
+    return True
+
+
+def rate(function, data):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        function(data)
+    return REPEAT / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    frame = {"timestamp": 1700000000.0, "elevation": 45.0, "azimuth": 180.0, "distance": 800.0,
+             "tnc_client": ["10.0.0.1", 8000], "passage_number": 1, "kiss": bytes(100)}
+    passage = {"passage_number": 1, "satcat_id": 60238, "azimuth_elevation": [], "tle_line1": "1", "tle_line2": "2", "gs_clients": [],
+               "frame_count": 0, "aos": 0.0, "los": 600.0, "start_azimuth": 0.0, "end_azimuth": 180.0,
+               "max_elevation": 45.0, "time_interval": [], "frame_list": [], "observers": {}}
+    assert FRAME.isValid(dict(frame)) and PASSAGE.isValid(dict(passage))
+
+    for name, data, schema, keys, types in (("frame", frame, FRAME, FRAME_KEYS, FRAME_TYPES),
+                                            ("passage", passage, PASSAGE, PASSAGE_KEYS, PASSAGE_TYPES)):
+        old = rate(lambda data: oldTypeChecking(data, keys, types), data)
+        new = rate(schema.validate, data)
+        print(f"{name:8s} typeChecking {old / 1e3:7.0f} k/s   Schema {new / 1e3:7.0f} k/s   ({new / old:.1f}x)")
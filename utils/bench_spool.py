@@ -0,0 +1,124 @@
+"""
+Spool benchmark
+
+    append    -> frames/s and MB/s written to the spool (fsync batched by the background thread)
+    recovery  -> time to open a spool after a crash, with an almost full segment and a partial record at the end
+                 (the worst case, the whole last segment is checked)
+    outage    -> master is down for a while and then comes back, the cursor is also rolled back as after a crash.
+                 Every frame must reach the data warehouse exactly once (Master.remoteReceiveKissBatch with the keys)
+
+Run from the root of the repo (needs config.ini, and the ports of the config free):
+    python utils/bench_spool.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Master import Master
+from Spool import Spool, SpoolDrainer
+from bench_folders import useTempFolders
+
+
+NUMBER_OF_FRAMES = 200000
+FRAME = bytes(range(100))
+SEGMENT_SIZE = 16 * 1024 * 1024
+OUTAGE_FRAMES = 5000
+OUTAGE_TIME = 2.0
+
+
+def bench_append(folder):
+    spool = Spool(folder, segment_size=SEGMENT_SIZE)
+    start = time.perf_counter()
+    for index in range(NUMBER_OF_FRAMES):
+        spool.append(FRAME, "localhost", 8000, 1700000000.0 + index)
+    appended = time.perf_counter() - start
+    spool.sync()
+    durable = time.perf_counter() - start
+    size = sum(os.path.getsize(spool.segmentPath(sequence)) for sequence in spool.listSegments())
+    spool.close()
+
+    print(f"append:   {NUMBER_OF_FRAMES / appended:9.0f} frames/s  {size / appended / 1e6:6.1f} MB/s  "
+          f"(all fsynced after {durable:.2f} s, {len(spool.listSegments())} segments)")
+
+
+def bench_recovery(folder):
+    spool = Spool(folder, segment_size=SEGMENT_SIZE)
+    # fill the segment and leave half of a record at the end, as if the process died in the middle of a write
+    while spool.write_offset < SEGMENT_SIZE - 1024:
+        last = spool.append(FRAME, "localhost", 8000, time.time())
+    spool.close()
+    path = spool.segmentPath(spool.listSegments()[-1])
+    with open(path, "ab") as file:
+        file.write(b"\x80\x00\x00\x00\x12\x34")
+
+    start = time.perf_counter()
+    spool = Spool(folder, segment_size=SEGMENT_SIZE)
+    elapsed = time.perf_counter() - start
+    ok = spool.last_record_id == last
+    spool.close()
+    print(f"recovery: {elapsed * 1000:9.1f} ms to open ({last} records), partial record removed: {ok}")
+
+
+class FlakyMaster:
+    """
+    Real Master.remoteReceiveKissBatch, the position and the data warehouse are stubs
+    It is down (raises) until up_time
+    """
+
+    def __init__(self):
+        self.master = Master()
+        self.master.logger.setLevel("WARNING")
+        self.saved = []
+        self.master.getSatelliteStates = lambda timestamps, kisses=None, tnc_clients=None: [(0, 10.0, 0.0, 1000.0)] * len(timestamps)
+        self.master.data_warehouse_proxy = self
+        self.up_time = time.time() + OUTAGE_TIME
+
+    def remoteSaveKissBatch(self, frame_list):
+        self.saved += [frame["timestamp"] for frame in frame_list]
+        return [True] * len(frame_list)
+
+    def send(self, batch):
+        if time.time() < self.up_time:
+            raise ConnectionRefusedError("master is down")
+        return self.master.remoteReceiveKissBatch(batch)
+
+
+def bench_outage(folder):
+    flaky = FlakyMaster()
+    spool = Spool(folder, segment_size=SEGMENT_SIZE)
+    drainer = SpoolDrainer(spool, flaky.send, batch_size=256, retry_min=0.2, retry_max=0.5)
+    drainer.start()
+
+    for index in range(OUTAGE_FRAMES):
+        spool.append(FRAME, "localhost", 8000, float(index))
+    while drainer.stats["forwarded"] < OUTAGE_FRAMES:
+        time.sleep(0.01)
+    recovered = time.time() - flaky.up_time
+    drainer.stop()
+    spool.close()
+
+    # crash before the cursor was saved, everything is sent again
+    os.remove(os.path.join(folder, "cursor"))
+    spool = Spool(folder, segment_size=SEGMENT_SIZE)
+    records, position = spool.read(OUTAGE_FRAMES)
+    flaky.send([[kiss, host, port, timestamp, f"{spool.id}:{record_id}"] for record_id, timestamp, host, port, kiss in records])
+    spool.close()
+
+    exactly_once = sorted(flaky.saved) == [float(index) for index in range(OUTAGE_FRAMES)]
+    print(f"outage:   {OUTAGE_FRAMES} frames delivered {recovered * 1000:.0f} ms after master came back, "
+          f"{drainer.stats['failed']} retried, resent {len(records)} after losing the cursor, exactly once: {exactly_once}")
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    for bench in (bench_append, bench_recovery, bench_outage):
+        folder = tempfile.mkdtemp(prefix="spool_")
+        try:
+            bench(folder)
+        finally:
+            shutil.rmtree(folder)
@@ -0,0 +1,106 @@
+"""
+Cost of the position of the satellite seen from each ground station, with more and more stations
+
+    skyfield      -> an observer per station, the satellite evaluated again for each of them
+    SatelliteSet  -> all the satellites propagated once, each timestamp rotated to the site of its station
+    fromReference -> what master does with the ephemeris of the passage, the positions seen from the observer are
+                     moved to the site of the station of each frame (numpy only, no sgp4)
+
+A batch of frames from TncService (BATCH_SIZE timestamps), the frames are spread over all the stations.
+At the end fromReference is compared with skyfield at each station
+
+Run from the root of the repo:
+    python utils/bench_stations.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from skyfield.api import EarthSatellite, load, wgs84
+
+from GroundStations import GroundStations
+from SatelliteSet import SatelliteSet
+
+
+TLE_LINE1 = "1 60238U 24128D   25180.89646745  .00004045  00000+0  28654-3 0  9991"
+TLE_LINE2 = "2 60238  61.9914   5.9727 0052120  61.8031 298.8311 15.05478104 53319"
+REFERENCE = (38.7314, -9.3024, 0.0)
+START = 1751267380.0 + 60      # a minute after the aos of a passage of the TLE over the reference
+NUM_STATIONS = [0, 1, 10, 100]
+BATCH_SIZE = 64
+REPEAT = 5
+
+
+def makeStations(count):
+    """
+    Stations up to a few hundred km around the reference, {(host, port): (latitude, longitude, elevation)}
+    """
+    rng = np.random.default_rng(count)
+    return {(f"10.0.{index // 250}.{index % 250}", 8001): (REFERENCE[0] + rng.uniform(-3, 3), REFERENCE[1] + rng.uniform(-3, 3),
+                                                          rng.uniform(0, 500)) for index in range(count)}
+
+
+def toTime(ts, timestamps):
+    days = np.floor(timestamps / 86400.0)
+    return ts.utc(1970, 1, 1 + days, 0, 0, timestamps - days * 86400.0)
+
+
+def skyfieldPositions(ts, satellite, observers, timestamps, rows):
+    # one evaluation per station with the timestamps of its frames
+    time_ = toTime(ts, timestamps)
+    for row, observer in enumerate(observers):
+        selected = np.flatnonzero(rows == row)
+        if len(selected):
+            (satellite - observer).at(time_[selected]).altaz()
+
+
+def timed(function, *args):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    ts = load.timescale()
+    satellite = EarthSatellite(TLE_LINE1, TLE_LINE2, "60238", ts)
+    reference = wgs84.latlon(REFERENCE[0], REFERENCE[1], elevation_m=REFERENCE[2])
+    timestamps = START + np.arange(BATCH_SIZE) * 0.5
+    alt, az, distance = (satellite - reference).at(toTime(ts, timestamps)).altaz()
+
+    print(f"position of a satellite for a batch of {BATCH_SIZE} frames spread over the stations")
+    print(f"{'stations':>8} {'skyfield':>12} {'SatelliteSet':>14} {'fromReference':>15}")
+    for count in NUM_STATIONS:
+        stations = makeStations(count)
+        observers = [reference] + [wgs84.latlon(*site[:2], elevation_m=site[2]) for site in stations.values()]
+        clients = [None] + list(stations)
+        ground_stations = GroundStations(REFERENCE, stations)
+        satellite_set = SatelliteSet(ts, *REFERENCE, stations=stations)
+        satellite_set.setTLEs({60238: (TLE_LINE1, TLE_LINE2)})
+
+        tnc_clients = [clients[index % len(clients)] for index in range(BATCH_SIZE)]
+        rows = ground_stations.rows(tnc_clients)
+        old = timed(skyfieldPositions, ts, satellite, observers, timestamps, rows)
+        vector = timed(satellite_set.positions, timestamps, tnc_clients)
+        local = timed(ground_stations.fromReference, alt.degrees, az.degrees, distance.km, rows)
+        print(f"{count:>8} {old * 1000:>10.2f}ms {vector * 1000:>12.2f}ms {local * 1000:>13.3f}ms")
+
+    # the positions moved to the stations are the ones that skyfield gives at each site
+    stations = makeStations(10)
+    ground_stations = GroundStations(REFERENCE, stations)
+    errors = []
+    for row, site in enumerate(stations.values(), start=1):
+        moved = np.array(ground_stations.fromReference(alt.degrees, az.degrees, distance.km, np.full(BATCH_SIZE, row)))
+        expected_alt, expected_az, expected_distance = (satellite - wgs84.latlon(*site[:2], elevation_m=site[2])).at(toTime(ts, timestamps)).altaz()
+        error = np.abs(moved - np.array([expected_alt.degrees, expected_az.degrees, expected_distance.km]))
+        error[1] = np.abs((error[1] + 180.0) % 360.0 - 180.0)
+        errors.append(error.max(axis=1))
+    errors = np.max(errors, axis=0)
+    print(f"\nfromReference vs skyfield at 10 stations, max difference elevation {errors[0]:.2e}°, "
+          f"azimuth {errors[1]:.2e}°, distance {errors[2] * 1000:.2f} m")
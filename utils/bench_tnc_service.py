@@ -0,0 +1,115 @@
+"""
+Many simulated TNCs against a single TncService
+
+The fake TNCs (NUMBER_OF_TNCS asyncio servers) and a fake master run in other processes,
+so the process of the service only does the work of the service. Each TNC sends FRAMES_PER_TNC frames
+at FRAMES_PER_SECOND, the master takes MASTER_DELAY seconds to answer each call (slow master),
+the frames are sent to it in batches (tnc_batch_size, tnc_batch_delay).
+In the end it shows how many frames were read and forwarded and the cpu used by the service
+
+Run from the root of the repo (needs config.ini):
+    python utils/bench_tnc_service.py
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ConfigParser import getConfig
+from kiss import encode_kiss
+from RpcClient import createRpcProxy
+from RpcServer import createRpcServer
+from TncService import TncService
+from bench_folders import useTempFolders
+
+
+NUMBER_OF_TNCS = 150
+FRAMES_PER_TNC = 100
+FRAMES_PER_SECOND = 20     # per TNC
+MASTER_DELAY = 0.002
+BASE_PORT = 18000
+MASTER_PORT = 17999
+
+
+def fake_tncs():
+    async def handle(reader, writer):
+        frame = encode_kiss(bytes([0x86, 0xa2, 0x86, 0xa2, 0x86, 0xa2, 0x60]) + random.randbytes(120))
+        for _ in range(FRAMES_PER_TNC):
+            writer.write(frame)
+            await writer.drain()
+            await asyncio.sleep(1 / FRAMES_PER_SECOND)
+        await reader.read()   # wait for the service to close
+
+    async def main():
+        for index in range(NUMBER_OF_TNCS):
+            await asyncio.start_server(handle, "localhost", BASE_PORT + index)
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def fake_master():
+    useTempFolders("bench_master_")
+    config = getConfig()
+    server = createRpcServer(config, "localhost", MASTER_PORT, workers=16)
+    server.logRequests = False
+    received = [0]
+
+    def remoteReceiveKissBatch(frames):
+        time.sleep(MASTER_DELAY)
+        received[0] += len(frames)
+        return [True] * len(frames)
+
+    server.register_function(remoteReceiveKissBatch)
+    server.register_function(lambda: received[0], "getReceived")
+    server.serve_forever()
+
+
+async def run_service(service, total):
+    task = asyncio.create_task(service.run())
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    read_done = None
+    while True:
+        await asyncio.sleep(0.1)
+        stats = service.getStats()
+        read = sum(connection["frames"] for connection in stats["connections"].values())
+        if read_done is None and read == total:
+            read_done = time.perf_counter() - start
+        if stats["forwarded"] == total or time.perf_counter() - start > 120:
+            break
+
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    task.cancel()
+    return stats, read_done, elapsed, cpu
+
+
+if __name__ == "__main__":
+    processes = [multiprocessing.Process(target=target, daemon=True) for target in (fake_tncs, fake_master)]
+    for process in processes:
+        process.start()
+    time.sleep(2)
+
+    useTempFolders()
+    service = TncService([("localhost", BASE_PORT + index) for index in range(NUMBER_OF_TNCS)],
+                         spool_folder=tempfile.mkdtemp(prefix="spool_"))
+    service.logger.setLevel(logging.WARNING)
+    service.master_proxy = createRpcProxy(service.Config, "localhost", MASTER_PORT)
+
+    total = NUMBER_OF_TNCS * FRAMES_PER_TNC
+    stats, read_done, elapsed, cpu = asyncio.run(run_service(service, total))
+    connected = sum(connection["connections"] > 0 for connection in stats["connections"].values())
+
+    print(f"{connected}/{NUMBER_OF_TNCS} TNCs, {total} frames sent at {NUMBER_OF_TNCS * FRAMES_PER_SECOND} frames/s in total")
+    print(f"  all frames read after {read_done:.2f} s (ideal {FRAMES_PER_TNC / FRAMES_PER_SECOND:.2f} s)" if read_done else "  not all frames were read")
+    print(f"  forwarded {stats['forwarded']} in {stats['batches']} batches ({stats['failed']} retried) in {elapsed:.2f} s")
+    print(f"  cpu of the service: {cpu:.2f} s ({100 * cpu / elapsed:.0f}% of one core)")
@@ -1,14 +1,11 @@
 import pickle
 import os
-import binascii
+import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kiss import print_byte_array
 
-def print_byte_array(byte_array):
-    hex_data = binascii.hexlify(byte_array).decode()  # Convert to hex string
-    # Add \x prefix to each byte
-    formatted_hex_data = ''.join(f'0x{hex_data[i:i+2]} ' for i in range(0, len(hex_data), 2))
-    # print(formatted_hex_data)
-    return formatted_hex_data
 
 file_list = [x for x in os.listdir() if x.endswith(".pkl")]
 
@@ -0,0 +1,102 @@
+"""
+Loads the existing data into the sqlite archive (Archive)
+
+    data/*.json          -> old passage files saved by dumpData (also the ones with the frames as "0x86 0xa2 ...")
+    data/<passage>/      -> passage folders (PassageLog)
+    data_dump_*.pkl      -> captures of utils/multi_launcher, they have no passage (passage_number -1)
+
+It can be run more than once, the passages are identified by their satellite and aos and their frames are replaced,
+each pkl file is loaded only once
+
+Run from the root of the repo:
+    python utils/migrate_archive.py [--archive data/archive.sqlite] [--data data] [pkl files...]
+"""
+
+import argparse
+import glob
+import json
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Archive import Archive
+from DataWarehouse import DataWarehouse
+
+
+def migrate_passages(archive, data_folder):
+    paths = sorted(glob.glob(os.path.join(data_folder, "*.json")) + glob.glob(os.path.join(data_folder, "*", "")))
+    frames = 0
+    for path in paths:
+        try:
+            passages = DataWarehouse.loadPassage(path.rstrip(os.sep))
+        except Exception as e:
+            print(f"  skipping {path}: {e}")
+            continue
+
+        for passage in passages.values():
+            frame_list = passage.get("frame_list", [])
+            passage.setdefault("status", "closed")
+            passage["frame_count"] = len(frame_list)
+            passage_id = archive.insertPassage(passage)
+            archive.replaceFrames(passage_id, [Archive.frameRow(passage_id, frame) for frame in frame_list])
+            frames += len(frame_list)
+    return len(paths), frames
+
+
+def migrate_pickle(archive, path):
+    """
+    The entries of multi_launcher: host, port, timestamp (local iso time), data (list of bytes), elevation, azimuth
+    The capture becomes a passage (status capture) with the name of the file, that is how it is only loaded once
+    """
+    source = json.dumps({"source": os.path.basename(path)})
+    with archive.lock:
+        if archive.connection.execute("SELECT id FROM passages WHERE header = ?", (source,)).fetchone():
+            return 0
+
+    with open(path, "rb") as f:
+        entries = pickle.load(f)
+    if not entries:
+        return 0
+
+    # the capture is saved as a passage from the first to the last frame
+    times = [datetime.fromisoformat(entry["timestamp"]).timestamp() for entry in entries]
+    passage_id = archive.insertPassage({"aos": min(times), "los": max(times), "passage_number": -1, "status": "capture",
+                                        "source": os.path.basename(path)})
+    rows = []
+    for entry, epoch in zip(entries, times):
+        frame = {
+            "epoch": epoch,
+            "elevation": entry.get("elevation"),
+            "azimuth": entry.get("azimuth"),
+            "tnc_client": [entry["host"], entry["port"]],
+            "passage_number": -1,
+            "kiss": bytes(entry["data"]),
+        }
+        rows.append(Archive.frameRow(passage_id, frame))
+    archive.insertFrames(rows)
+    archive.updatePassage(passage_id, frame_count=len(rows))
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loads the passage files and the multi_launcher captures into the sqlite archive")
+    parser.add_argument("pickles", nargs="*", help="data_dump_*.pkl files (default: the ones in the current folder)")
+    parser.add_argument("--archive", default=os.path.join("data", "archive.sqlite"))
+    parser.add_argument("--data", default="data", help="folder with the passages")
+    args = parser.parse_args()
+
+    archive = Archive(args.archive)
+    start = time.perf_counter()
+
+    files, frames = migrate_passages(archive, args.data)
+    print(f"Passages: {files} files, {frames} frames")
+
+    for path in args.pickles or sorted(glob.glob("data_dump_*.pkl")):
+        print(f"{path}: {migrate_pickle(archive, path)} frames")
+
+    print(f"Archive has {archive.countFrames()} frames ({time.perf_counter() - start:.2f} s)")
+    archive.close()
@@ -7,34 +7,13 @@ import time
 import pickle
 import signal
 import sys
+import os
 
-from SatellitePredictor import SatellitePredictor  # Ensure this is the class you created
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from SatellitePredictor import SatellitePredictor  # Ensure this is the class you created
+from kiss import KissDecoder
 
-# KISS special characters
-KISS_FEND = 0xC0  # Frame End
-KISS_FESC = 0xDB  # Frame Escape
-KISS_TFEND = 0xDC # Transposed Frame End
-KISS_TFESC = 0xDD # Transposed Frame Escape
-
-def decode_kiss(data):
-    """Decode KISS-encoded data."""
-    decoded = bytearray()
-    i = 0
-    while i < len(data):
-        if data[i] == KISS_FESC:
-            i += 1
-            if i < len(data):
-                if data[i] == KISS_TFEND:
-                    decoded.append(KISS_FEND)
-                elif data[i] == KISS_TFESC:
-                    decoded.append(KISS_FESC)
-                else:
-                    decoded.append(data[i])
-        else:
-            decoded.append(data[i])
-        i += 1
-    return decoded
 
 def tnc_client(HOST, PORT, data_keeper, lock, predictor):
     """Connect to a TNC server and listen for KISS data."""
@@ -45,7 +24,7 @@ def tnc_client(HOST, PORT, data_keeper, lock, predictor):
                 client.connect((HOST, PORT))
                 print(f"Connected to server at {HOST}:{PORT}")
 
-                buffer = bytearray()
+                decoder = KissDecoder()
                 while True:
                     try:
                         data = client.recv(1024)
@@ -54,36 +33,28 @@ def tnc_client(HOST, PORT, data_keeper, lock, predictor):
                             break
 
                         # Process received data
-                        for byte in data:
-                            if byte == KISS_FEND:
-                                if buffer:
-                                    # Decode KISS frame
-                                    decoded_data = decode_kiss(buffer[1:])
-                                    
-                                    # Get current satellite position
-                                    try:
-                                        elevation, azimuth, distance = predictor.getSatellitePosition()
-                                    except ValueError as e:
-                                        print(f"Error calculating satellite position: {e}")
-                                        elevation, azimuth = None, None
-
-                                    # Store the data with metadata
-                                    timestamp = datetime.now().isoformat()
-                                    entry = {
-                                        "host": HOST,
-                                        "port": PORT,
-                                        "timestamp": timestamp,
-                                        "data": list(decoded_data),
-                                        "elevation": elevation,
-                                        "azimuth": azimuth,
-                                    }
-                                    with lock:
-                                        data_keeper.append(entry)
-                                    print(f"Received data from {HOST}:{PORT} at {timestamp}")
-                                    print(f"Satellite Position - Elevation: {elevation}°, Azimuth: {azimuth}°")
-                                    buffer.clear()
-                            else:
-                                buffer.append(byte)
+                        for decoded_data in decoder.feed(data):
+                            # Get current satellite position
+                            try:
+                                elevation, azimuth, distance = predictor.getSatellitePosition()
+                            except ValueError as e:
+                                print(f"Error calculating satellite position: {e}")
+                                elevation, azimuth = None, None
+
+                            # Store the data with metadata
+                            timestamp = datetime.now().isoformat()
+                            entry = {
+                                "host": HOST,
+                                "port": PORT,
+                                "timestamp": timestamp,
+                                "data": list(decoded_data),
+                                "elevation": elevation,
+                                "azimuth": azimuth,
+                            }
+                            with lock:
+                                data_keeper.append(entry)
+                            print(f"Received data from {HOST}:{PORT} at {timestamp}")
+                            print(f"Satellite Position - Elevation: {elevation}°, Azimuth: {azimuth}°")
                     except Exception as e:
                         print(f"Error receiving data from {HOST}:{PORT}: {e}")
                         break
@@ -1,25 +1,12 @@
+import os
 import socket
+import sys
 import time
 
-# KISS special characters
-KISS_FEND = 0xC0  # Frame End
-KISS_FESC = 0xDB  # Frame Escape
-KISS_TFEND = 0xDC # Transposed Frame End
-KISS_TFESC = 0xDD # Transposed Frame Escape
-
-def encode_kiss(data):
-    """Encode AX.25 data in KISS format."""
-    encoded = bytearray()
-    for byte in data:
-        if byte == KISS_FEND:
-            encoded.append(KISS_FESC)
-            encoded.append(KISS_TFEND)
-        elif byte == KISS_FESC:
-            encoded.append(KISS_FESC)
-            encoded.append(KISS_TFESC)
-        else:
-            encoded.append(byte)
-    return bytes([KISS_FEND, 0x00]) + encoded + bytes([KISS_FEND])
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kiss import encode_kiss
+
 
 def send_ax25_frame(host, port, ax25_frame):
     """Send an AX.25 frame to a TNC over a TCP connection."""
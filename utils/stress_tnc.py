@@ -0,0 +1,105 @@
+"""
+Stress test of the TncClient framer, checks that no frame is lost when the TNC sends them in bursts
+
+A fake TNC sends NUMBER_OF_FRAMES frames (built like in sender.py) as fast as it can, cut in chunks of random
+size so that frames are split between reads and many frames arrive in the same read.
+A fake master counts what the TncClient forwards and in the end both lists are compared
+
+Run from the root of the repo (needs config.ini):
+    python utils/stress_tnc.py
+"""
+
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kiss import encode_kiss
+from RpcClient import createRpcProxy
+from RpcServer import createRpcServer
+from TncClient import TncClient
+from bench_folders import useTempFolders
+
+
+NUMBER_OF_FRAMES = 20000
+MAX_CHUNK = 4096
+TIMEOUT = 120
+
+
+def generate_frames(count):
+    """Same header as the frames in sender.py, random payload full of FEND and FESC"""
+    header = bytes([0x86, 0xa2, 0x86, 0xa2, 0x86, 0xa2, 0x60, 0x86, 0xa8, 0x6c, 0x92, 0xa6, 0xa8, 0x63, 0x03, 0x00])
+    special = [0xC0, 0xDB, 0xDC, 0xDD]
+    frames = []
+    for index in range(count):
+        payload = bytes(random.choice(special) if random.random() < 0.1 else random.randint(0, 255)
+                        for _ in range(random.randint(10, 200)))
+        frames.append(header + index.to_bytes(4, "big") + payload)
+    return frames
+
+
+def fake_tnc(server_socket, stream):
+    connection, _ = server_socket.accept()
+    with connection:
+        position = 0
+        while position < len(stream):
+            size = random.randint(1, MAX_CHUNK)
+            connection.sendall(stream[position:position + size])
+            position += size
+        # keep the connection open until the client is done
+        connection.recv(1)
+
+
+if __name__ == "__main__":
+    useTempFolders()
+    random.seed(0)
+    frames = generate_frames(NUMBER_OF_FRAMES)
+    stream = b"".join(encode_kiss(frame) for frame in frames)
+
+    received = []
+    done = threading.Event()
+
+    def remoteReceiveKiss(kiss, host, port, timestamp):
+        received.append(kiss)
+        if len(received) == NUMBER_OF_FRAMES:
+            done.set()
+        return True
+
+    def remoteReceiveKissBatch(frames):
+        return [remoteReceiveKiss(*frame[:4]) for frame in frames]
+
+    tnc = TncClient("localhost", 0, spool_folder=tempfile.mkdtemp(prefix="spool_"))
+    tnc.logger.setLevel(logging.INFO)
+
+    master = createRpcServer(tnc.Config, "localhost", 0)
+    master.logRequests = False
+    master.register_function(remoteReceiveKiss)
+    master.register_function(remoteReceiveKissBatch)
+    threading.Thread(target=master.serve_forever, daemon=True).start()
+    tnc.master_proxy = createRpcProxy(tnc.Config, "localhost", master.server_address[1])
+
+    server_socket = socket.create_server(("localhost", 0))
+    tnc.tncPort = server_socket.getsockname()[1]
+    threading.Thread(target=fake_tnc, args=(server_socket, stream), daemon=True).start()
+
+    start = time.perf_counter()
+    tnc.attemptConnection()
+    threading.Thread(target=tnc.tncLoop, daemon=True).start()
+    done.wait(TIMEOUT)
+    elapsed = time.perf_counter() - start
+
+    print(f"Sent {len(frames)} frames ({len(stream) / 1e6:.1f} MB) in chunks of up to {MAX_CHUNK} bytes")
+    print(f"  Forwarded {len(received)} frames in {elapsed:.2f} s ({len(received) / elapsed:.0f} frames/s)")
+    if received == frames:
+        print("  OK, every frame arrived intact and in order")
+    else:
+        lost = NUMBER_OF_FRAMES - len(received)
+        corrupted = sum(a != b for a, b in zip(received, frames))
+        print(f"  FAILED, {lost} frames lost, {corrupted} frames different")
+        sys.exit(1)